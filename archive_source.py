@@ -0,0 +1,125 @@
+"""
+压缩包模组源模块
+直接把 zip 压缩包作为源文件夹使用：打开时只读取中央目录建立索引，
+ServerData.json 和模组文件都从压缩包中按需流式读取，不解压到临时文件夹
+"""
+
+import hashlib
+import threading
+import time
+import zipfile
+from typing import Dict, List, Any, BinaryIO, Iterable
+
+# 模组根目录的标志文件
+SERVER_DATA_FILE_NAME = 'ServerData.json'
+# 计算内容指纹时的读取块大小
+ARCHIVE_READ_CHUNK_SIZE = 1024 * 1024
+
+
+def is_archive_source(path: str) -> bool:
+    """判断路径是否为可作为模组源的 zip 压缩包"""
+    try:
+        return zipfile.is_zipfile(path)
+    except OSError:
+        return False
+
+
+def zip_mtime_ns(info: zipfile.ZipInfo) -> int:
+    """把 zip 条目的本地时间转换为 mtime_ns"""
+    return int(time.mktime(info.date_time + (0, 0, -1))) * 1_000_000_000
+
+
+class ArchiveModSource:
+    """
+    zip 压缩包中的模组索引
+    压缩包根目录下的每个文件夹是一个模组；若整个压缩包只有一个不含 ServerData.json 的顶层文件夹
+    （例如打包了整个 mods 文件夹），则以其子文件夹作为模组
+    """
+
+    def __init__(self, archive_path: str):
+        self.archive_path = archive_path
+        self._zip = zipfile.ZipFile(archive_path, 'r')
+        self._lock = threading.Lock()
+        # {模组文件夹名: {相对路径(以/分隔): ZipInfo}}
+        self.mods = {}
+        self._build_index(self._zip.infolist())
+
+    def _build_index(self, infos: Iterable[zipfile.ZipInfo]) -> None:
+        """根据中央目录建立模组索引"""
+        files = [info for info in infos if not info.is_dir()]
+        prefix = ''
+        while True:
+            names = [info.filename[len(prefix):] for info in files]
+            top_dirs = {name.split('/', 1)[0] for name in names if '/' in name}
+            if len(top_dirs) != 1 or any('/' not in name for name in names):
+                break
+            top_dir = top_dirs.pop()
+            if f"{top_dir}/{SERVER_DATA_FILE_NAME}" in names:
+                break
+            prefix += top_dir + '/'
+
+        for info in files:
+            name = info.filename[len(prefix):]
+            if '/' not in name:
+                continue
+            folder, rel_path = name.split('/', 1)
+            self.mods.setdefault(folder, {})[rel_path] = info
+
+    def folder_names(self) -> List[str]:
+        """返回所有模组文件夹名"""
+        return sorted(self.mods)
+
+    def has_file(self, folder: str, rel_path: str) -> bool:
+        """模组中是否存在指定文件"""
+        return rel_path in self.mods.get(folder, {})
+
+    def list_files(self, folder: str) -> Dict[str, List[int]]:
+        """列出模组中的文件: {相对路径: [大小, mtime_ns]}"""
+        return {
+            rel_path: [info.file_size, zip_mtime_ns(info)]
+            for rel_path, info in self.mods.get(folder, {}).items()
+        }
+
+    def mod_size(self, folder: str) -> int:
+        """模组解压后的总大小"""
+        return sum(info.file_size for info in self.mods.get(folder, {}).values())
+
+    def mod_mtime(self, folder: str) -> float:
+        """模组中最新文件的修改时间（秒）"""
+        return max((zip_mtime_ns(info) for info in self.mods.get(folder, {}).values()), default=0) / 1e9
+
+    def open(self, folder: str, rel_path: str) -> BinaryIO:
+        """打开模组中的文件进行流式读取（读取结束时 zipfile 会校验 CRC）"""
+        info = self.mods.get(folder, {}).get(rel_path)
+        if info is None:
+            raise FileNotFoundError(f"压缩包中不存在: {folder}/{rel_path}")
+        with self._lock:
+            return self._zip.open(info, 'r')
+
+    def mod_fingerprint(self, folder: str, algorithm: str, ignored_files: Iterable[str] = ()) -> Dict[str, Any]:
+        """
+        计算与 ContentHasher.mod_fingerprint 相同格式的模组内容指纹（需要读取模组的全部数据）
+        返回: {'digest': 指纹, 'files': 文件数, 'size': 总大小}
+        """
+        ignored = set(ignored_files)
+        digest = hashlib.new(algorithm)
+        files = 0
+        total_size = 0
+        for rel_path, info in sorted(self.mods.get(folder, {}).items()):
+            if rel_path in ignored:
+                continue
+            file_digest = hashlib.new(algorithm)
+            with self.open(folder, rel_path) as f:
+                while True:
+                    chunk = f.read(ARCHIVE_READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    file_digest.update(chunk)
+            files += 1
+            total_size += info.file_size
+            digest.update(f"{rel_path}\0{info.file_size}\0{file_digest.hexdigest()}\n".encode('utf-8'))
+        return {'digest': digest.hexdigest(), 'files': files, 'size': total_size}
+
+    def close(self) -> None:
+        """关闭压缩包"""
+        self._zip.close()
@@ -0,0 +1,60 @@
+"""
+协作式取消模块
+长时间运行的操作在每个文件（或模组）边界调用 CancelToken.checkpoint()：
+已请求取消时抛出 OperationCancelled，已暂停时阻塞直到继续或取消
+"""
+
+import threading
+
+
+class OperationCancelled(Exception):
+    """操作已被用户取消"""
+
+    def __init__(self, message: str = "操作已取消"):
+        super().__init__(message)
+
+
+class CancelToken:
+    """取消与暂停/继续控制（线程安全，可被多个工作线程共享）"""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        # 未暂停时处于置位状态，checkpoint 在其上等待
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已请求取消"""
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self) -> bool:
+        """是否处于暂停状态"""
+        return not self._running.is_set()
+
+    def cancel(self) -> None:
+        """请求取消（同时唤醒暂停中的线程，使其尽快退出）"""
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self) -> None:
+        """暂停：工作线程在下一个检查点阻塞"""
+        if not self.cancelled:
+            self._running.clear()
+
+    def resume(self) -> None:
+        """继续被暂停的操作"""
+        self._running.set()
+
+    def reset(self) -> None:
+        """开始新的操作前清除取消与暂停状态"""
+        self._cancelled.clear()
+        self._running.set()
+
+    def checkpoint(self) -> None:
+        """检查点：已取消时抛出 OperationCancelled，暂停时阻塞等待"""
+        if not self._running.is_set():
+            self._running.wait()
+        if self._cancelled.is_set():
+            raise OperationCancelled()
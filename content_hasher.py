@@ -0,0 +1,191 @@
+"""
+内容哈希模块
+大文件使用内存映射计算哈希，小文件成批处理，工作分散到线程池（hashlib 计算时会释放 GIL）；
+结果按 (路径, 大小, mtime_ns) 缓存，未变化的文件不会再次计算
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+from structured_log import get_logger, log_fields
+
+logger = get_logger('content_hasher')
+
+# 默认哈希算法
+DEFAULT_HASH_ALGORITHM = 'sha256'
+# 不小于该大小的文件使用内存映射
+MMAP_THRESHOLD = 8 * 1024 * 1024
+# 内存映射时每次送入哈希的数据量
+MMAP_CHUNK_SIZE = 16 * 1024 * 1024
+# 小文件每批的数量
+SMALL_FILE_BATCH_SIZE = 64
+
+
+class ContentHasher:
+    """带缓存的并行内容哈希器"""
+
+    def __init__(self, algorithm: str = DEFAULT_HASH_ALGORITHM, max_workers: int = None,
+                 cache_path: str = None, throttle=None, checkpoint=None, ignored_files: Tuple[str, ...] = ()):
+        self.algorithm = algorithm
+        self.max_workers = max_workers or min(8, (os.cpu_count() or 1) + 2)
+        self.cache_path = cache_path
+        # throttle(nbytes) 在读取数据前调用（与复制共用的 I/O 限速）
+        self.throttle = throttle
+        # checkpoint() 在每个文件开始前调用（取消时抛出异常，暂停时阻塞）；各方法也可传入本次调用使用的 checkpoint
+        self.checkpoint = checkpoint
+        # 计算模组指纹时忽略的相对路径（例如复制时生成的清单）
+        self.ignored_files = set(ignored_files)
+        # 缓存: {路径: [大小, mtime_ns, 哈希]}
+        self._cache = {}
+        self._cache_loaded = False
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load_cache(self) -> None:
+        """首次使用时加载持久化缓存"""
+        if self._cache_loaded:
+            return
+        self._cache_loaded = True
+        if self.cache_path and os.path.isfile(self.cache_path):
+            try:
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('algorithm') == self.algorithm:
+                    self._cache.update(data.get('files', {}))
+            except (OSError, ValueError) as e:
+                logger.warning(f"加载哈希缓存时出错: {e}", extra=log_fields(phase='cache'))
+
+    def save(self) -> None:
+        """将缓存写入磁盘（先写临时文件再重命名）"""
+        if not self.cache_path or not self._dirty:
+            return
+        with self._lock:
+            data = {'algorithm': self.algorithm, 'files': dict(self._cache)}
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        temp_path = self.cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, self.cache_path)
+
+    @staticmethod
+    def _cache_key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def lookup(self, path: str, st: os.stat_result = None) -> Optional[str]:
+        """按 (路径, 大小, mtime_ns) 查询缓存的哈希"""
+        self._load_cache()
+        st = st or os.stat(path)
+        entry = self._cache.get(self._cache_key(path))
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        return None
+
+    def remember(self, path: str, file_hash: str, st: os.stat_result = None) -> None:
+        """记录已知文件的哈希（例如校验复制时已经计算过的哈希）"""
+        self._load_cache()
+        st = st or os.stat(path)
+        with self._lock:
+            self._cache[self._cache_key(path)] = [st.st_size, st.st_mtime_ns, file_hash]
+            self._dirty = True
+
+    def _compute(self, path: str, size: int) -> str:
+        """计算单个文件的哈希：大文件内存映射，小文件一次读取"""
+        digest = hashlib.new(self.algorithm)
+        with open(path, 'rb') as f:
+            if size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        for offset in range(0, size, MMAP_CHUNK_SIZE):
+                            chunk = view[offset:offset + MMAP_CHUNK_SIZE]
+                            if self.throttle:
+                                self.throttle(len(chunk))
+                            digest.update(chunk)
+                            chunk.release()
+                    finally:
+                        view.release()
+            elif size:
+                if self.throttle:
+                    self.throttle(size)
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def hash_file(self, path: str, checkpoint=None) -> str:
+        """计算单个文件的哈希（优先使用缓存）"""
+        checkpoint = checkpoint or self.checkpoint
+        if checkpoint:
+            checkpoint()
+        st = os.stat(path)
+        cached = self.lookup(path, st)
+        if cached:
+            with self._lock:
+                self.hits += 1
+            return cached
+        file_hash = self._compute(path, st.st_size)
+        with self._lock:
+            self.misses += 1
+        self.remember(path, file_hash, st)
+        return file_hash
+
+    def _hash_batch(self, paths: List[str], checkpoint=None) -> List[Tuple[str, str]]:
+        """在同一个线程任务中依次计算一批小文件的哈希"""
+        return [(path, self.hash_file(path, checkpoint)) for path in paths]
+
+    def hash_files(self, paths: List[str], checkpoint=None) -> Dict[str, str]:
+        """
+        并行计算多个文件的哈希，返回 {路径: 哈希}
+        大文件各自作为一个任务，小文件按 SMALL_FILE_BATCH_SIZE 成批提交以减少调度开销
+        """
+        large, small = [], []
+        for path in paths:
+            try:
+                (large if os.path.getsize(path) >= MMAP_THRESHOLD else small).append(path)
+            except OSError:
+                small.append(path)
+        batches = [[path] for path in large]
+        batches += [small[i:i + SMALL_FILE_BATCH_SIZE] for i in range(0, len(small), SMALL_FILE_BATCH_SIZE)]
+
+        results = {}
+        if len(batches) <= 1:
+            for batch in batches:
+                results.update(self._hash_batch(batch, checkpoint))
+            return results
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for batch_result in executor.map(lambda batch: self._hash_batch(batch, checkpoint), batches):
+                results.update(batch_result)
+        return results
+
+    def mod_fingerprint(self, mod_path: str, files: Dict[str, List[int]] = None, checkpoint=None) -> Dict[str, Any]:
+        """
+        计算模组内容指纹：对所有文件的 (相对路径, 大小, 哈希) 排序后再整体哈希
+        files 为已知的文件列表 {相对路径: [大小, mtime_ns]}（例如来自状态缓存），省略时遍历模组文件夹
+        返回: {'digest': 指纹, 'files': 文件数, 'size': 总大小}
+        """
+        if files is None:
+            files = {}
+            for dirpath, dirnames, filenames in os.walk(mod_path):
+                for filename in filenames:
+                    full_path = os.path.join(dirpath, filename)
+                    rel_path = os.path.relpath(full_path, mod_path).replace(os.sep, '/')
+                    files[rel_path] = [os.path.getsize(full_path), 0]
+        paths = {
+            rel_path: os.path.join(mod_path, *rel_path.split('/'))
+            for rel_path in files if rel_path not in self.ignored_files
+        }
+
+        hashes = self.hash_files(list(paths.values()), checkpoint)
+        digest = hashlib.new(self.algorithm)
+        total_size = 0
+        for rel_path in sorted(paths):
+            size = files[rel_path][0]
+            total_size += size
+            digest.update(f"{rel_path}\0{size}\0{hashes[paths[rel_path]]}\n".encode('utf-8'))
+        return {'digest': digest.hexdigest(), 'files': len(paths), 'size': total_size}
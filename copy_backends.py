@@ -0,0 +1,157 @@
+"""
+文件复制后端模块
+Linux 上优先使用内核零拷贝（os.copy_file_range / os.sendfile），保留稀疏文件的空洞；
+内核路径不可用或失败时回退到大缓冲区的用户态复制
+"""
+
+import errno
+import os
+import sys
+from typing import Callable, List, Optional, Tuple
+
+# 每次内核复制调用处理的最大字节数（同时也是限速的粒度）
+KERNEL_COPY_CHUNK_SIZE = 8 * 1024 * 1024
+# 回退用户态复制时的缓冲区大小
+BUFFERED_COPY_SIZE = 8 * 1024 * 1024
+
+# 可用的复制后端（auto 按顺序尝试 copy_file_range、sendfile、buffered）
+COPY_BACKENDS = ('auto', 'copy_file_range', 'sendfile', 'buffered')
+
+# 内核路径不支持当前文件/文件系统时返回的错误码，出现时回退到用户态复制
+_FALLBACK_ERRNOS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+    getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP), errno.EBADF, errno.EPERM
+}
+
+
+def available_backends() -> List[str]:
+    """返回当前平台可用的具体复制后端"""
+    backends = []
+    if hasattr(os, 'copy_file_range'):
+        backends.append('copy_file_range')
+    if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+        backends.append('sendfile')
+    backends.append('buffered')
+    return backends
+
+
+def data_regions(fd: int, size: int) -> List[Tuple[int, int]]:
+    """
+    返回文件中的数据区域 [(偏移, 长度), ...]，跳过稀疏空洞
+    不支持 SEEK_DATA/SEEK_HOLE 时整个文件视为一个数据区域
+    """
+    if not hasattr(os, 'SEEK_DATA') or size == 0:
+        return [(0, size)] if size else []
+    regions = []
+    offset = 0
+    try:
+        while offset < size:
+            try:
+                start = os.lseek(fd, offset, os.SEEK_DATA)
+            except OSError as e:
+                # ENXIO: 偏移之后没有数据了
+                if e.errno == errno.ENXIO:
+                    break
+                raise
+            end = os.lseek(fd, start, os.SEEK_HOLE)
+            regions.append((start, min(end, size) - start))
+            offset = end
+    except OSError:
+        return [(0, size)]
+    finally:
+        os.lseek(fd, 0, os.SEEK_SET)
+    return regions
+
+
+def _copy_regions_copy_file_range(src_fd: int, dst_fd: int, regions, throttle) -> None:
+    """使用 copy_file_range 按数据区域复制"""
+    for offset, length in regions:
+        end = offset + length
+        while offset < end:
+            count = min(KERNEL_COPY_CHUNK_SIZE, end - offset)
+            if throttle:
+                throttle(count)
+            copied = os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+            if copied == 0:
+                raise OSError(errno.EIO, "copy_file_range 提前结束")
+            offset += copied
+
+
+def _copy_regions_sendfile(src_fd: int, dst_fd: int, regions, throttle) -> None:
+    """使用 sendfile 按数据区域复制"""
+    for offset, length in regions:
+        end = offset + length
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+        while offset < end:
+            count = min(KERNEL_COPY_CHUNK_SIZE, end - offset)
+            if throttle:
+                throttle(count)
+            sent = os.sendfile(dst_fd, src_fd, offset, count)
+            if sent == 0:
+                raise OSError(errno.EIO, "sendfile 提前结束")
+            offset += sent
+
+
+def _copy_regions_buffered(src_fd: int, dst_fd: int, regions, throttle) -> None:
+    """使用大缓冲区在用户态按数据区域复制"""
+    buffer = bytearray(BUFFERED_COPY_SIZE)
+    view = memoryview(buffer)
+    with open(src_fd, 'rb', buffering=0, closefd=False) as fsrc, \
+            open(dst_fd, 'wb', buffering=0, closefd=False) as fdst:
+        for offset, length in regions:
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            remaining = length
+            while remaining > 0:
+                n = fsrc.readinto(view[:min(BUFFERED_COPY_SIZE, remaining)])
+                if not n:
+                    # 源文件比复制开始时短（例如被截断）：不能让后面的 ftruncate 用零补齐
+                    raise OSError(errno.EIO, "读取源文件时提前结束")
+                if throttle:
+                    throttle(n)
+                fdst.write(view[:n])
+                remaining -= n
+
+
+_REGION_COPIERS = {
+    'copy_file_range': _copy_regions_copy_file_range,
+    'sendfile': _copy_regions_sendfile,
+    'buffered': _copy_regions_buffered,
+}
+
+
+def copy_file_data(source_file: str, target_file: str, backend: str = 'auto',
+                   throttle: Optional[Callable[[int], None]] = None) -> str:
+    """
+    复制文件内容（不含元数据），返回实际使用的后端名称
+    throttle(nbytes) 在每块数据复制前调用，用于限速
+    """
+    if backend not in COPY_BACKENDS:
+        raise ValueError(f"不支持的复制后端: {backend}")
+    candidates = available_backends() if backend == 'auto' else [backend, 'buffered']
+
+    src_fd = os.open(source_file, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        size = os.fstat(src_fd).st_size
+        dst_fd = os.open(target_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            regions = data_regions(src_fd, size)
+            for name in candidates:
+                if name not in _REGION_COPIERS or (name != 'buffered' and name not in available_backends()):
+                    continue
+                try:
+                    _REGION_COPIERS[name](src_fd, dst_fd, regions, throttle)
+                except OSError as e:
+                    if name == 'buffered' or e.errno not in _FALLBACK_ERRNOS:
+                        raise
+                    # 内核路径失败：清空目标后用下一个后端重新复制
+                    os.ftruncate(dst_fd, 0)
+                    continue
+                # 通过截断补齐文件末尾的空洞，保持稀疏文件原有大小
+                os.ftruncate(dst_fd, size)
+                return name
+            raise OSError(errno.EIO, f"没有可用的复制后端: {backend}")
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
@@ -0,0 +1,233 @@
+"""
+复制任务调度模块
+按模组大小安排并行复制：默认大任务优先，超大模组拆分为文件级工作单元，并统计工作线程空闲时间；
+给出模组间的依赖关系时，模组在它依赖的模组全部完成后才开始复制，互不依赖的分支仍然并行
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, Any, Tuple
+
+from cancellation import CancelToken, OperationCancelled
+from structured_log import get_logger, log_fields
+
+logger = get_logger('copy_scheduler')
+
+# 默认并行复制线程数
+DEFAULT_COPY_WORKERS = 4
+# 超过该大小的模组拆分为文件级工作单元
+SPLIT_MOD_THRESHOLD = 1024 * 1024 * 1024
+# 拆分时小文件合并成的工作单元目标大小
+WORK_UNIT_TARGET_SIZE = 256 * 1024 * 1024
+
+
+class _ModCopyState:
+    """单个模组在调度中的状态（剩余工作单元数、清单条目、是否失败）"""
+
+    def __init__(self, source_path: str, target_path: str, files: Dict[str, List[int]]):
+        self.source_path = source_path
+        self.target_path = target_path
+        self.files = files
+        self.size = sum(size for size, _ in files.values())
+        # 实际写入的字节数（按传输日志跳过的文件不计），只在模组成功时计入日志
+        self.written_bytes = 0
+        self.remaining_units = 0
+        self.manifest_files = {}
+        self.error = ""
+        self.lock = threading.Lock()
+        # 尚未完成的依赖模组数，以及依赖本模组的模组
+        self.waiting_on = 0
+        self.dependents = []
+        # 第一个工作单元开始的时间（用于日志中的耗时）
+        self.started = None
+
+
+class CopyScheduler:
+    """按大小调度的并行复制器"""
+
+    def __init__(self, mod_manager, max_workers: int = DEFAULT_COPY_WORKERS, order: str = 'largest',
+                 split_threshold: int = SPLIT_MOD_THRESHOLD, unit_size: int = WORK_UNIT_TARGET_SIZE):
+        if order not in ('largest', 'smallest'):
+            raise ValueError(f"不支持的调度顺序: {order}")
+        self.mod_manager = mod_manager
+        self.max_workers = max(1, max_workers or DEFAULT_COPY_WORKERS)
+        self.order = order
+        self.split_threshold = split_threshold
+        self.unit_size = unit_size
+
+    def build_units(self, states: List[_ModCopyState]) -> List[Tuple[int, _ModCopyState, List[str]]]:
+        """
+        构建工作单元: [(大小, 模组状态, [相对路径, ...]), ...]
+        普通模组整体作为一个单元；超大模组按文件拆分，小文件合并到约 unit_size 大小
+        """
+        units = []
+        for state in states:
+            if state.size <= self.split_threshold:
+                mod_units = [(state.size, state, list(state.files))]
+            else:
+                mod_units = []
+                group, group_size = [], 0
+                for rel_path, (size, _) in sorted(state.files.items(), key=lambda item: -item[1][0]):
+                    if size >= self.unit_size:
+                        mod_units.append((size, state, [rel_path]))
+                        continue
+                    group.append(rel_path)
+                    group_size += size
+                    if group_size >= self.unit_size:
+                        mod_units.append((group_size, state, group))
+                        group, group_size = [], 0
+                if group:
+                    mod_units.append((group_size, state, group))
+            # 空模组也需要一个单元来完成收尾
+            if not mod_units:
+                mod_units = [(0, state, [])]
+            state.remaining_units = len(mod_units)
+            units.extend(mod_units)
+
+        # 稳定排序：同样大小时保持配置中的顺序
+        units.sort(key=lambda unit: unit[0], reverse=(self.order == 'largest'))
+        return units
+
+    def run(self, jobs: List[Tuple[str, str]], verify: bool = False, journal=None,
+            progress_callback=None, mod_callback=None,
+            dependencies: Dict[str, List[str]] = None, cancel_token: CancelToken = None) -> Dict[str, Any]:
+        """
+        执行复制任务，返回每个目标路径的结果与空闲时间报告
+        progress_callback(已完成字节数, 总字节数) 在每个工作单元完成后调用；
+        mod_callback(目标路径, 是否成功, 错误信息) 在每个模组完成（或规划失败）时调用（在工作线程中）；
+        dependencies 为 {目标路径: [需要先完成的目标路径, ...]}（不能有环），依赖的模组完成（无论成败）后才开始复制；
+        通过 cancel_token 请求取消后各线程复制完当前文件即停止，结果中 cancelled 为 True
+        """
+        manager = self.mod_manager
+        cancel_token = cancel_token or CancelToken()
+        states = []
+        results = {}
+        for source_path, target_path in jobs:
+            if cancel_token.cancelled:
+                break
+            try:
+                files = manager.plan_mod_copy(source_path, target_path, journal, cancel_token)
+                states.append(_ModCopyState(source_path, target_path, files))
+            except Exception as e:
+                logger.error(f"规划模组复制时出错: {e}", extra=log_fields(phase='copy_plan', path=target_path))
+                results[target_path] = False
+                if mod_callback:
+                    mod_callback(target_path, False, str(e))
+
+        by_target = {state.target_path: state for state in states}
+        for state in states:
+            for dep_path in (dependencies or {}).get(state.target_path, []):
+                dep_state = by_target.get(dep_path)
+                if dep_state is not None and dep_state is not state:
+                    dep_state.dependents.append(state)
+                    state.waiting_on += 1
+
+        units = self.build_units(states)
+        total_bytes = sum(unit[0] for unit in units)
+        done_bytes = [0]
+        queue_lock = threading.Lock()
+        # 有单元因依赖未完成而暂不可取时，工作线程在此等待
+        ready = threading.Condition(queue_lock)
+        pending = list(units)
+        worker_count = min(self.max_workers, len(units)) or 1
+        worker_stats = [{'worker': i, 'units': 0, 'bytes': 0, 'busy_seconds': 0.0} for i in range(worker_count)]
+
+        def take_unit():
+            """按排序取第一个依赖已全部完成的单元；全部取完（或已取消）时返回 None"""
+            with ready:
+                while True:
+                    if cancel_token.cancelled or not pending:
+                        return None
+                    for index, unit in enumerate(pending):
+                        if unit[1].waiting_on == 0:
+                            return pending.pop(index)
+                    ready.wait(0.5)
+
+        def release_dependents(state):
+            with ready:
+                for dependent in state.dependents:
+                    dependent.waiting_on -= 1
+                ready.notify_all()
+
+        def run_unit(unit):
+            size, state, rel_paths = unit
+            with state.lock:
+                if state.started is None:
+                    state.started = time.monotonic()
+            for rel_path in rel_paths:
+                if state.error:
+                    break
+                try:
+                    entry, written = manager.copy_mod_file(
+                        state.source_path, state.target_path, rel_path, state.files[rel_path][0], verify, journal,
+                        cancel_token
+                    )
+                    with state.lock:
+                        state.manifest_files[rel_path] = entry
+                        state.written_bytes += written
+                except OperationCancelled as e:
+                    state.error = str(e)
+                    break
+                except Exception as e:
+                    logger.error(f"复制模组文件时出错: {e}", extra=log_fields(phase='copy', path=state.target_path))
+                    state.error = str(e)
+            with state.lock:
+                state.remaining_units -= 1
+                finished = state.remaining_units == 0
+            if finished:
+                if not state.error:
+                    try:
+                        manager.finish_mod_copy(state.target_path, state.manifest_files, verify, journal)
+                    except Exception as e:
+                        logger.error(f"完成模组复制时出错: {e}", extra=log_fields(phase='copy', path=state.target_path))
+                        state.error = str(e)
+                results[state.target_path] = not state.error
+                duration = time.monotonic() - state.started
+                if state.error:
+                    logger.debug(f"模组复制失败: {os.path.basename(state.target_path)}",
+                                 extra=log_fields(phase='copy', path=state.target_path, duration=duration))
+                else:
+                    # 日志中的字节数只计本次实际写入的数据，供守护进程统计复制字节数与吞吐量
+                    logger.debug(f"模组复制完成: {os.path.basename(state.target_path)}",
+                                 extra=log_fields(phase='copy', size=state.written_bytes, path=state.target_path,
+                                                  duration=duration))
+                release_dependents(state)
+                if mod_callback:
+                    mod_callback(state.target_path, not state.error, state.error)
+
+        def worker(stats):
+            manager.io_throttle.apply_priority()
+            while True:
+                unit = take_unit()
+                if unit is None:
+                    break
+                started = time.monotonic()
+                run_unit(unit)
+                stats['busy_seconds'] += time.monotonic() - started
+                stats['units'] += 1
+                stats['bytes'] += unit[0]
+                if progress_callback:
+                    with queue_lock:
+                        done_bytes[0] += unit[0]
+                        done = done_bytes[0]
+                    progress_callback(done, total_bytes)
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=worker, args=(stats,), daemon=True) for stats in worker_stats]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.monotonic() - started
+
+        for stats in worker_stats:
+            stats['idle_seconds'] = max(0.0, wall_seconds - stats['busy_seconds'])
+
+        return {
+            'results': results,
+            'cancelled': cancel_token.cancelled,
+            'wall_seconds': wall_seconds,
+            'idle_seconds': sum(stats['idle_seconds'] for stats in worker_stats),
+            'worker_stats': worker_stats
+        }
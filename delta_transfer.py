@@ -0,0 +1,539 @@
+"""
+增量传输模块
+rsync 风格的滚动校验增量协议：接收端（运行在服务器主机上）为已有文件计算块签名，
+发送端只把变化的数据块通过 TCP 发送过去，接收端用已有的块和新数据重建文件
+
+协议帧: 4 字节大端长度 + UTF-8 JSON 头；头中带 length 字段时紧跟对应字节数的二进制数据
+发送端必须在 hello 帧中带上接收端启动时生成的令牌，否则连接被拒绝
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import shutil
+import socket
+import struct
+import threading
+import zlib
+from typing import BinaryIO, Callable, Dict, Iterator, List, Any, Optional, Tuple
+
+from cancellation import CancelToken
+from structured_log import get_logger, log_fields
+
+logger = get_logger('delta_transfer')
+
+# 协议版本
+PROTOCOL_VERSION = 1
+# 默认端口
+DEFAULT_DELTA_PORT = 47811
+# 最小块大小与单个文件的最大块数（大文件按块数上限放大块大小）
+MIN_BLOCK_SIZE = 64 * 1024
+MAX_BLOCKS_PER_FILE = 16384
+# 匹配中断后最多对多少个连续失配的块做滚动查找（滚动查找在 Python 中逐字节进行，代价较高）
+MAX_ROLLING_SEARCH_BLOCKS = 2
+# 累积多少字面数据后发送一帧
+LITERAL_FLUSH_SIZE = 1024 * 1024
+# 接收端写入时的临时文件后缀
+PARTIAL_FILE_SUFFIX = '.part'
+
+# Adler-32 的模数（弱校验和使用 Adler-32，可由 zlib 在 C 中计算，并支持逐字节滚动）
+_ADLER_MOD = 65521
+
+_HEADER_LENGTH = struct.Struct('>I')
+
+
+def choose_block_size(size: int) -> int:
+    """按文件大小选择块大小（4 KB 对齐，块数不超过 MAX_BLOCKS_PER_FILE）"""
+    block_size = max(MIN_BLOCK_SIZE, -(-size // MAX_BLOCKS_PER_FILE))
+    return -(-block_size // 4096) * 4096
+
+
+def weak_checksum(data: bytes) -> int:
+    """弱校验和（Adler-32，低 16 位为 a，高 16 位为 b）"""
+    return zlib.adler32(data)
+
+
+def strong_checksum(data: bytes) -> str:
+    """强校验和"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_signature(path: str, block_size: int) -> List[List[Any]]:
+    """计算已有文件的块签名: [[弱校验和, 强校验和], ...]"""
+    blocks = []
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            blocks.append([weak_checksum(block), strong_checksum(block)])
+    return blocks
+
+
+def safe_join(root: str, rel_path: str) -> str:
+    """拼接相对路径并确保结果位于 root 之内（拒绝绝对路径与 ..）"""
+    parts = [part for part in rel_path.replace('\\', '/').split('/') if part not in ('', '.')]
+    if not parts or any(part == '..' for part in parts) or os.path.isabs(rel_path):
+        raise ValueError(f"非法路径: {rel_path}")
+    return os.path.join(root, *parts)
+
+
+def rolling_search(buffer: bytes, block_size: int, weak_index: Dict[int, List[int]],
+                   blocks: List[List[Any]]) -> Optional[Tuple[int, int]]:
+    """在 buffer 的前一个块范围内滚动查找与已有块相同的窗口，返回 (偏移, 块序号)"""
+    limit = min(block_size, len(buffer) - block_size)
+    weak = weak_checksum(buffer[:block_size])
+    a, b = weak & 0xFFFF, weak >> 16
+    for offset in range(1, limit + 1):
+        out_byte = buffer[offset - 1]
+        in_byte = buffer[offset + block_size - 1]
+        # Adler-32 滚动: a' = a - out + in，b' = b - L*out + a' - 1
+        a = (a - out_byte + in_byte) % _ADLER_MOD
+        b = (b - block_size * out_byte + a - 1) % _ADLER_MOD
+        candidates = weak_index.get(a | (b << 16))
+        if candidates:
+            strong = strong_checksum(buffer[offset:offset + block_size])
+            for index in candidates:
+                if blocks[index][1] == strong:
+                    return offset, index
+    return None
+
+
+def generate_delta(path: str, block_size: int, blocks: List[List[Any]],
+                   stats: Dict[str, Any] = None, open_file: Callable[[str], BinaryIO] = None) -> Iterator[Tuple]:
+    """
+    生成把基准文件（块签名为 blocks）重建为 path 的增量指令（open_file(path) 打开二进制读取流，
+    例如 ModManager.open_source_file 可读取压缩包中的文件，默认直接打开文件）:
+    ('copy', 块序号, 连续块数) 与 ('data', 字面数据)，最后一条为 ('end', path 的 SHA-256)
+    先按块对齐直接比较强校验和；对齐比较在变化区域开头失配时，
+    在随后 MAX_ROLLING_SEARCH_BLOCKS 个块内用滚动弱校验和查找平移后的匹配（处理插入/删除造成的偏移）；
+    连续的复制合并为一条指令，字面数据累积到 LITERAL_FLUSH_SIZE 再输出
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault('bytes_literal', 0)
+    stats.setdefault('bytes_matched', 0)
+
+    strong_index = {}
+    weak_index = {}
+    for index, (weak, strong) in enumerate(blocks):
+        strong_index.setdefault(strong, index)
+        weak_index.setdefault(weak, []).append(index)
+
+    digest = hashlib.sha256()
+    literal = bytearray()
+    pending_copy = [None, 0]
+    # 已生成、等待输出的指令
+    ready = []
+
+    def flush_literal():
+        if literal:
+            ready.append(('data', bytes(literal)))
+            stats['bytes_literal'] += len(literal)
+            literal.clear()
+
+    def flush_copy():
+        if pending_copy[0] is not None:
+            ready.append(('copy', pending_copy[0], pending_copy[1]))
+            pending_copy[0], pending_copy[1] = None, 0
+
+    def emit_copy(index, data):
+        flush_literal()
+        if pending_copy[0] is not None and pending_copy[0] + pending_copy[1] == index:
+            pending_copy[1] += 1
+        else:
+            flush_copy()
+            pending_copy[0], pending_copy[1] = index, 1
+        digest.update(data)
+        stats['bytes_matched'] += len(data)
+
+    def emit_literal(data):
+        flush_copy()
+        literal.extend(data)
+        digest.update(data)
+        if len(literal) >= LITERAL_FLUSH_SIZE:
+            flush_literal()
+
+    with (open_file(path) if open_file else open(path, 'rb')) as f:
+        buffer = b''
+        pos = 0
+        eof = False
+        # 自上次匹配以来连续失配的块数
+        misses = 0
+        while True:
+            if ready:
+                yield from ready
+                ready.clear()
+            # 保证缓冲区中至少有两个块（滚动查找需要），读入时丢弃已处理的数据
+            if not eof and len(buffer) - pos < 2 * block_size:
+                chunk = f.read(4 * block_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+            if pos >= len(buffer):
+                break
+            window = buffer[pos:pos + block_size]
+            index = strong_index.get(strong_checksum(window)) if blocks else None
+            if index is not None:
+                emit_copy(index, window)
+                pos += len(window)
+                misses = 0
+                continue
+            if misses < MAX_ROLLING_SEARCH_BLOCKS and blocks and len(buffer) - pos > block_size:
+                lookahead = buffer[pos:pos + 2 * block_size]
+                found = rolling_search(lookahead, block_size, weak_index, blocks)
+                if found is not None:
+                    offset, index = found
+                    emit_literal(lookahead[:offset])
+                    emit_copy(index, lookahead[offset:offset + block_size])
+                    pos += offset + block_size
+                    misses = 0
+                    continue
+            emit_literal(window)
+            pos += len(window)
+            misses += 1
+
+    flush_copy()
+    flush_literal()
+    yield from ready
+    yield ('end', digest.hexdigest())
+
+
+def copy_basis_blocks(basis_f: BinaryIO, out: BinaryIO, digest, index: int, count: int, block_size: int) -> None:
+    """执行 copy 指令：把基准文件中从第 index 块开始的 count 个块写入输出并更新摘要"""
+    basis_f.seek(index * block_size)
+    remaining = count * block_size
+    while remaining > 0:
+        chunk = basis_f.read(min(remaining, LITERAL_FLUSH_SIZE))
+        if not chunk:
+            break
+        out.write(chunk)
+        digest.update(chunk)
+        remaining -= len(chunk)
+
+
+class _Connection:
+    """带帧格式的套接字连接"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.rfile = sock.makefile('rb')
+        self.wfile = sock.makefile('wb')
+
+    def send(self, header: Dict[str, Any], payload: bytes = b'', flush: bool = True) -> None:
+        if payload:
+            header['length'] = len(payload)
+        data = json.dumps(header, ensure_ascii=False).encode('utf-8')
+        self.wfile.write(_HEADER_LENGTH.pack(len(data)))
+        self.wfile.write(data)
+        if payload:
+            self.wfile.write(payload)
+        if flush:
+            self.wfile.flush()
+
+    def recv(self) -> Tuple[Dict[str, Any], bytes]:
+        raw = self.rfile.read(_HEADER_LENGTH.size)
+        if len(raw) < _HEADER_LENGTH.size:
+            raise ConnectionError("连接已关闭")
+        header = json.loads(self.rfile.read(_HEADER_LENGTH.unpack(raw)[0]).decode('utf-8'))
+        payload = b''
+        if header.get('length'):
+            payload = self.rfile.read(header['length'])
+            if len(payload) < header['length']:
+                raise ConnectionError("数据不完整")
+        return header, payload
+
+    def close(self) -> None:
+        for f in (self.wfile, self.rfile):
+            try:
+                f.close()
+            except OSError:
+                pass
+        self.sock.close()
+
+
+class DeltaReceiver:
+    """
+    增量传输接收端
+    收到的模组写入 root_folder/mods_update/{名称}/，已安装的同一模组（按 mod_id 查找）作为重建的基准，
+    之后可在服务器主机上用 ModManager.apply_staged_updates 通过重命名应用
+    默认只监听本机；token 为空时随机生成，发送端需在 hello 帧中提供相同的令牌
+    """
+
+    def __init__(self, mod_manager, root_folder: str, host: str = '127.0.0.1', port: int = DEFAULT_DELTA_PORT,
+                 staging_folder_name: str = 'mods_update', token: str = None):
+        self.mod_manager = mod_manager
+        self.root_folder = root_folder
+        self.staging_folder = os.path.join(root_folder, staging_folder_name)
+        self.host = host
+        self.port = port
+        self.token = token or secrets.token_urlsafe(16)
+        self._server = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """实际监听的地址（port=0 时由系统分配端口）"""
+        return self._server.getsockname()[:2]
+
+    def start(self) -> Tuple[str, int]:
+        """开始在后台线程中监听，返回监听地址"""
+        self._server = socket.create_server((self.host, self.port))
+        self._server.settimeout(0.5)
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.address
+
+    def stop(self) -> None:
+        """停止监听"""
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+        if self._server:
+            self._server.close()
+
+    def serve_forever(self) -> None:
+        """依次处理发送端的连接"""
+        while not self._stopping.is_set():
+            try:
+                sock, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            sock.settimeout(None)
+            connection = _Connection(sock)
+            try:
+                self.handle(connection)
+            except Exception as e:
+                logger.error(f"增量传输接收出错: {e}", extra=log_fields(phase='delta_receive'))
+            finally:
+                connection.close()
+
+    def basis_file(self, mod_id: str, mod_name: str, rel_path: str) -> str:
+        """查找用于重建的已有文件：已安装的同一模组中相同相对路径的文件"""
+        if not mod_id:
+            return ""
+        installed = self.mod_manager.find_existing_mod_path(self.root_folder, mod_id)
+        if not installed:
+            return ""
+        try:
+            candidate = safe_join(installed, rel_path)
+        except ValueError:
+            return ""
+        return candidate if os.path.isfile(candidate) else ""
+
+    def handle(self, connection: _Connection) -> None:
+        """处理一个发送端连接"""
+        header, _ = connection.recv()
+        if header.get('op') != 'hello' or header.get('version') != PROTOCOL_VERSION:
+            connection.send({'op': 'error', 'message': "协议版本不匹配"})
+            return
+        # 校验令牌之前不做任何文件操作（reset 会清空暂存文件夹）
+        if not hmac.compare_digest(str(header.get('token', '')).encode('utf-8'), self.token.encode('utf-8')):
+            logger.warning("增量传输连接的令牌不正确，已拒绝", extra=log_fields(phase='delta_receive'))
+            connection.send({'op': 'error', 'message': "令牌不正确"})
+            return
+        if header.get('reset') and os.path.isdir(self.staging_folder):
+            shutil.rmtree(self.staging_folder)
+        os.makedirs(self.staging_folder, exist_ok=True)
+        connection.send({'op': 'hello', 'version': PROTOCOL_VERSION})
+
+        while True:
+            header, _ = connection.recv()
+            op = header.get('op')
+            if op == 'done':
+                self.mod_manager.clear_listing_cache()
+                connection.send({'op': 'bye'})
+                return
+            if op != 'file':
+                connection.send({'op': 'error', 'message': f"未知操作: {op}"})
+                return
+            try:
+                self.receive_file(connection, header)
+            except ConnectionError:
+                # 连接已断开，无法再回复
+                raise
+            except (ValueError, OSError) as e:
+                connection.send({'op': 'error', 'path': header.get('path', ''), 'message': str(e)})
+
+    def receive_file(self, connection: _Connection, header: Dict[str, Any]) -> None:
+        """接收单个文件：先回复基准文件的块签名，再按增量指令重建"""
+        mod_name = header.get('mod', '')
+        rel_path = header['path']
+        mod_folder = safe_join(self.staging_folder, mod_name) if mod_name else self.staging_folder
+        target_file = safe_join(mod_folder, rel_path)
+        basis = self.basis_file(header.get('mod_id', ''), mod_name, rel_path)
+
+        block_size = choose_block_size(os.path.getsize(basis) if basis else header.get('size', 0))
+        blocks = file_signature(basis, block_size) if basis else []
+        connection.send({'op': 'signature', 'block_size': block_size, 'blocks': blocks})
+
+        partial_file = target_file + PARTIAL_FILE_SUFFIX
+        digest = hashlib.sha256()
+        basis_f = None
+        out = None
+        # 签名已发出，之后的本地错误（如磁盘已满）只记录下来，继续读完本文件的指令直到 end，
+        # 保持与发送端的协议同步，再回复 error
+        error = ""
+        try:
+            os.makedirs(os.path.dirname(target_file), exist_ok=True)
+            basis_f = open(basis, 'rb') if basis else None
+            out = open(partial_file, 'wb')
+        except OSError as e:
+            error = f"无法写入文件: {e}"
+        try:
+            while True:
+                instruction, payload = connection.recv()
+                op = instruction.get('op')
+                if op == 'end':
+                    break
+                if error:
+                    continue
+                try:
+                    if op == 'data':
+                        out.write(payload)
+                        digest.update(payload)
+                    elif op == 'copy' and basis_f is not None:
+                        copy_basis_blocks(basis_f, out, digest, instruction['index'], instruction['count'], block_size)
+                    else:
+                        error = f"无效的增量指令: {op}"
+                except OSError as e:
+                    error = f"写入文件时出错: {e}"
+        except ConnectionError:
+            # 发送端中途断开（例如取消推送）时不留下临时文件
+            self.close_quietly(out)
+            self.remove_partial(partial_file)
+            raise
+        finally:
+            self.close_quietly(basis_f)
+        if out is not None:
+            try:
+                out.close()
+            except OSError as e:
+                error = error or f"写入文件时出错: {e}"
+
+        if not error and digest.hexdigest() != instruction.get('sha256'):
+            error = f"重建后的文件校验失败: {rel_path}"
+        if error:
+            self.remove_partial(partial_file)
+            raise ValueError(error)
+        try:
+            os.replace(partial_file, target_file)
+            if instruction.get('mtime_ns'):
+                os.utime(target_file, ns=(instruction['mtime_ns'], instruction['mtime_ns']))
+        except OSError:
+            self.remove_partial(partial_file)
+            raise
+        connection.send({'op': 'ok', 'path': rel_path})
+
+    @staticmethod
+    def close_quietly(f: Optional[BinaryIO]) -> None:
+        """关闭文件（为 None 或关闭失败时忽略）"""
+        if f is not None:
+            try:
+                f.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def remove_partial(partial_file: str) -> None:
+        """删除未完成的临时文件（不存在或无法删除时忽略）"""
+        try:
+            os.remove(partial_file)
+        except OSError:
+            pass
+
+
+class DeltaSender:
+    """
+    增量传输发送端：把本地 mods_update/ 中的模组推送到接收端
+    token 为接收端显示的令牌，cancel_token 为本次推送的取消与暂停控制
+    """
+
+    def __init__(self, mod_manager, host: str, port: int = DEFAULT_DELTA_PORT, timeout: float = 60,
+                 cancel_token: CancelToken = None, token: str = ''):
+        self.mod_manager = mod_manager
+        self.cancel_token = cancel_token or CancelToken()
+        self.host = host
+        self.port = port
+        self.token = token
+        self.timeout = timeout
+        self.stats = {'files': 0, 'bytes_total': 0, 'bytes_literal': 0, 'bytes_matched': 0, 'errors': []}
+
+    def push_folder(self, update_folder: str, reset: bool = True) -> Dict[str, Any]:
+        """
+        推送更新文件夹中的所有模组和根目录文件（如 mod_info.json）
+        reset=True 时接收端先清空其暂存文件夹
+        """
+        staged_info = {}
+        info_path = os.path.join(update_folder, 'mod_info.json')
+        if os.path.isfile(info_path):
+            with open(info_path, 'r', encoding='utf-8') as f:
+                staged_info = json.load(f)
+
+        connection = _Connection(socket.create_connection((self.host, self.port), timeout=self.timeout))
+        try:
+            connection.send({'op': 'hello', 'version': PROTOCOL_VERSION, 'reset': reset, 'token': self.token})
+            header, _ = connection.recv()
+            if header.get('op') != 'hello':
+                raise ConnectionError(header.get('message', "握手失败"))
+
+            for name in sorted(os.listdir(update_folder)):
+                path = os.path.join(update_folder, name)
+                if os.path.isdir(path):
+                    mod_id = next((mid for mid in staged_info if mid in name), "")
+                    if not mod_id:
+                        mod_id = self.mod_manager.read_server_data(path).get('id', '')
+                    self.push_mod(connection, path, name, mod_id)
+                elif os.path.isfile(path):
+                    self.push_file(connection, path, "", "", name)
+
+            connection.send({'op': 'done'})
+            connection.recv()
+        finally:
+            connection.close()
+        return self.stats
+
+    def push_mod(self, connection: _Connection, mod_path: str, mod_name: str, mod_id: str) -> None:
+        """推送单个模组的所有文件"""
+        for rel_path in self.mod_manager.list_mod_files(mod_path, self.cancel_token):
+            self.push_file(connection, os.path.join(mod_path, *rel_path.split('/')), mod_name, mod_id, rel_path)
+
+    def push_file(self, connection: _Connection, path: str, mod_name: str, mod_id: str, rel_path: str) -> None:
+        """推送单个文件：取得接收端签名后发送增量指令"""
+        self.cancel_token.checkpoint()
+        st = os.stat(path)
+        connection.send({'op': 'file', 'mod': mod_name, 'mod_id': mod_id, 'path': rel_path, 'size': st.st_size})
+        header, _ = connection.recv()
+        if header.get('op') == 'error':
+            self.stats['errors'].append({'path': rel_path, 'message': header.get('message', '')})
+            logger.error(f"推送文件失败: {rel_path} - {header.get('message', '')}", extra=log_fields(phase='delta_push', path=rel_path))
+            return
+        if header.get('op') != 'signature':
+            raise ConnectionError("未收到块签名")
+
+        file_hash = self.send_delta(connection, path, header['block_size'], header['blocks'])
+        connection.send({'op': 'end', 'sha256': file_hash, 'mtime_ns': st.st_mtime_ns})
+        reply, _ = connection.recv()
+        if reply.get('op') != 'ok':
+            self.stats['errors'].append({'path': rel_path, 'message': reply.get('message', '')})
+            logger.error(f"推送文件失败: {rel_path} - {reply.get('message', '')}", extra=log_fields(phase='delta_push', path=rel_path))
+            return
+        # 只统计接收端确认写入的文件
+        self.stats['files'] += 1
+        self.stats['bytes_total'] += st.st_size
+
+    def send_delta(self, connection: _Connection, path: str, block_size: int, blocks: List[List[Any]]) -> str:
+        """生成并发送增量指令（连续的字面数据合并后分帧发送），返回源文件的 SHA-256"""
+        for instruction in generate_delta(path, block_size, blocks, self.stats):
+            if instruction[0] == 'copy':
+                connection.send({'op': 'copy', 'index': instruction[1], 'count': instruction[2]}, flush=False)
+            elif instruction[0] == 'data':
+                connection.send({'op': 'data'}, instruction[1], flush=False)
+            else:
+                return instruction[1]
+        return ""
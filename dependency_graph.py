@@ -0,0 +1,110 @@
+"""
+模组依赖图模块
+根据各模组 ServerData.json 中的依赖列表（见 metadata_scanner.parse_dependencies）建立依赖图：
+求服务器配置中模组的传递闭包，找出源中缺失或版本不一致的依赖，
+并为复制调度给出无环的依赖关系（依赖先于依赖它的模组完成，互不依赖的分支并行复制）
+"""
+
+from typing import Dict, List, Any, Iterable
+
+# 依赖问题类型
+PROBLEM_MISSING = 'missing'
+PROBLEM_VERSION_MISMATCH = 'version_mismatch'
+
+
+class DependencyGraph:
+    """模组依赖图，节点为源中模组的元数据记录"""
+
+    def __init__(self, records: Dict[str, Dict[str, Any]] = None):
+        # {mod_id: 紧凑记录}
+        self.records = {}
+        if records:
+            self.add_records(records)
+
+    def add_records(self, records: Dict[str, Dict[str, Any]]) -> None:
+        """加入（或更新）模组记录"""
+        self.records.update(records)
+
+    def dependencies(self, mod_id: str) -> List[Dict[str, str]]:
+        """模组声明的直接依赖 [{'id', 'version'}, ...]，模组不在图中时为空"""
+        record = self.records.get(mod_id)
+        return list(record.get('dependencies', [])) if record else []
+
+    def unresolved(self, mod_ids: Iterable[str]) -> List[str]:
+        """传递闭包中被引用但还没有记录的模组 ID（需要再从源中读取元数据）"""
+        return [mod_id for mod_id in self.closure(mod_ids) if mod_id not in self.records]
+
+    def closure(self, mod_ids: Iterable[str]) -> List[str]:
+        """传递闭包：给定模组及其直接、间接依赖的全部 ID（给定模组在前，依赖按发现顺序排列）"""
+        order = []
+        seen = set()
+        stack = list(reversed(list(mod_ids)))
+        while stack:
+            mod_id = stack.pop()
+            if mod_id in seen:
+                continue
+            seen.add(mod_id)
+            order.append(mod_id)
+            stack.extend(dep['id'] for dep in reversed(self.dependencies(mod_id)) if dep['id'] not in seen)
+        return order
+
+    def check(self, mod_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        检查传递闭包中的每条依赖，返回问题列表:
+        [{'mod_id', 'dependency', 'problem', 'required_version', 'available_version'}, ...]
+        problem 为 missing（源中没有该模组）或 version_mismatch（源中版本与要求的版本不同）
+        """
+        problems = []
+        for mod_id in self.closure(mod_ids):
+            for dep in self.dependencies(mod_id):
+                record = self.records.get(dep['id'])
+                required = dep.get('version', '')
+                if record is None:
+                    problems.append({
+                        'mod_id': mod_id,
+                        'dependency': dep['id'],
+                        'problem': PROBLEM_MISSING,
+                        'required_version': required,
+                        'available_version': ''
+                    })
+                elif required and record.get('version') and record['version'] != required:
+                    problems.append({
+                        'mod_id': mod_id,
+                        'dependency': dep['id'],
+                        'problem': PROBLEM_VERSION_MISMATCH,
+                        'required_version': required,
+                        'available_version': record['version']
+                    })
+        return problems
+
+    def ordering_edges(self, mod_ids: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        给定模组之间的依赖关系 {mod_id: [需要先完成的 mod_id, ...]}，只保留两端都在给定模组中的依赖；
+        循环依赖中形成环的边被去掉，保证按这些关系调度不会互相等待
+        """
+        mod_ids = list(dict.fromkeys(mod_ids))
+        members = set(mod_ids)
+        edges = {mod_id: [] for mod_id in mod_ids}
+        # 深度优先遍历，指向仍在遍历路径上的模组（回边）即成环，跳过
+        state = {}
+        for root in mod_ids:
+            if root in state:
+                continue
+            state[root] = 'active'
+            stack = [(root, iter(self.dependencies(root)))]
+            while stack:
+                mod_id, deps = stack[-1]
+                dep = next(deps, None)
+                if dep is None:
+                    state[mod_id] = 'done'
+                    stack.pop()
+                    continue
+                dep_id = dep['id']
+                if dep_id not in members or dep_id == mod_id or state.get(dep_id) == 'active':
+                    continue
+                if dep_id not in edges[mod_id]:
+                    edges[mod_id].append(dep_id)
+                if dep_id not in state:
+                    state[dep_id] = 'active'
+                    stack.append((dep_id, iter(self.dependencies(dep_id))))
+        return edges
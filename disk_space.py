@@ -0,0 +1,79 @@
+"""
+磁盘空间预检模块
+复制开始前按目标所在的文件系统汇总计划写入的字节数（同一目标只计一次，硬链接不占新空间），
+与各文件系统的可用空间比较；空间不足时可按剩余空间分批执行，保证不会写入超过可用空间的数据
+"""
+
+import os
+import shutil
+from typing import Dict, List, Any, Tuple
+
+# 预检时额外保留的空间（传输日志、清单、文件系统元数据等）
+SPACE_RESERVE_BYTES = 256 * 1024 * 1024
+
+
+def existing_ancestor(path: str) -> str:
+    """返回 path 本身或其最近的已存在上级目录（目标文件夹可能尚未创建）"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def device_id(path: str) -> int:
+    """path 所在文件系统的设备号"""
+    return os.stat(existing_ancestor(path)).st_dev
+
+
+def available_bytes(path: str, reserve: int = SPACE_RESERVE_BYTES) -> int:
+    """path 所在文件系统扣除保留空间后可以写入的字节数"""
+    return max(0, shutil.disk_usage(existing_ancestor(path)).free - reserve)
+
+
+def format_megabytes(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+def check_space(requirements: Dict[str, int], reserve: int = SPACE_RESERVE_BYTES) -> List[Dict[str, Any]]:
+    """
+    按文件系统汇总计划写入的字节数并与可用空间比较
+    requirements 为 {目标路径: 需要写入的字节数}（调用方已去掉重复目标和硬链接）
+    返回: [{'path': 该文件系统上的第一个目标, 'device', 'required', 'available', 'ok'}, ...]
+    """
+    devices = {}
+    for path, required in requirements.items():
+        device = device_id(path)
+        entry = devices.get(device)
+        if entry is None:
+            entry = devices[device] = {'path': path, 'device': device, 'required': 0,
+                                       'available': available_bytes(path, reserve)}
+        entry['required'] += max(0, required)
+    for entry in devices.values():
+        entry['ok'] = entry['required'] <= entry['available']
+    return list(devices.values())
+
+
+def space_error(shortages: List[Dict[str, Any]]) -> str:
+    """空间不足时给用户的说明"""
+    return "目标磁盘空间不足: " + "; ".join(
+        f"{entry['path']} 需要 {format_megabytes(entry['required'])}，可用 {format_megabytes(entry['available'])}"
+        for entry in shortages
+    )
+
+
+def take_batch(items: List[Tuple[Any, int]], budget: int) -> Tuple[List[Any], List[Tuple[Any, int]]]:
+    """
+    按顺序取出总大小不超过 budget 的一批任务（放不下的任务留到后面的批次，后面较小的任务可以先放入）
+    items 为 [(任务, 需要的字节数), ...]；返回 (本批任务, 剩余的 items)
+    """
+    batch, rest = [], []
+    for item, size in items:
+        if size <= budget:
+            batch.append(item)
+            budget -= size
+        else:
+            rest.append((item, size))
+    return batch, rest
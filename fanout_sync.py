@@ -0,0 +1,281 @@
+"""
+多目标同步模块
+把同一组模组同步到多个目标文件夹（例如同一台主机上的多个服务器实例）：
+每个需要复制的源文件只读取一次，数据同时写入每个文件系统上的一个目标；
+同一文件系统上的其他目标直接硬链接到已写好的文件（不支持硬链接时从已写好的目标复制，仍不再读取源）
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Tuple
+
+from cancellation import CancelToken, OperationCancelled
+from disk_space import check_space, device_id, space_error
+from metadata_scanner import mod_info_entry
+from structured_log import get_logger, log_fields
+
+logger = get_logger('fanout_sync')
+
+# 写入过程中的临时文件后缀
+PARTIAL_FILE_SUFFIX = '.part'
+# 同时写入多个目标时的读取块大小
+FANOUT_CHUNK_SIZE = 1024 * 1024
+
+
+class _FanoutMod:
+    """单个模组的同步计划：源路径与需要写入的目标模组路径"""
+
+    def __init__(self, mod_id: str, source_path: str):
+        self.mod_id = mod_id
+        self.source_path = source_path
+        # [(目标文件夹, 目标模组路径)]
+        self.targets = []
+
+
+class FanoutSync:
+    """一次读取、多目标写入的模组同步器，cancel_token 为本次同步的取消与暂停控制"""
+
+    def __init__(self, mod_manager, max_workers: int = 4, hash_algorithm: str = 'sha256',
+                 cancel_token: CancelToken = None):
+        self.mod_manager = mod_manager
+        self.cancel_token = cancel_token or CancelToken()
+        self.max_workers = max(1, max_workers or 1)
+        self.hash_algorithm = hash_algorithm
+        self.source_bytes = 0
+        self.written_bytes = 0
+        self.linked_files = 0
+        self._lock = threading.Lock()
+
+    def plan(self, mods: List[Dict[str, Any]], source_folder: str,
+             target_folders: List[str]) -> Tuple[List[_FanoutMod], Dict[str, Dict[str, Any]]]:
+        """
+        为每个目标检查每个模组是否需要更新
+        返回: (需要复制的模组列表, {目标文件夹: 统计与模组信息})
+        """
+        manager = self.mod_manager
+        summaries = {
+            target_folder: {
+                'target_folder': target_folder,
+                'total_mods': len(mods),
+                'new_mods': 0,
+                'updated_mods': 0,
+                'skipped_mods': 0,
+                'failed_mods': [],
+                'mod_info': {},
+                'mod_info_path': ""
+            }
+            for target_folder in target_folders
+        }
+        planned = []
+        metadata = manager.scan_mods_metadata(mods, source_folder, self.cancel_token)
+        with manager.planning_snapshot(metadata, target_folders, self.cancel_token):
+            for mod in mods:
+                self.cancel_token.checkpoint()
+                mod_id = mod.get('modId', '')
+                record = metadata.pop(mod_id, None)
+                if not record:
+                    continue
+                source_path = record['path']
+                parsed = mod_info_entry(record)
+                standardized_name = manager.generate_mod_folder_name(
+                    os.path.basename(source_path), parsed.get('version', '未知')
+                )
+                item = _FanoutMod(mod_id, source_path)
+                for target_folder in target_folders:
+                    summary = summaries[target_folder]
+                    summary['mod_info'][mod_id] = parsed
+                    target_path, standardized_path = manager.standardize_target_mod_path(
+                        target_folder, mod_id, standardized_name
+                    )
+                    needs_update, reason, _, _ = manager.check_mod_needs_update(source_path, target_path, mod_id,
+                                                                            self.cancel_token)
+                    if not needs_update:
+                        summary['skipped_mods'] += 1
+                        continue
+                    summary['updated_mods' if os.path.exists(target_path) else 'new_mods'] += 1
+                    item.targets.append((target_folder, standardized_path))
+                if item.targets:
+                    planned.append(item)
+        return planned, summaries
+
+    def run(self, mods: List[Dict[str, Any]], source_folder: str, target_folders: List[str],
+            verify: bool = False, progress_callback=None) -> Dict[str, Any]:
+        """
+        执行多目标同步，为每个目标写入 mod_info.json 并返回各目标的统计
+        复制前检查各目标文件系统的空间，不足时不写入任何文件并抛出 ValueError
+        progress_callback(已完成模组数, 需要复制的模组数) 在每个模组完成后调用
+        """
+        manager = self.mod_manager
+        started = time.monotonic()
+        planned, summaries = self.plan(mods, source_folder, target_folders)
+        shortages = self.check_space(planned)
+        if shortages:
+            raise ValueError(space_error(shortages))
+        done = [0]
+
+        def sync(item):
+            item_started = time.monotonic()
+            try:
+                written = self.sync_mod(item, verify)
+                logger.debug(f"模组同步完成: {item.mod_id} -> {len(item.targets)} 个目标",
+                             extra=log_fields(mod_id=item.mod_id, phase='fanout', path=item.source_path,
+                                              size=written, duration=time.monotonic() - item_started))
+            except OperationCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"同步模组 {item.mod_id} 时出错: {e}", extra=log_fields(mod_id=item.mod_id, phase='fanout'))
+                for target_folder, _ in item.targets:
+                    with self._lock:
+                        summaries[target_folder]['failed_mods'].append({'mod_id': item.mod_id, 'error': str(e)})
+            with self._lock:
+                done[0] += 1
+                finished = done[0]
+            if progress_callback:
+                progress_callback(finished, len(planned))
+
+        cancelled = False
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                initializer=manager.io_throttle.apply_priority) as executor:
+            futures = [executor.submit(sync, item) for item in planned]
+            for future in futures:
+                try:
+                    future.result()
+                except OperationCancelled:
+                    cancelled = True
+        manager.save_caches()
+        if cancelled:
+            raise OperationCancelled()
+
+        for summary in summaries.values():
+            if summary['mod_info']:
+                summary['mod_info_path'] = manager.save_mod_info_json(
+                    summary['mod_info'], summary['target_folder'], merge=True
+                )
+        return {
+            'targets': [summaries[target_folder] for target_folder in target_folders],
+            'copied_mods': len(planned),
+            'source_bytes': self.source_bytes,
+            'written_bytes': self.written_bytes,
+            'linked_files': self.linked_files,
+            'wall_seconds': time.monotonic() - started
+        }
+
+    def check_space(self, planned: List[_FanoutMod]) -> List[Dict[str, Any]]:
+        """
+        磁盘空间预检：每个模组在每个文件系统上只写入一份（其余目标硬链接，不占新空间）
+        返回空间不足的文件系统列表
+        """
+        requirements = {}
+        for item in planned:
+            devices = set()
+            for _, target_path in item.targets:
+                device = device_id(target_path)
+                if device not in devices:
+                    devices.add(device)
+                    requirements[target_path] = self.mod_manager.estimate_copy_bytes(
+                        item.source_path, target_path, cancel_token=self.cancel_token
+                    )
+        return [entry for entry in check_space(requirements) if not entry['ok']]
+
+    def sync_mod(self, item: _FanoutMod, verify: bool = False) -> int:
+        """
+        把一个模组的所有文件写入它的所有目标，verify=True 时为每个目标写入清单
+        返回写入的字节数（每个文件系统写入一份，硬链接不计）
+        """
+        manager = self.mod_manager
+        target_paths = [target_path for _, target_path in item.targets]
+        for target_path in target_paths:
+            os.makedirs(target_path, exist_ok=True)
+        # 按文件系统分组：每组第一个目标从源写入，其余目标硬链接
+        groups = {}
+        for target_path in target_paths:
+            groups.setdefault(os.stat(target_path).st_dev, []).append(target_path)
+
+        manifests = {target_path: {} for target_path in target_paths}
+        written = 0
+        for rel_path, (size, _) in manager.list_mod_files(item.source_path, self.cancel_token).items():
+            self.cancel_token.checkpoint()
+            primaries = [paths[0] for paths in groups.values()]
+            file_hash = self.write_file(item.source_path, rel_path, primaries, verify)
+            written += size * len(primaries)
+            for paths in groups.values():
+                for target_path in paths[1:]:
+                    self.link_file(paths[0], target_path, rel_path)
+            if verify:
+                for target_path in target_paths:
+                    manifests[target_path][rel_path] = {'size': size, self.hash_algorithm: file_hash}
+                    manager.content_hasher.remember(os.path.join(target_path, *rel_path.split('/')), file_hash)
+        if verify:
+            for target_path in target_paths:
+                manager.write_manifest(target_path, manifests[target_path])
+        return written
+
+    def write_file(self, source_path: str, rel_path: str, target_paths: List[str], verify: bool = False) -> str:
+        """
+        读取一次源文件，同时写入多个目标（临时文件 + 重命名），并保留修改时间
+        verify=True 时计算哈希并回读每个目标校验，返回哈希（未校验时为空字符串）
+        """
+        manager = self.mod_manager
+        target_files = [os.path.join(target_path, *rel_path.split('/')) for target_path in target_paths]
+        partial_files = [target_file + PARTIAL_FILE_SUFFIX for target_file in target_files]
+        digest = hashlib.new(self.hash_algorithm) if verify else None
+        outputs = []
+        try:
+            for partial_file in partial_files:
+                os.makedirs(os.path.dirname(partial_file), exist_ok=True)
+                outputs.append(open(partial_file, 'wb'))
+            size = 0
+            with manager.open_source_file(os.path.join(source_path, *rel_path.split('/'))) as fsrc:
+                while True:
+                    chunk = fsrc.read(FANOUT_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    manager.io_throttle.throttle(len(chunk), ops=1 + len(outputs))
+                    if digest is not None:
+                        digest.update(chunk)
+                    for output in outputs:
+                        output.write(chunk)
+                    size += len(chunk)
+            for output in outputs:
+                output.close()
+            mtime_ns = manager.source_mtime_ns(os.path.join(source_path, *rel_path.split('/')))
+            file_hash = digest.hexdigest() if digest is not None else ""
+            for partial_file in partial_files:
+                os.utime(partial_file, ns=(mtime_ns, mtime_ns))
+                if verify and manager.hash_file(partial_file) != file_hash:
+                    raise IOError(f"写入内容校验失败: {partial_file}")
+            for partial_file, target_file in zip(partial_files, target_files):
+                os.replace(partial_file, target_file)
+        except BaseException:
+            for output in outputs:
+                output.close()
+            for partial_file in partial_files:
+                if os.path.exists(partial_file):
+                    os.remove(partial_file)
+            raise
+        with self._lock:
+            self.source_bytes += size
+            self.written_bytes += size * len(target_files)
+        return file_hash
+
+    def link_file(self, primary_path: str, target_path: str, rel_path: str) -> None:
+        """把已写好的文件硬链接到同一文件系统上的另一个目标，失败时从已写好的文件复制"""
+        primary_file = os.path.join(primary_path, *rel_path.split('/'))
+        target_file = os.path.join(target_path, *rel_path.split('/'))
+        partial_file = target_file + PARTIAL_FILE_SUFFIX
+        os.makedirs(os.path.dirname(target_file), exist_ok=True)
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+        try:
+            os.link(primary_file, partial_file)
+            with self._lock:
+                self.linked_files += 1
+        except OSError:
+            shutil.copy2(primary_file, partial_file)
+            with self._lock:
+                self.written_bytes += os.path.getsize(partial_file)
+        os.replace(partial_file, target_file)
@@ -0,0 +1,183 @@
+"""
+I/O 限速模块
+基于令牌桶限制复制时的带宽（MB/s）和每秒 I/O 次数，并可降低工作线程的 I/O 与 CPU 优先级
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from structured_log import get_logger
+
+logger = get_logger('io_throttle')
+
+# 低优先级模式下执行 IOThrottle.call 的常驻线程数（同时调用的线程更多时排队等待）
+LOW_PRIORITY_WORKERS = 8
+
+# 记录当前线程是否已降低优先级（降低后无法恢复，只需降低一次）
+_thread_state = threading.local()
+
+
+class TokenBucket:
+    """
+    令牌桶
+    rate 为每秒补充的令牌数，rate <= 0 表示不限速；
+    允许一次消费超过桶容量（形成欠账），欠账部分通过等待偿还，因此大块读写也能被正确限速
+    """
+
+    def __init__(self, rate: float = 0):
+        self._lock = threading.Lock()
+        self.rate = 0.0
+        self.tokens = 0.0
+        self.last = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate: float) -> None:
+        """修改速率（任务运行中也可以调整，下一次消费即生效）"""
+        with self._lock:
+            self._refill()
+            self.rate = float(rate) if rate and rate > 0 else 0.0
+            # 桶容量为一秒的令牌数
+            self.tokens = min(self.tokens, self.rate)
+
+    def _refill(self) -> None:
+        """按经过的时间补充令牌"""
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def consume(self, amount: float) -> None:
+        """消费令牌，令牌不足时阻塞等待"""
+        with self._lock:
+            if self.rate <= 0:
+                return
+            self._refill()
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class IOThrottle:
+    """复制/校验路径使用的 I/O 限速器（带宽上限 + IOPS 上限 + 低优先级模式）"""
+
+    def __init__(self, mb_per_sec: float = 0, iops: float = 0, low_priority: bool = False):
+        self.byte_bucket = TokenBucket()
+        self.op_bucket = TokenBucket()
+        self.mb_per_sec = 0
+        self.iops = 0
+        self.low_priority = low_priority
+        # 低优先级模式下执行 call 的常驻线程池（首次使用时创建，线程在创建时降低优先级）
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self.set_limits(mb_per_sec, iops)
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用了任何限速或低优先级模式"""
+        return self.mb_per_sec > 0 or self.iops > 0 or self.low_priority
+
+    def set_limits(self, mb_per_sec: float = None, iops: float = None) -> None:
+        """设置带宽（MB/s）和 IOPS 上限，0 表示不限制；传 None 的项保持不变"""
+        if mb_per_sec is not None:
+            self.mb_per_sec = max(0, mb_per_sec)
+            self.byte_bucket.set_rate(self.mb_per_sec * 1024 * 1024)
+        if iops is not None:
+            self.iops = max(0, iops)
+            self.op_bucket.set_rate(self.iops)
+
+    def throttle(self, nbytes: int, ops: int = 1) -> None:
+        """一次读或写之前调用：按字节数和操作次数消费令牌"""
+        if self.iops > 0:
+            self.op_bucket.consume(ops)
+        if self.mb_per_sec > 0 and nbytes:
+            self.byte_bucket.consume(nbytes)
+
+    def apply_priority(self) -> None:
+        """
+        低优先级模式下降低当前线程的 I/O 与 CPU 优先级
+        只在为一次复制/校验创建的临时工作线程（或线程池的 initializer）中调用：普通用户降低优先级后无法再恢复，
+        长期存在的线程（任务线程池等）应通过 call 在低优先级线程中执行
+        """
+        if not self.low_priority or getattr(_thread_state, 'lowered', False):
+            return
+        try:
+            lower_current_thread_priority()
+            _thread_state.lowered = True
+        except Exception as e:
+            logger.warning(f"降低线程优先级失败: {e}")
+
+    @property
+    def process_initializer(self) -> Optional[Callable[[], None]]:
+        """
+        进程池的 initializer：低优先级模式下降低工作进程的优先级（nice 值与 I/O 调度类按线程生效，
+        父进程中降低的线程不影响新启动的工作进程），否则为 None
+        """
+        return lower_priority_quietly if self.low_priority else None
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        执行 func 并返回其结果：低优先级模式下在常驻的低优先级线程中执行并等待完成（异常照常抛出），
+        调用线程的优先级保持不变；当前线程已是低优先级时直接执行
+        """
+        if not self.low_priority or getattr(_thread_state, 'lowered', False):
+            return func(*args, **kwargs)
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=LOW_PRIORITY_WORKERS, thread_name_prefix='low-priority',
+                                                    initializer=self._lower_worker)
+        return self._executor.submit(func, *args, **kwargs).result()
+
+    def _lower_worker(self) -> None:
+        """低优先级线程池的 initializer（线程创建时无论当前是否为低优先级模式都降低，线程只用于 call）"""
+        try:
+            lower_current_thread_priority()
+            _thread_state.lowered = True
+        except Exception as e:
+            logger.warning(f"降低线程优先级失败: {e}")
+
+    def shutdown(self) -> None:
+        """停止低优先级线程池"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+# Linux ioprio_set 系统调用号（按架构）与空闲 I/O 调度类
+_IOPRIO_SET_SYSCALL = {'x86_64': 251, 'aarch64': 30, 'i686': 289}
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_WHO_PROCESS = 1
+# Windows 后台处理模式（同时降低线程的 I/O 与 CPU 优先级）
+_THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+
+
+def lower_priority_quietly() -> None:
+    """降低当前线程优先级并忽略错误（用作工作进程的 initializer，工作进程中没有日志管线）"""
+    try:
+        lower_current_thread_priority()
+    except Exception:
+        pass
+
+
+def lower_current_thread_priority() -> None:
+    """将当前线程切换为后台优先级：Windows 使用后台处理模式，Linux 使用 nice 19 和空闲 I/O 调度类"""
+    if sys.platform == 'win32':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetThreadPriority(kernel32.GetCurrentThread(), _THREAD_MODE_BACKGROUND_BEGIN)
+        return
+
+    thread_id = threading.get_native_id()
+    if hasattr(os, 'setpriority'):
+        # Linux 上 nice 值按线程生效
+        os.setpriority(os.PRIO_PROCESS, thread_id, 19)
+    syscall_number = _IOPRIO_SET_SYSCALL.get(os.uname().machine) if sys.platform.startswith('linux') else None
+    if syscall_number is not None:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.syscall(syscall_number, _IOPRIO_WHO_PROCESS, thread_id, _IOPRIO_CLASS_IDLE << 13)
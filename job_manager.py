@@ -0,0 +1,271 @@
+"""
+任务管理模块
+界面上的操作统一提交为任务：涉及同一目标文件夹（相同或互相嵌套的路径）的任务按提交顺序串行执行，
+互不冲突的任务在共享的线程池中并行执行；重复提交正在排队或运行的相同任务会被拒绝。
+每个任务有自己的取消与暂停控制（CancelToken），取消或暂停一个任务不影响同时运行的其他任务；
+进度也按任务记录（Job.progress），同时运行的任务不共用一个进度值
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Iterable
+
+from cancellation import CancelToken, OperationCancelled
+from structured_log import get_logger, log_fields
+
+logger = get_logger('job_manager')
+
+# 同时运行的任务数
+DEFAULT_JOB_WORKERS = 2
+# 任务列表中保留的已结束任务数
+FINISHED_JOB_HISTORY = 20
+
+# 任务状态
+JOB_QUEUED = "排队中"
+JOB_RUNNING = "运行中"
+JOB_DONE = "已完成"
+JOB_FAILED = "失败"
+JOB_CANCELLED = "已取消"
+
+
+def normalize_folder(path: str) -> str:
+    """规范化文件夹路径，用于冲突比较"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def folders_conflict(first: Iterable[str], second: Iterable[str]) -> bool:
+    """两组文件夹中是否有相同或互相嵌套的路径"""
+    for a in first:
+        for b in second:
+            if a == b or a.startswith(b.rstrip(os.sep) + os.sep) or b.startswith(a.rstrip(os.sep) + os.sep):
+                return True
+    return False
+
+
+class Job:
+    """一个排队或运行中的任务，func(cancel_token) 在运行时收到本任务的取消与暂停控制"""
+
+    def __init__(self, job_id: int, name: str, func: Callable[[CancelToken], Any], folders: Iterable[str]):
+        self.id = job_id
+        self.name = name
+        self.func = func
+        self.folders = [normalize_folder(folder) for folder in folders if folder]
+        self.cancel_token = CancelToken()
+        self.status = JOB_QUEUED
+        self.error = ""
+        # 任务自己报告的进度百分比（0-100），未报告时为 None
+        self.progress = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self) -> float:
+        """运行时间（秒），尚未开始时为 0"""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def to_dict(self) -> Dict[str, Any]:
+        """任务列表中显示的字段"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'folders': list(self.folders),
+            'status': self.status,
+            'paused': self.status == JOB_RUNNING and self.cancel_token.paused,
+            'progress': self.progress,
+            'error': self.error,
+            'elapsed': self.elapsed
+        }
+
+
+class JobManager:
+    """
+    任务队列与调度器
+    listener() 在任务列表变化时调用（可能在工作线程中调用）
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_JOB_WORKERS, listener: Callable[[], None] = None):
+        self.max_workers = max(1, max_workers)
+        self.listener = listener
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._queued = []
+        self._running = {}
+        self._finished = deque(maxlen=FINISHED_JOB_HISTORY)
+
+    def submit(self, name: str, func: Callable[[CancelToken], Any], folders: Iterable[str] = ()) -> Job:
+        """
+        提交任务，返回任务对象；func 以本任务的 CancelToken 为参数调用
+        与正在排队或运行的任务名称和文件夹都相同时拒绝（抛出 ValueError）；
+        与运行中的任务文件夹冲突时排队，等冲突任务结束后再执行
+        """
+        return self.enqueue(self.create(name, func, folders))
+
+    def create(self, name: str, func: Callable[[CancelToken], Any], folders: Iterable[str] = ()) -> Job:
+        """
+        创建任务并分配编号，但不加入队列：调用方可以先按编号登记任务，再用 enqueue() 提交，
+        保证任务开始运行（以及列表变化通知）之前已能查到它
+        """
+        job = Job(0, name, func, folders)
+        with self._lock:
+            job.id = next(self._ids)
+        return job
+
+    def enqueue(self, job: Job) -> Job:
+        """把 create() 创建的任务加入队列（重复与冲突的处理同 submit）"""
+        with self._lock:
+            for other in itertools.chain(self._running.values(), self._queued):
+                if other.name == job.name and sorted(other.folders) == sorted(job.folders):
+                    raise ValueError(f"相同的任务已在{other.status}: {job.name}")
+            self._queued.append(job)
+        self._dispatch()
+        return job
+
+    def _dispatch(self) -> None:
+        """按提交顺序启动可以运行的排队任务"""
+        with self._lock:
+            blocked = []
+            for job in list(self._queued):
+                if len(self._running) >= self.max_workers:
+                    break
+                # 与运行中的任务或排在前面的冲突任务冲突时继续等待，保证同一文件夹上的任务按提交顺序执行
+                busy = itertools.chain((other.folders for other in self._running.values()), blocked)
+                if any(folders_conflict(job.folders, folders) for folders in busy):
+                    blocked.append(job.folders)
+                    continue
+                self._queued.remove(job)
+                job.status = JOB_RUNNING
+                job.started = time.time()
+                self._running[job.id] = job
+                self._executor.submit(self._run, job)
+        self._notify()
+
+    def _run(self, job: Job) -> None:
+        """在线程池中执行任务"""
+        try:
+            job.func(job.cancel_token)
+            job.status = JOB_CANCELLED if job.cancel_token.cancelled else JOB_DONE
+        except OperationCancelled:
+            job.status = JOB_CANCELLED
+        except Exception as e:
+            logger.error(f"任务 {job.name} 出错: {e}", extra=log_fields(phase='job'))
+            job.status = JOB_FAILED
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
+            logger.debug(f"任务 {job.name}: {job.status}",
+                         extra=log_fields(phase='job', duration=job.finished - job.started))
+            with self._lock:
+                self._running.pop(job.id, None)
+                self._finished.append(job)
+            self._dispatch()
+
+    def remove_queued(self, job_id: int) -> bool:
+        """移除尚未开始的任务"""
+        with self._lock:
+            for job in self._queued:
+                if job.id == job_id:
+                    self._queued.remove(job)
+                    job.status = JOB_CANCELLED
+                    self._finished.append(job)
+                    break
+            else:
+                return False
+        self._notify()
+        return True
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        取消一个任务：排队中的任务直接移除；运行中的任务通过它自己的取消控制取消，
+        在下一个检查点退出；任务不存在或已结束时返回 False
+        """
+        if self.remove_queued(job_id):
+            return True
+        with self._lock:
+            job = self._running.get(job_id)
+            if job is None:
+                return False
+            job.cancel_token.cancel()
+        self._notify()
+        return True
+
+    def pause(self, job_id: int) -> bool:
+        """暂停运行中的任务（在下一个检查点阻塞）；任务不在运行时返回 False"""
+        with self._lock:
+            job = self._running.get(job_id)
+            if job is None:
+                return False
+            job.cancel_token.pause()
+        self._notify()
+        return True
+
+    def resume(self, job_id: int) -> bool:
+        """继续被暂停的任务；任务不在运行时返回 False"""
+        with self._lock:
+            job = self._running.get(job_id)
+            if job is None:
+                return False
+            job.cancel_token.resume()
+        self._notify()
+        return True
+
+    def pause_all(self) -> None:
+        """暂停所有运行中的任务"""
+        with self._lock:
+            for job in self._running.values():
+                job.cancel_token.pause()
+        self._notify()
+
+    def resume_all(self) -> None:
+        """继续所有被暂停的任务"""
+        with self._lock:
+            for job in self._running.values():
+                job.cancel_token.resume()
+        self._notify()
+
+    def cancel_all(self) -> None:
+        """取消所有运行中的任务并清空队列"""
+        with self._lock:
+            for job in self._queued:
+                job.status = JOB_CANCELLED
+                self._finished.append(job)
+            self._queued.clear()
+            for job in self._running.values():
+                job.cancel_token.cancel()
+        self._notify()
+
+    @property
+    def has_running(self) -> bool:
+        """是否有任务正在运行"""
+        return bool(self._running)
+
+    @property
+    def all_paused(self) -> bool:
+        """是否有任务正在运行且全部处于暂停状态"""
+        with self._lock:
+            return bool(self._running) and all(job.cancel_token.paused for job in self._running.values())
+
+    def jobs(self) -> List[Dict[str, Any]]:
+        """返回任务列表：运行中、排队中，然后是最近结束的任务（新的在前）"""
+        with self._lock:
+            jobs = list(self._running.values()) + list(self._queued) + list(reversed(self._finished))
+        return [job.to_dict() for job in jobs]
+
+    def _notify(self) -> None:
+        if self.listener:
+            try:
+                self.listener()
+            except Exception as e:
+                logger.error(f"刷新任务列表时出错: {e}")
+
+    def shutdown(self) -> None:
+        """取消全部任务并等待线程池退出"""
+        self.cancel_all()
+        self._executor.shutdown(wait=True)
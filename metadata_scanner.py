@@ -0,0 +1,168 @@
+"""
+模组元数据批量扫描模块
+把大量模组的 ServerData.json 读取与解析分散到进程池中执行，一次返回所有模组的紧凑记录：
+{'id', 'name', 'version', 'dependencies', 'size'}
+模组数量较少或进程池不可用时改用线程池；压缩包中的模组在当前进程中读取（压缩包索引不能跨进程共享）。
+模组总大小由调用方从树指纹中给出，工作进程只读取 ServerData.json，不再遍历模组目录
+MetadataCache 按模组目录的树指纹持久化缓存记录，指纹未变化的模组不再重新解析
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from structured_log import get_logger, log_fields
+
+logger = get_logger('metadata_scanner')
+
+# 模组根目录的元数据文件
+SERVER_DATA_FILE_NAME = 'ServerData.json'
+# 少于该数量的模组不启动进程池
+PROCESS_POOL_MIN_MODS = 64
+# 每个进程任务包含的模组数
+SCAN_CHUNK_SIZE = 32
+# 找不到或无法解析 ServerData.json 时的版本号（与 parse_mod_info 一致）
+UNKNOWN_VERSION = '未知'
+# 元数据缓存文件格式版本
+METADATA_CACHE_VERSION = 1
+
+
+def parse_dependencies(server_data: Dict[str, Any]) -> List[Dict[str, str]]:
+    """从 ServerData.json 中提取依赖列表: [{'id': 模组ID, 'version': 版本}, ...]"""
+    revision = server_data.get('revision', {})
+    raw = revision.get('dependencies', server_data.get('dependencies', [])) or []
+    dependencies = []
+    for item in raw:
+        if isinstance(item, dict) and item.get('id'):
+            dependencies.append({'id': item['id'], 'version': item.get('version', '')})
+        elif isinstance(item, str) and item:
+            dependencies.append({'id': item, 'version': ''})
+    return dependencies
+
+
+def build_metadata_record(mod_id: str, server_data: Optional[Dict[str, Any]], size: int) -> Dict[str, Any]:
+    """根据 ServerData.json 内容构建紧凑记录（ServerData.json 缺失或无法解析时传入 None）"""
+    if server_data is None:
+        return {'id': mod_id, 'name': mod_id, 'version': UNKNOWN_VERSION, 'dependencies': [], 'size': size}
+    return {
+        'id': mod_id,
+        'name': server_data.get('name', server_data.get('id', mod_id)),
+        'version': server_data.get('revision', {}).get('version', ''),
+        'dependencies': parse_dependencies(server_data),
+        'size': size
+    }
+
+
+def mod_info_entry(record: Dict[str, Any]) -> Dict[str, str]:
+    """把紧凑记录转换为 mod_info.json 中的条目（与 parse_mod_info 的返回值相同）"""
+    return {'name': record['name'], 'version': record['version']}
+
+
+def scan_mod_metadata(task: Tuple[str, str, int]) -> Dict[str, Any]:
+    """
+    读取单个模组目录的元数据（在工作进程中执行，只使用可序列化的参数）
+    task 为 (模组ID, 模组目录, 总大小)，总大小来自调用方已计算的树指纹
+    """
+    mod_id, mod_path, size = task
+    server_data = None
+    try:
+        with open(os.path.join(mod_path, SERVER_DATA_FILE_NAME), 'r', encoding='utf-8-sig') as f:
+            server_data = json.load(f)
+    except (OSError, ValueError):
+        pass
+    return build_metadata_record(mod_id, server_data, size)
+
+
+class MetadataScanner:
+    """批量元数据扫描器"""
+
+    def __init__(self, max_workers: int = None, use_processes: bool = True):
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.use_processes = use_processes
+
+    def scan(self, mods: Dict[str, Tuple[str, int]],
+             initializer: Optional[Callable[[], None]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        扫描普通目录中的模组，mods 为 {mod_id: (模组目录, 总大小)}
+        initializer 在每个工作进程/线程启动时调用（例如降低优先级，必须可被 pickle）
+        返回: {mod_id: 紧凑记录}，记录中额外包含 'path'
+        """
+        tasks = [(mod_id, mod_path, size) for mod_id, (mod_path, size) in mods.items()]
+        records = None
+        if self.use_processes and len(tasks) >= PROCESS_POOL_MIN_MODS and self.max_workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=self.max_workers, initializer=initializer) as executor:
+                    records = list(executor.map(scan_mod_metadata, tasks, chunksize=SCAN_CHUNK_SIZE))
+            except (BrokenProcessPool, OSError) as e:
+                logger.warning(f"进程池不可用，改用线程扫描: {e}", extra=log_fields(phase='metadata'))
+        if records is None:
+            with ThreadPoolExecutor(max_workers=self.max_workers, initializer=initializer) as executor:
+                records = list(executor.map(scan_mod_metadata, tasks))
+        return {mod_id: dict(record, path=mod_path) for (mod_id, mod_path, _), record in zip(tasks, records)}
+
+
+class MetadataCache:
+    """按模组目录树指纹缓存的元数据记录（持久化，线程安全）"""
+
+    def __init__(self, cache_path: str = None):
+        self.cache_path = cache_path
+        # {规范化模组路径: [树指纹, 紧凑记录(不含 path)]}
+        self._records = {}
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self) -> None:
+        """首次使用时加载持久化缓存"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.cache_path and os.path.isfile(self.cache_path):
+            try:
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == METADATA_CACHE_VERSION:
+                    self._records.update(data.get('mods', {}))
+            except (OSError, ValueError) as e:
+                logger.warning(f"加载元数据缓存时出错: {e}", extra=log_fields(phase='cache'))
+
+    def save(self) -> None:
+        """将缓存写入磁盘（先写临时文件再重命名）"""
+        if not self.cache_path or not self._dirty:
+            return
+        with self._lock:
+            data = {'version': METADATA_CACHE_VERSION, 'mods': dict(self._records)}
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        temp_path = self.cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, self.cache_path)
+
+    @staticmethod
+    def _cache_key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def lookup(self, mod_id: str, mod_path: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """指纹与模组 ID 都未变化时返回缓存的记录（含 path），否则返回 None"""
+        self._load()
+        with self._lock:
+            entry = self._records.get(self._cache_key(mod_path))
+            if entry and entry[0] == fingerprint and entry[1].get('id') == mod_id:
+                self.hits += 1
+                return dict(entry[1], path=mod_path)
+            self.misses += 1
+        return None
+
+    def remember(self, mod_path: str, fingerprint: str, record: Dict[str, Any]) -> None:
+        """记录模组目录在该指纹下解析得到的记录"""
+        self._load()
+        entry = [fingerprint, {key: value for key, value in record.items() if key != 'path'}]
+        with self._lock:
+            self._records[self._cache_key(mod_path)] = entry
+            self._dirty = True
@@ -0,0 +1,497 @@
+"""
+守护进程模块
+在没有桌面环境的服务器上以后台服务方式运行 ModManager，通过本机 HTTP 接口控制：
+    GET  /health                    存活检查
+    GET  /jobs                      任务列表
+    POST /jobs                      提交任务 {"type": "smart_update" | "copy" | "export", ...}
+    GET  /jobs/<id>                 任务状态与结果
+    GET  /jobs/<id>/events          任务进度记录（?after=序号 只返回之后的记录，?wait=秒 没有新记录时等待）
+    GET  /jobs/<id>/stream          以 NDJSON 流式返回任务进度记录，任务结束后关闭连接
+    POST /jobs/<id>/cancel          取消任务（DELETE /jobs/<id> 相同）
+    GET  /metrics                   Prometheus 文本格式的指标
+任务通过与界面相同的 JobManager 调度；指标由结构化日志管线中的一个消费者汇总
+（复制字节数、吞吐量、各阶段耗时），并读取各缓存的命中次数
+"""
+
+import argparse
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional
+from urllib.parse import urlparse, parse_qs
+
+from cancellation import CancelToken
+from copy_scheduler import DEFAULT_COPY_WORKERS
+from job_manager import DEFAULT_JOB_WORKERS, JobManager, JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED, JOB_CANCELLED
+from mod_manager import ModManager
+from structured_log import get_logger, start_logging
+
+logger = get_logger('mod_daemon')
+
+# 默认监听地址与端口（只监听本机）
+DEFAULT_DAEMON_HOST = '127.0.0.1'
+DEFAULT_DAEMON_PORT = 47812
+# 守护进程中同时运行的任务数（每个任务有自己的取消控制，取消一个任务不影响其他任务）
+DEFAULT_DAEMON_JOB_WORKERS = DEFAULT_JOB_WORKERS
+# 保留的任务记录数
+DAEMON_JOB_HISTORY = 100
+# 请求体大小上限
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+# 吞吐量按最近这段时间内完成的复制计算
+THROUGHPUT_WINDOW_SECONDS = 60
+# 长轮询与流式输出等待新记录的最长时间
+MAX_WAIT_SECONDS = 60
+# 计入复制字节数的日志阶段（见 copy_scheduler 与 fanout_sync 的逐模组日志）
+COPY_PHASES = ('copy', 'fanout')
+# 支持的任务类型
+JOB_TYPES = ('smart_update', 'copy', 'export')
+# 任务状态在 JSON 接口和指标中使用的稳定英文值（中文状态只用于界面显示）
+JOB_STATUS_LABELS = {
+    JOB_QUEUED: 'queued',
+    JOB_RUNNING: 'running',
+    JOB_DONE: 'done',
+    JOB_FAILED: 'failed',
+    JOB_CANCELLED: 'cancelled'
+}
+
+
+class MetricsCollector(logging.Handler):
+    """日志管线的消费者：从带 phase / bytes / duration 字段的记录中汇总指标"""
+
+    def __init__(self):
+        super().__init__(level=logging.DEBUG)
+        self._metrics_lock = threading.Lock()
+        # {阶段: 字节数}
+        self.bytes_total = {}
+        # {阶段: [耗时合计, 次数]}
+        self.durations = {}
+        # 最近完成的复制: deque[(完成时间, 字节数)]
+        self._recent = deque()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        phase = getattr(record, 'phase', None)
+        if not phase:
+            return
+        size = getattr(record, 'bytes', None)
+        duration = getattr(record, 'duration', None)
+        now = time.monotonic()
+        with self._metrics_lock:
+            if size is not None and phase in COPY_PHASES:
+                self.bytes_total[phase] = self.bytes_total.get(phase, 0) + size
+                self._recent.append((now, size))
+            if duration is not None:
+                entry = self.durations.setdefault(phase, [0.0, 0])
+                entry[0] += duration
+                entry[1] += 1
+
+    def throughput(self) -> float:
+        """最近 THROUGHPUT_WINDOW_SECONDS 秒内的复制吞吐量（字节/秒）"""
+        cutoff = time.monotonic() - THROUGHPUT_WINDOW_SECONDS
+        with self._metrics_lock:
+            while self._recent and self._recent[0][0] < cutoff:
+                self._recent.popleft()
+            return sum(size for _, size in self._recent) / THROUGHPUT_WINDOW_SECONDS
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            return {
+                'bytes_total': dict(self.bytes_total),
+                'durations': {phase: list(entry) for phase, entry in self.durations.items()}
+            }
+
+
+class DaemonJob:
+    """守护进程中的一个任务：参数、进度记录与结果"""
+
+    def __init__(self, job_type: str, params: Dict[str, Any]):
+        self.type = job_type
+        self.params = params
+        self.job = None
+        self.result = None
+        self.events = []
+        self.last_status = None
+        self._cond = threading.Condition()
+
+    def add_event(self, event: Dict[str, Any]) -> None:
+        """追加一条进度记录（补充序号与时间）并唤醒等待的读取者"""
+        with self._cond:
+            self.events.append(dict(event, seq=len(self.events), time=time.time()))
+            self._cond.notify_all()
+
+    @property
+    def finished(self) -> bool:
+        """任务是否已结束（结束状态的记录已追加）"""
+        return self.last_status in (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+    def wait_events(self, after: int, timeout: float) -> List[Dict[str, Any]]:
+        """返回序号 >= after 的记录；没有新记录且任务未结束时最多等待 timeout 秒"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while len(self.events) <= after and not self.finished:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self.events[after:]
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = self.job.to_dict() if self.job is not None else {}
+        if 'status' in data:
+            data['status'] = JOB_STATUS_LABELS.get(data['status'], data['status'])
+        data.update(type=self.type, events=len(self.events), result=self.result)
+        return data
+
+
+class ModDaemon:
+    """包装 ModManager 的守护进程：HTTP 控制接口 + 任务队列 + 指标"""
+
+    def __init__(self, mod_manager: ModManager = None, host: str = DEFAULT_DAEMON_HOST,
+                 port: int = DEFAULT_DAEMON_PORT, job_workers: int = DEFAULT_DAEMON_JOB_WORKERS):
+        self.mod_manager = mod_manager or ModManager()
+        self.job_manager = JobManager(max_workers=job_workers, listener=self.on_jobs_changed)
+        self.metrics = MetricsCollector()
+        # 指标从日志记录中统计：作为消费者加入日志管线（通常已由 main() 启动，嵌入使用时在此启动）
+        start_logging().add_consumer(self.metrics)
+        self.started = time.time()
+        self.submitted_jobs = 0
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        if host not in ('127.0.0.1', 'localhost', '::1'):
+            logger.warning(f"守护进程监听在非本机地址 {host}，接口没有身份验证")
+        handler = type('DaemonRequestHandler', (_DaemonRequestHandler,), {'daemon': self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def address(self) -> str:
+        """实际监听的地址（端口为 0 时由系统分配）"""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        logger.info(f"守护进程已启动: {self.address}")
+        self.server.serve_forever()
+
+    def start(self) -> str:
+        """在后台线程中启动 HTTP 服务，返回监听地址"""
+        self._thread = threading.Thread(target=self.serve_forever, name='daemon-http', daemon=True)
+        self._thread.start()
+        return self.address
+
+    def stop(self) -> None:
+        """停止 HTTP 服务，取消全部任务并等待其退出"""
+        self.server.shutdown()
+        self.server.server_close()
+        self.job_manager.shutdown()
+        self.mod_manager.save_caches()
+        start_logging().remove_consumer(self.metrics)
+
+    def submit(self, payload: Dict[str, Any]) -> DaemonJob:
+        """
+        提交任务，参数不正确时抛出 ValueError
+        smart_update: json_content 或 json_path, source_folder, target_folder[, verify, max_workers, order, batch_apply]
+        copy: json_content 或 json_path, source_folder, target_folders（或 target_folder）[, verify, max_workers]
+        export: json_content 或 json_path, source_folder
+        """
+        job_type = payload.get('type')
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"不支持的任务类型: {job_type}")
+        params = dict(payload)
+        if not params.get('json_content'):
+            if not params.get('json_path'):
+                raise ValueError("缺少 json_content 或 json_path")
+            with open(params['json_path'], 'r', encoding='utf-8') as f:
+                params['json_content'] = f.read()
+        if not params.get('source_folder'):
+            raise ValueError("缺少 source_folder")
+        if job_type == 'copy':
+            params['target_folders'] = list(params.get('target_folders') or [])
+            if params.get('target_folder'):
+                params['target_folders'].append(params['target_folder'])
+            folders = params['target_folders']
+        elif job_type == 'smart_update':
+            folders = [params.get('target_folder', '')]
+        else:
+            folders = [params['source_folder']]
+        if not all(folders):
+            raise ValueError("缺少目标文件夹")
+
+        item = DaemonJob(job_type, params)
+        name = f"{job_type}: {', '.join(folders)}"
+        item.job = self.job_manager.create(name, lambda cancel_token: self.run_job(item, cancel_token),
+                                           folders=folders)
+        # 先登记再提交：任务开始运行时的状态变化通知一定能找到它
+        with self._lock:
+            self._jobs[item.job.id] = item
+            while len(self._jobs) > DAEMON_JOB_HISTORY:
+                self._jobs.popitem(last=False)
+        try:
+            self.job_manager.enqueue(item.job)
+        except ValueError:
+            with self._lock:
+                self._jobs.pop(item.job.id, None)
+            raise
+        with self._lock:
+            self.submitted_jobs += 1
+        self.on_jobs_changed()
+        return item
+
+    def run_job(self, item: DaemonJob, cancel_token: CancelToken = None) -> None:
+        """在任务线程中执行任务，进度写入任务的记录；cancel_token 为该任务自己的取消控制"""
+        manager = self.mod_manager
+        params = item.params
+        if item.type == 'smart_update':
+            batch_apply = bool(params.get('batch_apply', False))
+
+            def space_callback(shortages):
+                item.add_event({'type': 'space', 'shortages': shortages, 'batch_apply': batch_apply})
+                return batch_apply
+
+            item.result = manager.smart_update_mods(
+                params['json_content'], params['source_folder'], params['target_folder'],
+                verify=bool(params.get('verify', False)),
+                max_workers=int(params.get('max_workers', DEFAULT_COPY_WORKERS)),
+                order=params.get('order', 'largest'),
+                record_callback=item.add_event, space_callback=space_callback,
+                cancel_token=cancel_token
+            )
+        elif item.type == 'copy':
+            item.result = manager.sync_to_targets(
+                params['json_content'], params['source_folder'], params['target_folders'],
+                verify=bool(params.get('verify', False)),
+                max_workers=int(params.get('max_workers', DEFAULT_COPY_WORKERS)),
+                progress_callback=lambda done, total: item.add_event({'type': 'progress', 'done': done, 'total': total}),
+                cancel_token=cancel_token
+            )
+            item.add_event({'type': 'summary', 'result': item.result})
+        else:
+            item.result = manager.export_mod_info(params['json_content'], params['source_folder'], cancel_token)
+            item.add_event({'type': 'summary', 'result': item.result})
+
+    def on_jobs_changed(self) -> None:
+        """任务状态变化时为对应任务追加 status 记录（可能在工作线程中调用）"""
+        with self._lock:
+            for item in self._jobs.values():
+                if item.job is None or item.job.status == item.last_status:
+                    continue
+                item.last_status = item.job.status
+                event = {'type': 'status', 'status': JOB_STATUS_LABELS.get(item.job.status, item.job.status)}
+                if item.job.error:
+                    event['error'] = item.job.error
+                item.add_event(event)
+
+    def get_job(self, job_id: int) -> Optional[DaemonJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            items = list(self._jobs.values())
+        return [item.to_dict() for item in reversed(items)]
+
+    def cancel(self, job_id: int) -> bool:
+        return self.job_manager.cancel(job_id)
+
+    def metrics_text(self) -> str:
+        """Prometheus 文本格式的指标"""
+        lines = []
+
+        def metric(name, metric_type, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        snapshot = self.metrics.snapshot()
+        metric('mod_user_tool_copied_bytes_total', 'counter', "复制写入的字节数（按阶段）",
+               [({'phase': phase}, size) for phase, size in sorted(snapshot['bytes_total'].items())])
+        metric('mod_user_tool_copy_throughput_bytes_per_second', 'gauge',
+               f"最近 {THROUGHPUT_WINDOW_SECONDS} 秒的复制吞吐量", [({}, f"{self.metrics.throughput():.1f}")])
+        durations = sorted(snapshot['durations'].items())
+        metric('mod_user_tool_phase_duration_seconds_sum', 'counter', "各阶段耗时合计（秒）",
+               [({'phase': phase}, f"{total:.6f}") for phase, (total, _) in durations])
+        metric('mod_user_tool_phase_duration_seconds_count', 'counter', "各阶段完成次数",
+               [({'phase': phase}, count) for phase, (_, count) in durations])
+
+        manager = self.mod_manager
+        caches = [('stat', manager.stat_cache), ('hash', manager.content_hasher), ('metadata', manager.metadata_cache)]
+        metric('mod_user_tool_cache_hits_total', 'counter', "缓存命中次数",
+               [({'cache': name}, cache.hits) for name, cache in caches])
+        metric('mod_user_tool_cache_misses_total', 'counter', "缓存未命中次数",
+               [({'cache': name}, cache.misses) for name, cache in caches])
+        metric('mod_user_tool_cache_hit_ratio', 'gauge', "缓存命中率",
+               [({'cache': name}, f"{cache.hits / (cache.hits + cache.misses) if cache.hits + cache.misses else 0:.4f}")
+                for name, cache in caches])
+
+        counts = {label: 0 for label in JOB_STATUS_LABELS.values()}
+        for job in self.job_manager.jobs():
+            label = JOB_STATUS_LABELS.get(job['status'])
+            if label:
+                counts[label] += 1
+        metric('mod_user_tool_jobs', 'gauge', "各状态的任务数（已结束的任务只计最近的记录）",
+               [({'status': label}, count) for label, count in counts.items()])
+        metric('mod_user_tool_jobs_submitted_total', 'counter', "提交的任务数", [({}, self.submitted_jobs)])
+        metric('mod_user_tool_uptime_seconds', 'gauge', "守护进程运行时间", [({}, f"{time.time() - self.started:.1f}")])
+        return "\n".join(lines) + "\n"
+
+
+class _DaemonRequestHandler(BaseHTTPRequestHandler):
+    """HTTP 请求处理（daemon 属性在 ModDaemon 中绑定）"""
+
+    daemon = None
+    server_version = 'ModUserToolDaemon/1.0'
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def send_json(self, status: int, data: Any) -> None:
+        body = json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: int, message: str) -> None:
+        self.send_json(status, {'error': message})
+
+    def read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            raise ValueError("请求体过大")
+        data = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError("请求体必须是 JSON 对象")
+        return data
+
+    def route(self):
+        """解析路径: (资源, 任务 ID, 子资源, 查询参数)"""
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        match = re.fullmatch(r'/jobs/(\d+)(?:/(events|stream|cancel))?/?', url.path)
+        if match:
+            return 'job', int(match.group(1)), match.group(2), query
+        return url.path.rstrip('/') or '/', None, None, query
+
+    def get_item(self, job_id: int) -> Optional[DaemonJob]:
+        item = self.daemon.get_job(job_id)
+        if item is None:
+            self.send_error_json(404, f"任务不存在: {job_id}")
+        return item
+
+    def do_GET(self):
+        resource, job_id, action, query = self.route()
+        if resource == '/health':
+            self.send_json(200, {'status': 'ok', 'jobs': len(self.daemon.list_jobs())})
+        elif resource == '/metrics':
+            body = self.daemon.metrics_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif resource == '/jobs':
+            self.send_json(200, self.daemon.list_jobs())
+        elif resource == 'job' and action is None:
+            item = self.get_item(job_id)
+            if item:
+                self.send_json(200, item.to_dict())
+        elif resource == 'job' and action == 'events':
+            item = self.get_item(job_id)
+            if item:
+                try:
+                    after = max(0, int(query.get('after', 0)))
+                    wait = min(MAX_WAIT_SECONDS, max(0.0, float(query.get('wait', 0))))
+                except ValueError:
+                    self.send_error_json(400, "after / wait 参数必须是数字")
+                    return
+                events = item.wait_events(after, wait) if wait else item.events[after:]
+                self.send_json(200, {'events': events, 'next': after + len(events), 'finished': item.finished})
+        elif resource == 'job' and action == 'stream':
+            item = self.get_item(job_id)
+            if item:
+                self.stream_events(item)
+        else:
+            self.send_error_json(404, f"未知的路径: {self.path}")
+
+    def stream_events(self, item: DaemonJob) -> None:
+        """逐行输出任务的全部进度记录（NDJSON），任务结束且记录输出完后关闭连接"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        after = 0
+        try:
+            while True:
+                events = item.wait_events(after, MAX_WAIT_SECONDS)
+                for event in events:
+                    self.wfile.write((json.dumps(event, ensure_ascii=False, default=str) + "\n").encode('utf-8'))
+                self.wfile.flush()
+                after += len(events)
+                if item.finished and after >= len(item.events):
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def do_POST(self):
+        resource, job_id, action, _ = self.route()
+        if resource == '/jobs':
+            try:
+                item = self.daemon.submit(self.read_json())
+            except ValueError as e:
+                # 与排队或运行中的相同任务重复时 JobManager 同样抛出 ValueError
+                self.send_error_json(409 if "相同的任务" in str(e) else 400, str(e))
+                return
+            except OSError as e:
+                self.send_error_json(400, f"读取配置文件失败: {e}")
+                return
+            self.send_json(202, item.to_dict())
+        elif resource == 'job' and action == 'cancel':
+            self.cancel_job(job_id)
+        else:
+            self.send_error_json(404, f"未知的路径: {self.path}")
+
+    def do_DELETE(self):
+        resource, job_id, action, _ = self.route()
+        if resource == 'job' and action is None:
+            self.cancel_job(job_id)
+        else:
+            self.send_error_json(404, f"未知的路径: {self.path}")
+
+    def cancel_job(self, job_id: int) -> None:
+        item = self.get_item(job_id)
+        if item:
+            if self.daemon.cancel(job_id):
+                self.send_json(202, item.to_dict())
+            else:
+                self.send_error_json(409, "任务已结束")
+
+
+def main() -> None:
+    """命令行入口：启动守护进程，Ctrl+C 停止"""
+    parser = argparse.ArgumentParser(description="模组管理守护进程（本机 HTTP 控制接口与指标）")
+    parser.add_argument('--host', default=DEFAULT_DAEMON_HOST, help="监听地址（默认只监听本机）")
+    parser.add_argument('--port', type=int, default=DEFAULT_DAEMON_PORT, help="监听端口")
+    parser.add_argument('--job-workers', type=int, default=DEFAULT_DAEMON_JOB_WORKERS, help="同时运行的任务数")
+    args = parser.parse_args()
+
+    start_logging()
+    daemon = ModDaemon(host=args.host, port=args.port, job_workers=args.job_workers)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,21 +3,108 @@
 包含模组检查、复制、更新等核心功能
 """
 
+import io
 import json
 import shutil
 import os
-from typing import Tuple, Dict, List, Any
+import hashlib
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Dict, List, Any, Iterator
+
+from transfer_journal import TransferJournal
+from io_throttle import IOThrottle
+from copy_scheduler import CopyScheduler, DEFAULT_COPY_WORKERS
+from copy_backends import copy_file_data
+from content_hasher import ContentHasher
+from delta_transfer import DeltaReceiver, DeltaSender, DEFAULT_DELTA_PORT
+from patch_pack import apply_patch_pack, create_patch_pack
+from archive_source import ArchiveModSource, is_archive_source, zip_mtime_ns
+from cancellation import CancelToken, OperationCancelled
+from tree_fingerprint import TreeFingerprint, fingerprint_files
+from stat_cache import StatCache
+from structured_log import get_logger, log_fields
+from fanout_sync import FanoutSync
+from dependency_graph import DependencyGraph
+from disk_space import available_bytes, check_space, format_megabytes, space_error, take_batch
+from metadata_scanner import MetadataCache, MetadataScanner, build_metadata_record, mod_info_entry
+from run_report import (RunReport, RUN_REPORT_FILE_NAME, RECORD_DEPENDENCY, RECORD_MOD, RECORD_START, RECORD_SUMMARY,
+                        report_records)
+
+# 模组清单文件名（记录复制时计算的每个文件的大小与哈希）
+MANIFEST_FILE_NAME = '.mod_manifest.json'
+# 清单使用的哈希算法
+HASH_ALGORITHM = 'sha256'
+# 校验复制时的读写块大小
+COPY_CHUNK_SIZE = 1024 * 1024
+# 内容哈希缓存文件（按 路径+大小+mtime_ns 缓存，跨运行复用）
+HASH_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.mod_user_tool', 'hash_cache.json')
+# 目录树状态缓存文件（按目录 mtime 复用文件列表，跨运行复用）
+STAT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.mod_user_tool', 'stat_cache.json')
+# 模组元数据缓存文件（按模组目录的树指纹复用解析结果，跨运行复用）
+METADATA_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.mod_user_tool', 'metadata_cache.json')
+# 写入过程中的临时文件后缀（完成后重命名为最终文件）
+PARTIAL_FILE_SUFFIX = '.part'
+# 复制模组与智能更新使用的传输日志文件名
+COPY_JOURNAL_FILE_NAME = '.copy_journal.jsonl'
+UPDATE_JOURNAL_FILE_NAME = '.mods_update_journal.jsonl'
+# 智能更新的暂存文件夹名与应用更新时的回滚文件夹名
+UPDATE_FOLDER_NAME = 'mods_update'
+ROLLBACK_FOLDER_NAME = 'mods_rollback'
+# 运行报告所在的子文件夹名
+REPORTS_FOLDER_NAME = 'mods_reports'
+# 目标文件夹中由本工具创建、不是模组的子文件夹（索引、校验和清理时跳过）
+TOOL_FOLDER_NAMES = (UPDATE_FOLDER_NAME, ROLLBACK_FOLDER_NAME, REPORTS_FOLDER_NAME)
+# 回滚文件夹中记录重命名操作的文件名
+APPLY_LOG_FILE_NAME = 'apply_log.json'
+
+logger = get_logger('mod_manager')
 
 
 class ModManager:
     """模组管理器类"""
     
     def __init__(self):
+        # 日志管线（structured_log.start_logging）由程序入口（界面、守护进程、命令行）启动，
+        # 作为库使用时（例如测试）不写日志文件
         self.mod_info = {}
+        # 目录条目缓存：{目录路径: [条目名称, ...]}，供模组表格等按需查询时复用；
+        # 按线程保存：每个操作在自己的线程中规划，一个操作清空缓存不会丢掉同时运行的其他操作的规划快照
+        self._listing_local = threading.local()
+        # 复制与校验路径共用的 I/O 限速器（默认不限速，可在任务运行中调整）
+        self.io_throttle = IOThrottle()
+        # 文件复制后端（见 copy_backends.COPY_BACKENDS），auto 优先使用内核零拷贝
+        self.copy_backend = 'auto'
+        # 状态缓存：所有目录列表和文件大小/修改时间都经由它读取，未变化的目录不会重新列出
+        # 取消与暂停控制（CancelToken）按操作传入：各长时间运行的方法接受 cancel_token 参数，
+        # 在文件（或模组）边界调用其 checkpoint()；同时运行的操作各自使用自己的控制，互不影响
+        self.stat_cache = StatCache(cache_path=STAT_CACHE_PATH)
+        # 内容哈希器：为 check_mod_needs_update 提供模组内容指纹
+        self.content_hasher = ContentHasher(
+            algorithm=HASH_ALGORITHM,
+            cache_path=HASH_CACHE_PATH,
+            throttle=self.io_throttle.throttle,
+            ignored_files=(MANIFEST_FILE_NAME,)
+        )
+        # 版本相同时是否再按内容指纹比较
+        self.compare_content = False
+        # 批量元数据扫描器：规划与导出时并行读取各模组的 ServerData.json
+        self.metadata_scanner = MetadataScanner()
+        # 元数据缓存：树指纹未变化的模组直接复用上次解析的记录
+        self.metadata_cache = MetadataCache(cache_path=METADATA_CACHE_PATH)
+        # 依赖图：{源文件夹绝对路径: DependencyGraph}，多次规划间复用
+        self._dependency_graphs = {}
+        # mod_info.json 的输出格式：紧凑（无缩进）与按模组 ID 排序
+        self.mod_info_compact = False
+        self.mod_info_sort_keys = False
+        # 作为源使用的压缩包：{压缩包绝对路径: ArchiveModSource}
+        self._archive_sources = {}
     
     def sanitize_folder_name(self, name: str) -> str:
         """将名称清理为合法的 Windows 文件夹名。"""
-        import re
         cleaned = re.sub(r'[<>:"/\\|?*]', '_', name)
         cleaned = cleaned.strip().rstrip('.')
         return cleaned
@@ -30,52 +117,229 @@ class ModManager:
 
     def resolve_target_mod_path(self, target_folder: str, mod_id: str, standardized_name: str) -> str:
         """在目标目录中查找已存在的包含该 mod_id 的文件夹；若不存在则返回标准化路径。"""
-        for existing_name in os.listdir(target_folder):
-            existing_path = os.path.join(target_folder, existing_name)
-            if os.path.isdir(existing_path) and mod_id in existing_name:
-                return existing_path
+        for existing_name in self.stat_cache.subdirs(target_folder):
+            if mod_id in existing_name:
+                return os.path.join(target_folder, existing_name)
         return os.path.join(target_folder, standardized_name)
 
+    def standardize_target_mod_path(self, target_folder: str, mod_id: str, standardized_name: str) -> Tuple[str, str]:
+        """
+        确定模组在目标目录中的路径：若存在旧命名目录且标准化目录不存在，先重命名为标准化目录，避免重复目录
+        返回: (用于检查是否需要更新的现有路径, 复制时使用的标准化路径)
+        """
+        standardized_target_path = os.path.join(target_folder, standardized_name)
+        existing_path = self.find_existing_mod_path(target_folder, mod_id)
+        if existing_path and existing_path != standardized_target_path and not os.path.exists(standardized_target_path):
+            try:
+                os.rename(existing_path, standardized_target_path)
+                self.stat_cache.invalidate(existing_path)
+                self.stat_cache.invalidate(target_folder, recursive=False)
+                existing_path = standardized_target_path
+            except Exception:
+                # 如果重命名失败，继续后续逻辑，复制时将覆盖/合并到标准化目录
+                pass
+        if os.path.exists(standardized_target_path):
+            return standardized_target_path, standardized_target_path
+        return existing_path or standardized_target_path, standardized_target_path
+
     def find_existing_mod_path(self, target_folder: str, mod_id: str) -> str:
         """仅查找包含 mod_id 的已存在目录，找不到返回空字符串。"""
-        for existing_name in os.listdir(target_folder):
-            existing_path = os.path.join(target_folder, existing_name)
-            if os.path.isdir(existing_path) and mod_id in existing_name:
-                return existing_path
+        for existing_name in self.stat_cache.subdirs(target_folder):
+            if mod_id in existing_name:
+                return os.path.join(target_folder, existing_name)
+        return ""
+
+    def list_folder_entries(self, folder: str) -> List[str]:
+        """列出目录条目（带缓存，避免每个模组都重新 listdir 一次）；folder 为压缩包时列出其中的模组文件夹"""
+        entries = self._listing_cache.get(folder)
+        if entries is None:
+            archive = self.get_archive_source(folder)
+            try:
+                entries = archive.folder_names() if archive else self.stat_cache.list_dir(folder)
+            except OSError:
+                entries = []
+            self._listing_cache[folder] = entries
+        return entries
+
+    def get_archive_source(self, path: str) -> ArchiveModSource:
+        """path 为 zip 压缩包时返回其模组索引（首次使用时读取中央目录），否则返回 None"""
+        key = os.path.abspath(path)
+        archive = self._archive_sources.get(key)
+        if archive is None and os.path.isfile(key) and is_archive_source(key):
+            archive = ArchiveModSource(key)
+            self._archive_sources[key] = archive
+        return archive
+
+    def split_archive_path(self, path: str) -> Tuple[ArchiveModSource, str, str]:
+        """
+        把压缩包内的路径（压缩包路径/模组文件夹/相对路径）拆分为 (压缩包索引, 模组文件夹名, 相对路径)
+        不在已打开的压缩包内时返回 (None, "", "")
+        """
+        path = os.path.abspath(path)
+        for archive_path, archive in self._archive_sources.items():
+            if path.startswith(archive_path + os.sep):
+                parts = path[len(archive_path) + 1:].replace(os.sep, '/').split('/', 1)
+                return archive, parts[0], parts[1] if len(parts) > 1 else ""
+        return None, "", ""
+
+    def close_archive_sources(self) -> None:
+        """关闭所有作为源打开的压缩包"""
+        for archive in self._archive_sources.values():
+            archive.close()
+        self._archive_sources.clear()
+        self.clear_listing_cache()
+
+    def is_mod_folder(self, path: str) -> bool:
+        """路径是否为模组文件夹（普通目录或压缩包中的模组）"""
+        archive, folder, rel_path = self.split_archive_path(path)
+        if archive is not None:
+            return not rel_path and folder in archive.mods
+        return self.stat_cache.is_dir(path)
+
+    def is_source_file(self, path: str) -> bool:
+        """路径是否为文件（普通文件或压缩包中的文件）"""
+        archive, folder, rel_path = self.split_archive_path(path)
+        if archive is not None:
+            return archive.has_file(folder, rel_path)
+        return self.stat_cache.is_file(path)
+
+    def open_source_text(self, path: str):
+        """以 utf-8-sig 文本方式打开文件（普通文件或压缩包中的文件）"""
+        archive, folder, rel_path = self.split_archive_path(path)
+        if archive is not None:
+            return io.TextIOWrapper(archive.open(folder, rel_path), encoding='utf-8-sig')
+        return open(path, 'r', encoding='utf-8-sig')
+
+    def open_source_file(self, path: str):
+        """以二进制方式打开文件进行流式读取（普通文件或压缩包中的文件）"""
+        archive, folder, rel_path = self.split_archive_path(path)
+        if archive is not None:
+            return archive.open(folder, rel_path)
+        return open(path, 'rb')
+
+    def source_mtime_ns(self, path: str) -> int:
+        """文件的修改时间 mtime_ns（普通文件或压缩包中的文件）"""
+        archive, folder, rel_path = self.split_archive_path(path)
+        if archive is not None:
+            return zip_mtime_ns(archive.mods[folder][rel_path])
+        return os.stat(path).st_mtime_ns
+
+    @property
+    def _listing_cache(self) -> Dict[str, List[str]]:
+        """当前线程的目录条目缓存"""
+        cache = getattr(self._listing_local, 'entries', None)
+        if cache is None:
+            cache = self._listing_local.entries = {}
+        return cache
+
+    def clear_listing_cache(self) -> None:
+        """清空当前线程的目录条目缓存（源/目标目录变化后、操作开始时调用）"""
+        self._listing_cache.clear()
+
+    def find_mod_folder(self, folder: str, mod_id: str) -> str:
+        """在目录中查找名称包含 mod_id 的模组文件夹，找不到返回空字符串。"""
+        if not folder or not mod_id:
+            return ""
+        for name in self.list_folder_entries(folder):
+            if mod_id in name:
+                path = os.path.join(folder, name)
+                if self.is_mod_folder(path):
+                    return path
         return ""
 
+    def read_server_data(self, mod_path: str) -> Dict[str, Any]:
+        """读取模组的 ServerData.json，读取失败返回空字典。"""
+        server_data_path = os.path.join(mod_path, 'ServerData.json')
+        try:
+            with self.open_source_text(server_data_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def read_mod_version(self, mod_path: str) -> str:
+        """读取模组 ServerData.json 中的版本号，读取失败返回空字符串。"""
+        return self.read_server_data(mod_path).get('revision', {}).get('version', '')
+
+    def build_mod_rows(self, mods: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        为模组表格构建行数据
+        只使用配置中已有的轻量字段，源/目标版本、大小和计划操作由 fill_mod_row 按需填充
+        """
+        rows = []
+        seen = set()
+        for mod in mods:
+            mod_id = mod.get('modId', '')
+            if not mod_id or mod_id in seen:
+                continue
+            seen.add(mod_id)
+            rows.append({
+                'modId': mod_id,
+                'name': mod.get('name', mod_id),
+                'source_version': mod.get('version', ''),
+                'target_version': '',
+                'size': None,
+                'action': '',
+                'loaded': False
+            })
+        return rows
+
+    def fill_mod_row(self, row: Dict[str, Any], source_folder: str, target_folder: str) -> Dict[str, Any]:
+        """填充单行的源版本、目标版本、大小和计划操作（与智能更新的判断规则一致）"""
+        mod_id = row['modId']
+        source_path = self.find_mod_folder(source_folder, mod_id)
+        target_path = self.find_mod_folder(target_folder, mod_id)
+
+        if source_path:
+            parsed = self.parse_mod_info(source_path, mod_id)
+            row['name'] = parsed.get('name', row['name'])
+            row['source_version'] = parsed.get('version', '')
+            row['size'] = self.get_folder_size(source_path)
+        if target_folder:
+            row['target_version'] = self.read_mod_version(target_path) if target_path else "不存在"
+
+        if not source_folder or not target_folder:
+            row['action'] = ""
+        elif not source_path:
+            row['action'] = "源缺失"
+        elif not target_path:
+            row['action'] = "新增"
+        elif row['source_version'] != row['target_version']:
+            row['action'] = "更新"
+        else:
+            row['action'] = "跳过"
+        row['loaded'] = True
+        return row
+
     def get_folder_size(self, folder_path: str) -> int:
         """获取文件夹大小（以字节为单位）"""
-        total_size = 0
-        for dirpath, dirnames, filenames in os.walk(folder_path):
-            for f in filenames:
-                fp = os.path.join(dirpath, f)
-                if not os.path.islink(fp):
-                    total_size += os.path.getsize(fp)
-        return total_size
+        archive, folder, _ = self.split_archive_path(folder_path)
+        if archive is not None:
+            return archive.mod_size(folder)
+        return sum(size for size, _ in self.stat_cache.walk_files(folder_path).values())
     
-    def check_mod_needs_update(self, source_path: str, target_path: str, mod_id: str) -> Tuple[bool, str, str, str]:
+    def check_mod_needs_update(self, source_path: str, target_path: str, mod_id: str,
+                               cancel_token: CancelToken = None) -> Tuple[bool, str, str, str]:
         """
         检查模组是否需要更新
         返回: (是否需要更新, 原因, 源版本, 目标版本)
         """
         try:
             # 检查目标文件夹是否存在
-            if not os.path.exists(target_path):
+            if not self.stat_cache.is_dir(target_path):
                 return True, "目标模组不存在", "未知", "不存在"
             
-            # 检查源模组的ServerData.json
+            # 检查源模组的ServerData.json（源可以是压缩包中的模组）
             source_server_data_path = os.path.join(source_path, 'ServerData.json')
-            if not os.path.isfile(source_server_data_path):
+            if not self.is_source_file(source_server_data_path):
                 return True, "源模组缺少ServerData.json", "未知", "未知"
             
             # 检查目标模组的ServerData.json
             target_server_data_path = os.path.join(target_path, 'ServerData.json')
-            if not os.path.isfile(target_server_data_path):
+            if not self.stat_cache.is_file(target_server_data_path):
                 return True, "目标模组缺少ServerData.json", "未知", "未知"
             
             # 读取版本信息
-            with open(source_server_data_path, 'r', encoding='utf-8-sig') as f:
+            with self.open_source_text(source_server_data_path) as f:
                 source_data = json.load(f)
             with open(target_server_data_path, 'r', encoding='utf-8-sig') as f:
                 target_data = json.load(f)
@@ -86,25 +350,132 @@ class ModManager:
             # 如果版本不同，需要更新
             if source_version != target_version:
                 return True, f"版本不同 (源: {source_version}, 目标: {target_version})", source_version, target_version
+
+            # 快速检查：比较两侧的树指纹（文件数、总大小、路径与大小摘要、最新修改时间）
+            source_tree = self.get_tree_fingerprint(source_path, cancel_token)
+            target_tree = self.get_tree_fingerprint(target_path, cancel_token)
+            # 目标中比较的文件（None 表示与源布局相同，比较全部文件）与源中没有的多余文件
+            target_files = None
+            extra_files = []
+            if not source_tree.same_layout(target_tree):
+                # 只检查源中的每个文件在目标中是否存在且大小相同：复制不会删除目标中多余的文件
+                # （旧版本遗留或服务器生成的文件），它们不触发更新，只在原因中单独说明
+                source_files = self.list_mod_files(source_path, cancel_token)
+                all_target_files = self.list_mod_files(target_path, cancel_token)
+                differing = [rel_path for rel_path, (size, _) in source_files.items()
+                             if all_target_files.get(rel_path, [None])[0] != size]
+                if differing:
+                    return (True, f"文件不同 ({len(differing)} 个文件缺失或大小不同，如 {differing[0]})",
+                            source_version, target_version)
+                extra_files = sorted(set(all_target_files) - set(source_files))
+                target_files = {rel_path: all_target_files[rel_path] for rel_path in source_files}
+            up_to_date = "模组已是最新版本"
+            if extra_files:
+                up_to_date += f"（目标中另有 {len(extra_files)} 个源中没有的文件，如 {extra_files[0]}）"
+
+            # 版本相同时按内容指纹比较
+            if self.compare_content:
+                source_digest = self.get_mod_fingerprint(source_path, cancel_token)['digest']
+                target_digest = self.get_mod_fingerprint(target_path, cancel_token, target_files)['digest']
+                if source_digest != target_digest:
+                    return True, f"内容不同 (源: {source_digest[:12]}, 目标: {target_digest[:12]})", source_version, target_version
+                return False, up_to_date, source_version, target_version
+
+            # 文件布局相同时，源中有更新的文件则需要更新
+            target_mtime_ns = target_tree.mtime_ns
+            if target_files is not None:
+                target_mtime_ns = max((mtime_ns for _, mtime_ns in target_files.values()), default=0)
+            if source_tree.mtime_ns > target_mtime_ns:
+                return (True, f"源文件更新 (源: {source_tree.mtime_ns / 1e9}, 目标: {target_mtime_ns / 1e9})",
+                        source_version, target_version)
             
-            # 检查文件修改时间
-            source_mtime = os.path.getmtime(source_path)
-            target_mtime = os.path.getmtime(target_path)
-            
-            # 如果源文件更新，需要更新
-            if source_mtime > target_mtime:
-                return True, f"源文件更新 (源: {source_mtime}, 目标: {target_mtime})", source_version, target_version
-            
-            return False, "模组已是最新版本", source_version, target_version
+            return False, up_to_date, source_version, target_version
             
+        except OperationCancelled:
+            raise
         except Exception as e:
             return True, f"检查过程中出错: {e}", "未知", "未知"
     
-    def smart_update_mods(self, json_content: str, source_folder: str, target_folder: str) -> Dict[str, Any]:
+    def get_tree_fingerprint(self, mod_path: str, cancel_token: CancelToken = None) -> TreeFingerprint:
+        """获取模组的树指纹（check_mod_needs_update 在比较内容哈希之前的快速检查；按文件列表计算，不读取文件内容）"""
+        return fingerprint_files(self.list_mod_files(mod_path, cancel_token))
+
+    def get_mod_fingerprint(self, mod_path: str, cancel_token: CancelToken = None,
+                            files: Dict[str, List[int]] = None) -> Dict[str, Any]:
+        """
+        获取模组内容指纹（文件哈希有缓存，未变化的文件不会重新读取；压缩包中的模组需要读取全部数据）
+        files 为只参与计算的文件 {相对路径: [大小, mtime_ns]}，省略时为模组中的全部文件
+        """
+        archive, folder, _ = self.split_archive_path(mod_path)
+        if archive is not None:
+            return archive.mod_fingerprint(folder, HASH_ALGORITHM, self.content_hasher.ignored_files)
+        if files is None:
+            files = self.list_mod_files(mod_path, cancel_token)
+        return self.content_hasher.mod_fingerprint(mod_path, files,
+                                                   checkpoint=cancel_token.checkpoint if cancel_token else None)
+
+    def save_caches(self) -> None:
+        """保存跨运行复用的缓存"""
+        try:
+            self.content_hasher.save()
+            self.stat_cache.save()
+            self.metadata_cache.save()
+        except OSError as e:
+            logger.error(f"保存缓存时出错: {e}", extra=log_fields(phase='cache'))
+
+    def smart_update_mods(self, json_content: str, source_folder: str, target_folder: str,
+                          verify: bool = False, resume: bool = True,
+                          max_workers: int = DEFAULT_COPY_WORKERS, order: str = 'largest',
+                          record_callback=None, space_callback=None,
+                          cancel_token: CancelToken = None) -> Dict[str, Any]:
+        """
+        智能更新模组，返回汇总记录（各计数、更新文件夹、是否续传、线程空闲时间报告）
+        每个模组的结果记录在产生时追加到目标文件夹中 mods_reports/ 下的运行报告（只保留最近的运行），
+        并传给 record_callback(记录)；
+        参数含义见 iter_smart_update_mods
+        """
+        summary = {}
+        records = self.iter_smart_update_mods(
+            json_content, source_folder, target_folder, verify=verify, resume=resume,
+            max_workers=max_workers, order=order, space_callback=space_callback, cancel_token=cancel_token
+        )
+        report = RunReport(os.path.join(target_folder, REPORTS_FOLDER_NAME, RUN_REPORT_FILE_NAME), 'smart_update')
+        started = time.monotonic()
+        for record in report_records(records, report):
+            if record_callback:
+                record_callback(record)
+            if record['type'] == RECORD_MOD:
+                logger.debug(f"{record['action']}: {record['name']} ({record['version']}) - {record['reason']}",
+                             extra=log_fields(mod_id=record['mod_id'], phase='smart_update', path=record['path']))
+            elif record['type'] == RECORD_SUMMARY:
+                summary = record
+                logger.debug(f"智能更新完成: 新增 {record['new_mods']}, 更新 {record['updated_mods']}, "
+                             f"跳过 {record['skipped_mods']}, 失败 {record['failed_mods']}",
+                             extra=log_fields(phase='smart_update', duration=time.monotonic() - started,
+                                              path=target_folder))
+        return summary
+
+    def iter_smart_update_mods(self, json_content: str, source_folder: str, target_folder: str,
+                               verify: bool = False, resume: bool = True,
+                               max_workers: int = DEFAULT_COPY_WORKERS,
+                               order: str = 'largest', space_callback=None,
+                               cancel_token: CancelToken = None) -> Iterator[Dict[str, Any]]:
         """
-        智能更新模组
+        智能更新模组，逐个产生结果记录
         只有版本号不同和新的模组列表中有但目标文件夹中没有的模组才更新
         单独新建一个文件夹来存放需要更新与添加的模组
+        verify=True 时复制过程中校验并写入模组清单；
+        resume=True 且上次运行未完成时保留更新文件夹，从上次完成的文件继续；
+        配置中模组在源中的依赖一并检查和更新，复制时依赖先于依赖它的模组完成；
+        需要更新的模组先全部确定，再按大小调度并行复制（order 见 run_copy_jobs）；
+        复制前检查更新文件夹所在磁盘的空间，不足时调用 space_callback(空间不足的磁盘列表)：
+        返回 True 时分批执行，每批复制后立即应用到目标文件夹并删除被替换的旧版本以释放空间，
+        未提供或返回 False 时不复制任何文件并抛出 ValueError；
+        cancel_token 为本次操作的取消与暂停控制（调用方提前停止迭代时也会用它取消仍在进行的复制）
+        依次产生: start 记录；每个缺失或版本不一致的依赖一条 dependency 记录；每个模组一条 mod 记录（跳过的模组在规划时产生，复制的模组在完成时产生）；
+        最后一条 summary 记录
+        内存：依赖闭包、空间预检和按大小调度都需要完整的模组列表，因此先读取全部模组的元数据并确定全部复制任务再开始复制，
+        metadata、copy_jobs 与 mod_info 的大小与配置中的模组数成正比（每个模组约几百字节，不包含文件列表）
         """
         try:
             config = json.loads(json_content)
@@ -115,134 +486,1098 @@ class ModManager:
             raise ValueError("JSON文件格式不正确")
         
         mods = config['game']['mods']
+        cancel_token = cancel_token or CancelToken()
+        self.clear_listing_cache()
         
-        # 创建更新文件夹
-        update_folder = os.path.join(target_folder, "mods_update")
-        if os.path.exists(update_folder):
-            shutil.rmtree(update_folder)
+        # 创建更新文件夹（上次运行中断时保留已复制的内容）
+        update_folder = os.path.join(target_folder, UPDATE_FOLDER_NAME)
+        journal = TransferJournal(os.path.join(target_folder, UPDATE_JOURNAL_FILE_NAME))
+        resumed = resume and journal.has_pending()
+        if not resumed:
+            journal.complete()
+            if os.path.exists(update_folder):
+                shutil.rmtree(update_folder)
+        else:
+            logger.warning(f"检测到未完成的智能更新，将从上次中断处继续: {update_folder}",
+                           extra=log_fields(phase='smart_update', path=update_folder))
         os.makedirs(update_folder, exist_ok=True)
         
         # 统计信息
-        total_mods_count = len(mods)
-        updated_mods_count = 0
-        skipped_mods_count = 0
-        new_mods_count = 0
+        counts = {'new': 0, 'updated': 0, 'skipped': 0, 'failed': 0}
         mod_info = {}
+        # 待复制任务: {更新文件夹中的路径: (mod_id, 源路径, 目标中是否已存在, 原因)}
+        copy_jobs = {}
+        schedule = {}
+        copy_thread = None
+        yield {'type': RECORD_START, 'source_folder': source_folder, 'target_folder': target_folder,
+               'total_mods': len(mods), 'resumed': resumed}
         
-        for mod in mods:
-            mod_id = mod.get('modId', '')
-            if not mod_id:
-                continue
-                
-            # 在源文件夹中查找对应的模组文件夹
-            mod_source_path = None
-            for folder_name in os.listdir(source_folder):
-                if mod_id in folder_name:
-                    mod_source_path = os.path.join(source_folder, folder_name)
-                    if os.path.isdir(mod_source_path):
-                        break
-            
-            if not mod_source_path or not os.path.isdir(mod_source_path):
-                continue
-            
-            # 解析版本，确定标准化文件夹名（源文件夹名_版本）
-            parsed_info = self.parse_mod_info(mod_source_path, mod_id)
-            standardized_name = self.generate_mod_folder_name(os.path.basename(mod_source_path), parsed_info.get('version', '未知'))
-
-            # 检查目标文件夹中是否存在该模组
-            mod_target_path = self.resolve_target_mod_path(target_folder, mod_id, standardized_name)
-            needs_update = False
-            reason = ""
-            source_version = ""
-            target_version = ""
-            
-            if os.path.exists(mod_target_path):
-                # 模组已存在，检查是否需要更新
-                needs_update, reason, source_version, target_version = self.check_mod_needs_update(
-                    mod_source_path, mod_target_path, mod_id
-                )
-                
-                # 只有版本号不同时才更新
-                if needs_update and "版本不同" in reason:
-                    needs_update = True
-                else:
+        try:
+            # 批量读取源中各模组的元数据（源文件夹或源压缩包）
+            metadata = self.scan_mods_metadata(mods, source_folder, cancel_token)
+            # 依赖闭包：源中存在的依赖模组一并更新，缺失或版本不一致的依赖逐条产生 dependency 记录
+            dependencies = self.resolve_dependencies(mods, source_folder, metadata, cancel_token)
+            for problem in dependencies['problems']:
+                yield dict(problem, type=RECORD_DEPENDENCY)
+            plan_mods = mods + [{'modId': mod_id} for mod_id in dependencies['added']]
+            with self.planning_snapshot(metadata, [target_folder], cancel_token):
+                for mod in plan_mods:
+                    cancel_token.checkpoint()
+                    mod_id = mod.get('modId', '')
+                    record = metadata.pop(mod_id, None)
+                    if not record:
+                        continue
+                    mod_source_path = record['path']
+
+                    # 确定标准化文件夹名（源文件夹名_版本）
+                    parsed_info = mod_info_entry(record)
+                    standardized_name = self.generate_mod_folder_name(os.path.basename(mod_source_path), parsed_info.get('version', '未知'))
+
+                    # 检查目标文件夹中是否存在该模组
+                    mod_target_path = self.resolve_target_mod_path(target_folder, mod_id, standardized_name)
                     needs_update = False
-                    reason = "版本相同，无需更新"
-            else:
-                # 模组不存在，需要添加
-                needs_update = True
-                reason = "新模组，需要添加"
-                source_version = "未知"
-                target_version = "不存在"
-            
-            if needs_update:
-                # 复制到更新文件夹
-                update_mod_path = os.path.join(update_folder, standardized_name)
-                if self.copy_mod_folder(mod_source_path, update_mod_path):
+                    reason = ""
+
                     if os.path.exists(mod_target_path):
-                        updated_mods_count += 1
-                        print(f"模组 {mod_id} 已更新到更新文件夹: {update_mod_path}")
+                        # 模组已存在，检查是否需要更新
+                        needs_update, reason, _, target_version = self.check_mod_needs_update(
+                            mod_source_path, mod_target_path, mod_id, cancel_token
+                        )
+
+                        # 只有版本号不同（或启用内容比较时内容不同）时才更新
+                        if needs_update and ("版本不同" in reason or "内容不同" in reason):
+                            needs_update = True
+                        else:
+                            needs_update = False
+                            reason = "版本相同，无需更新"
                     else:
-                        new_mods_count += 1
-                        print(f"新模组 {mod_id} 已添加到更新文件夹: {update_mod_path}")
+                        # 模组不存在，需要添加
+                        needs_update = True
+                        reason = "新模组，需要添加"
+
+                    # 读取模组信息
+                    mod_info[mod_id] = parsed_info
+
+                    if needs_update:
+                        # 复制到更新文件夹
+                        update_mod_path = os.path.join(update_folder, standardized_name)
+                        copy_jobs[update_mod_path] = (mod_id, mod_source_path, os.path.exists(mod_target_path), reason)
+                    else:
+                        counts['skipped'] += 1
+                        yield self._mod_record(mod_id, parsed_info, 'skipped', reason, mod_target_path)
+
+            # 磁盘空间预检：更新文件夹中需要写入的字节数（已续传的文件不计）
+            jobs = [(source_path, update_path) for update_path, (_, source_path, _, _) in copy_jobs.items()]
+            job_sizes = {update_path: self.estimate_copy_bytes(source_path, update_path, journal, cancel_token)
+                         for source_path, update_path in jobs}
+            shortages = [entry for entry in check_space(job_sizes) if not entry['ok']]
+            batched = bool(shortages)
+            if shortages and not (space_callback and space_callback(shortages)):
+                raise ValueError(space_error(shortages))
+
+            # 在后台线程中复制，每个模组完成时通过队列交给生成器产生记录
+            finished = queue.Queue()
+
+            def run_copy():
+                copy_kwargs = dict(
+                    verify=verify, journal=journal, max_workers=max_workers, order=order,
+                    cancel_token=cancel_token,
+                    mod_callback=lambda path, ok, error: finished.put((path, ok, error)),
+                    dependencies=self.dependency_copy_order(
+                        dependencies['graph'],
+                        {mod_id: update_path for update_path, (mod_id, _, _, _) in copy_jobs.items()}
+                    )
+                )
+                try:
+                    if batched:
+                        schedule.update(self.run_staged_batches(jobs, job_sizes, target_folder, **copy_kwargs))
+                    else:
+                        schedule.update(self.run_copy_jobs(jobs, **copy_kwargs))
+                except Exception as e:
+                    schedule['error'] = e
+
+            copy_thread = threading.Thread(target=run_copy, daemon=True)
+            copy_thread.start()
+            for _ in range(len(copy_jobs)):
+                update_mod_path, ok, error = self._next_finished(finished, copy_thread)
+                if update_mod_path is None:
+                    break
+                mod_id, _, existed, reason = copy_jobs[update_mod_path]
+                if not ok:
+                    counts['failed'] += 1
+                    logger.error(f"复制模组 {mod_id} 失败: {error}",
+                                 extra=log_fields(mod_id=mod_id, phase='smart_update', path=update_mod_path))
+                    yield self._mod_record(mod_id, mod_info[mod_id], 'failed', error, update_mod_path)
                 else:
-                    print(f"复制模组 {mod_id} 失败")
-            else:
-                skipped_mods_count += 1
-                print(f"模组 {mod_id} 跳过: {reason}")
-            
-            # 读取模组信息
-            mod_info[mod_id] = self.parse_mod_info(mod_source_path, mod_id)
+                    counts['updated' if existed else 'new'] += 1
+                    yield self._mod_record(mod_id, mod_info[mod_id], 'updated' if existed else 'new',
+                                           reason, update_mod_path)
+            copy_thread.join()
+            if 'error' in schedule:
+                raise schedule['error']
+            if schedule.get('cancelled'):
+                # 取消时删除未复制完成的暂存模组，已完成的模组保留，再次运行时从日志继续
+                self.cleanup_cancelled_copy(journal, remove_incomplete=True)
+                raise OperationCancelled()
+        finally:
+            # 调用方提前停止迭代时取消仍在进行的复制
+            if copy_thread is not None and copy_thread.is_alive():
+                cancel_token.cancel()
+                copy_thread.join()
+            journal.close()
         
-        # 在更新文件夹中生成模组信息文件
-        self.save_mod_info_json(mod_info, update_folder)
+        self.save_caches()
+
+        # 上次中断遗留、本次不再需要的半成品模组文件夹
+        for pending_path in journal.pending_targets():
+            if os.path.isdir(pending_path):
+                shutil.rmtree(pending_path, ignore_errors=True)
+        journal.complete()
+
+        # 在更新文件夹中生成模组信息文件（分批执行时模组已应用到目标文件夹，合并到目标的模组信息文件）
+        if schedule.get('batches'):
+            mod_info_path = self.save_mod_info_json(mod_info, target_folder, merge=True)
+        else:
+            mod_info_path = self.save_mod_info_json(mod_info, update_folder)
         
+        yield {
+            'type': RECORD_SUMMARY,
+            'total_mods': len(mods),
+            'new_mods': counts['new'],
+            'updated_mods': counts['updated'],
+            'skipped_mods': counts['skipped'],
+            'failed_mods': counts['failed'],
+            'dependency_mods': dependencies['added'],
+            'dependency_problems': len(dependencies['problems']),
+            'update_folder': update_folder,
+            'applied_batches': schedule.get('batches', 0),
+            'mod_info_path': mod_info_path,
+            'resumed': resumed,
+            'idle_seconds': schedule.get('idle_seconds', 0.0),
+            'worker_stats': schedule.get('worker_stats', [])
+        }
+
+    @staticmethod
+    def _next_finished(finished: queue.Queue, copy_thread: threading.Thread) -> Tuple[str, bool, str]:
+        """等待下一个完成的模组；复制线程已退出且队列为空（例如被取消）时返回 (None, False, "")"""
+        while True:
+            try:
+                return finished.get(timeout=0.5)
+            except queue.Empty:
+                if not copy_thread.is_alive() and finished.empty():
+                    return None, False, ""
+
+    @staticmethod
+    def _mod_record(mod_id: str, parsed_info: Dict[str, str], action: str, reason: str, path: str) -> Dict[str, Any]:
+        """单个模组的结果记录，action 为 new / updated / skipped / failed"""
         return {
-            'total_mods': total_mods_count,
-            'new_mods': new_mods_count,
-            'updated_mods': updated_mods_count,
+            'type': RECORD_MOD,
+            'mod_id': mod_id,
+            'name': parsed_info.get('name', mod_id),
+            'version': parsed_info.get('version', ''),
+            'action': action,
+            'reason': reason,
+            'path': path
+        }
+
+    def run_staged_batches(self, jobs: List[Tuple[str, str]], job_sizes: Dict[str, int], target_folder: str,
+                           cancel_token: CancelToken = None, **copy_kwargs) -> Dict[str, Any]:
+        """
+        空间不足时分批执行智能更新的复制：每批只取当前可用空间放得下的模组，
+        复制完成后应用到目标文件夹并删除被替换的旧版本（不保留回滚），释放空间后再确定下一批
+        有模组复制失败或下一个模组超过可用空间时停止并抛出 ValueError；返回合并的调度报告（含批次数）
+        """
+        update_folder = os.path.join(target_folder, UPDATE_FOLDER_NAME)
+        merged = {'results': {}, 'cancelled': False, 'wall_seconds': 0.0, 'idle_seconds': 0.0,
+                  'worker_stats': [], 'batches': 0}
+        cancel_token = cancel_token or CancelToken()
+        remaining = [(job, job_sizes[job[1]]) for job in jobs]
+        while remaining:
+            cancel_token.checkpoint()
+            available = available_bytes(update_folder)
+            batch, remaining = take_batch(remaining, available)
+            if not batch:
+                smallest = min(size for _, size in remaining)
+                raise ValueError(f"目标磁盘空间不足: 剩余模组中最小的需要 {format_megabytes(smallest)}，"
+                                 f"可用 {format_megabytes(available)}")
+            logger.info(f"分批更新: 第 {merged['batches'] + 1} 批 {len(batch)} 个模组，剩余 {len(remaining)} 个",
+                        extra=log_fields(phase='smart_update', size=sum(job_sizes[path] for _, path in batch)))
+            schedule = self.run_copy_jobs(batch, cancel_token=cancel_token, **copy_kwargs)
+            merged['batches'] += 1
+            merged['results'].update(schedule['results'])
+            merged['wall_seconds'] += schedule['wall_seconds']
+            merged['idle_seconds'] += schedule['idle_seconds']
+            merged['worker_stats'].extend(schedule['worker_stats'])
+            if schedule['cancelled']:
+                merged['cancelled'] = True
+                break
+            if not all(schedule['results'].values()):
+                raise ValueError("分批更新中有模组复制失败，已停止后续批次（已复制的模组保留在更新文件夹中）")
+            applied = self.apply_staged_updates(target_folder)
+            if applied['rollback_folder']:
+                shutil.rmtree(applied['rollback_folder'], ignore_errors=True)
+                rollback_root = os.path.dirname(applied['rollback_folder'])
+                if os.path.isdir(rollback_root) and not os.listdir(rollback_root):
+                    os.rmdir(rollback_root)
+            self.stat_cache.invalidate(target_folder)
+        return merged
+
+    def apply_staged_updates(self, target_folder: str) -> Dict[str, Any]:
+        """
+        将 mods_update/ 中暂存的模组通过同一文件系统内的重命名应用到目标文件夹
+        被替换的旧版本移动到 mods_rollback/{时间戳}/，可通过 rollback_last_apply 恢复；
+        任一重命名失败时撤销本次已完成的重命名
+        """
+        update_folder = os.path.join(target_folder, UPDATE_FOLDER_NAME)
+        if not os.path.isdir(update_folder):
+            raise ValueError(f"未找到暂存的更新文件夹: {update_folder}")
+        if TransferJournal(os.path.join(target_folder, UPDATE_JOURNAL_FILE_NAME)).has_pending():
+            raise ValueError("智能更新尚未完成，请先重新运行智能更新")
+
+        staged_info = {}
+        staged_info_path = os.path.join(update_folder, 'mod_info.json')
+        if os.path.isfile(staged_info_path):
+            with open(staged_info_path, 'r', encoding='utf-8') as f:
+                staged_info = json.load(f)
+
+        # 先确定全部重命名操作，再集中执行，尽量缩短服务器停机时间
+        rollback_folder = os.path.join(target_folder, ROLLBACK_FOLDER_NAME, time.strftime('%Y%m%d_%H%M%S'))
+        suffix = 1
+        while os.path.exists(rollback_folder + (f"_{suffix}" if suffix > 1 else "")):
+            suffix += 1
+        if suffix > 1:
+            rollback_folder = f"{rollback_folder}_{suffix}"
+        moves = []
+        applied = []
+        replaced = []
+        for name in self.stat_cache.subdirs(update_folder):
+            staged_path = os.path.join(update_folder, name)
+            mod_id = next((mid for mid in staged_info if mid in name), "")
+            if not mod_id:
+                mod_id = self.read_server_data(staged_path).get('id', '')
+            existing_path = self.find_existing_mod_path(target_folder, mod_id) if mod_id else ""
+            final_path = os.path.join(target_folder, name)
+            if existing_path:
+                moves.append((existing_path, os.path.join(rollback_folder, os.path.basename(existing_path))))
+                replaced.append(os.path.basename(existing_path))
+            elif os.path.exists(final_path):
+                moves.append((final_path, os.path.join(rollback_folder, name)))
+                replaced.append(name)
+            moves.append((staged_path, final_path))
+            applied.append(name)
+
+        target_info_path = os.path.join(target_folder, 'mod_info.json')
+        if os.path.isfile(staged_info_path):
+            if os.path.isfile(target_info_path):
+                moves.append((target_info_path, os.path.join(rollback_folder, 'mod_info.json')))
+            moves.append((staged_info_path, target_info_path))
+
+        if moves:
+            os.makedirs(rollback_folder, exist_ok=True)
+        done = []
+        try:
+            for src, dst in moves:
+                os.rename(src, dst)
+                done.append((src, dst))
+        except OSError:
+            for src, dst in reversed(done):
+                os.rename(dst, src)
+            raise
+        finally:
+            self.clear_listing_cache()
+
+        if moves:
+            with open(os.path.join(rollback_folder, APPLY_LOG_FILE_NAME), 'w', encoding='utf-8') as f:
+                json.dump({'moves': done}, f, ensure_ascii=False, indent=4)
+        if not os.listdir(update_folder):
+            os.rmdir(update_folder)
+
+        return {
+            'applied': applied,
+            'replaced': replaced,
+            'rollback_folder': rollback_folder if moves else ""
+        }
+
+    def rollback_last_apply(self, target_folder: str) -> Dict[str, Any]:
+        """撤销最近一次应用更新：按相反顺序还原重命名操作"""
+        rollback_root = os.path.join(target_folder, ROLLBACK_FOLDER_NAME)
+        candidates = sorted(
+            name for name in (os.listdir(rollback_root) if os.path.isdir(rollback_root) else [])
+            if os.path.isfile(os.path.join(rollback_root, name, APPLY_LOG_FILE_NAME))
+        )
+        if not candidates:
+            raise ValueError("没有可回滚的更新")
+
+        rollback_folder = os.path.join(rollback_root, candidates[-1])
+        apply_log_path = os.path.join(rollback_folder, APPLY_LOG_FILE_NAME)
+        with open(apply_log_path, 'r', encoding='utf-8') as f:
+            moves = json.load(f)['moves']
+
+        restored = []
+        for src, dst in reversed(moves):
+            os.makedirs(os.path.dirname(src), exist_ok=True)
+            os.rename(dst, src)
+            restored.append(os.path.basename(src))
+        os.remove(apply_log_path)
+        if not os.listdir(rollback_folder):
+            os.rmdir(rollback_folder)
+        self.clear_listing_cache()
+
+        return {'restored': restored, 'rollback_folder': rollback_folder}
+
+    def push_staged_updates(self, target_folder: str, host: str, port: int = DEFAULT_DELTA_PORT,
+                            cancel_token: CancelToken = None, token: str = '') -> Dict[str, Any]:
+        """
+        通过增量传输协议把 mods_update/ 推送到远程服务器主机上的接收端
+        只有接收端已有文件中不存在的数据块会被发送，token 为接收端启动时显示的令牌
+        """
+        update_folder = os.path.join(target_folder, UPDATE_FOLDER_NAME)
+        if not os.path.isdir(update_folder):
+            raise ValueError(f"未找到暂存的更新文件夹: {update_folder}")
+        return DeltaSender(self, host, port, cancel_token=cancel_token, token=token).push_folder(update_folder)
+
+    def start_delta_receiver(self, root_folder: str, allow_lan: bool = False,
+                             port: int = DEFAULT_DELTA_PORT, token: str = None) -> DeltaReceiver:
+        """
+        在服务器主机上启动增量传输接收端，收到的模组暂存到 root_folder/mods_update/
+        默认只监听 127.0.0.1，allow_lan=True 时才监听所有网卡；令牌见返回对象的 token 属性
+        """
+        host = '0.0.0.0' if allow_lan else '127.0.0.1'
+        receiver = DeltaReceiver(self, root_folder, host=host, port=port, staging_folder_name=UPDATE_FOLDER_NAME,
+                                 token=token)
+        receiver.start()
+        return receiver
+
+    def build_patch_packs(self, json_content: str, source_folder: str, target_folder: str,
+                          output_folder: str, cancel_token: CancelToken = None) -> Dict[str, Any]:
+        """
+        补丁包输出模式（与智能更新使用相同的版本比较规则）
+        为目标中已安装且版本不同的模组生成从已安装版本到源版本的补丁包；
+        目标中未安装的模组无法生成补丁，列入 full_copy 由智能更新完整复制
+        """
+        try:
+            config = json.loads(json_content)
+        except Exception as e:
+            raise ValueError(f"解析JSON内容时出错: {e}")
+
+        if 'game' not in config or 'mods' not in config['game']:
+            raise ValueError("JSON文件格式不正确")
+
+        cancel_token = cancel_token or CancelToken()
+        packs = []
+        full_copy = []
+        failed = []
+        skipped_mods_count = 0
+        for mod in config['game']['mods']:
+            cancel_token.checkpoint()
+            mod_id = mod.get('modId', '')
+            mod_source_path = self.find_mod_folder(source_folder, mod_id)
+            if not mod_source_path:
+                continue
+            mod_target_path = self.find_existing_mod_path(target_folder, mod_id)
+            if not mod_target_path:
+                full_copy.append(mod_id)
+                continue
+            needs_update, reason, _, _ = self.check_mod_needs_update(mod_source_path, mod_target_path, mod_id,
+                                                                     cancel_token)
+            if not needs_update or not ("版本不同" in reason or "内容不同" in reason):
+                skipped_mods_count += 1
+                continue
+
+            parsed_info = self.parse_mod_info(mod_source_path, mod_id)
+            standardized_name = self.generate_mod_folder_name(
+                os.path.basename(mod_source_path), parsed_info.get('version', '未知')
+            )
+            try:
+                packs.append(create_patch_pack(
+                    self, mod_id, mod_target_path, mod_source_path, standardized_name, output_folder,
+                    cancel_token=cancel_token
+                ))
+            except OperationCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"生成模组 {mod_id} 的补丁包时出错: {e}", extra=log_fields(mod_id=mod_id, phase='patch_pack'))
+                failed.append({'mod_id': mod_id, 'error': str(e)})
+
+        self.save_caches()
+        return {
+            'packs': packs,
+            'full_copy': full_copy,
+            'failed': failed,
             'skipped_mods': skipped_mods_count,
-            'update_folder': update_folder,
-            'mod_info': mod_info
+            'output_folder': output_folder
         }
-    
+
+    def apply_patch_pack(self, pack_path: str, target_folder: str, cancel_token: CancelToken = None) -> Dict[str, Any]:
+        """
+        应用补丁包：检查已安装的旧版本，流式重建并校验新版本，暂存到 mods_update/
+        同时更新暂存的 mod_info.json，之后用 apply_staged_updates 安装
+        """
+        update_folder = os.path.join(target_folder, UPDATE_FOLDER_NAME)
+        os.makedirs(update_folder, exist_ok=True)
+        result = apply_patch_pack(self, pack_path, target_folder, update_folder, cancel_token=cancel_token)
+
+        # 在暂存区已有的（或目标中现有的）模组信息基础上更新该模组
+        mod_info = {}
+        for info_folder in (update_folder, target_folder):
+            info_path = os.path.join(info_folder, 'mod_info.json')
+            if os.path.isfile(info_path):
+                with open(info_path, 'r', encoding='utf-8') as f:
+                    mod_info = json.load(f)
+                break
+        mod_info[result['mod_id']] = self.parse_mod_info(result['staged_path'], result['mod_id'])
+        self.save_mod_info_json(mod_info, update_folder)
+        self.save_caches()
+        return result
+
+    def version_sort_key(self, version: str) -> Tuple:
+        """版本号排序键：数字段按数值比较，其余按字符串比较"""
+        return tuple(
+            (0, int(part), '') if part.isdigit() else (1, 0, part)
+            for part in re.split(r'[._\-]', version or '') if part
+        )
+
+    def build_target_index(self, target_folder: str) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        构建目标文件夹索引: {mod_id: [版本条目, ...]}，每个模组的条目按版本从新到旧排列
+        mod_id 取自 ServerData.json 的 id 字段，缺失时取文件夹名中的 16 位十六进制 ID
+        """
+        index = {}
+        for name in self.stat_cache.subdirs(target_folder):
+            mod_path = os.path.join(target_folder, name)
+            if name in TOOL_FOLDER_NAMES:
+                continue
+            server_data = self.read_server_data(mod_path)
+            mod_id = server_data.get('id', '')
+            if not mod_id:
+                match = re.search(r'[0-9A-F]{16}', name)
+                mod_id = match.group(0) if match else ""
+            if not mod_id:
+                continue
+            index.setdefault(mod_id, []).append({
+                'name': name,
+                'path': mod_path,
+                'version': server_data.get('revision', {}).get('version', ''),
+                'mtime': os.path.getmtime(mod_path)
+            })
+        for entries in index.values():
+            entries.sort(key=lambda e: (self.version_sort_key(e['version']), e['mtime']), reverse=True)
+        return index
+
+    def collect_garbage(self, target_folder: str, server_configs: Dict[str, List[Dict[str, Any]]] = None,
+                        configs_complete: bool = False, keep_versions: int = 0, dry_run: bool = True,
+                        max_workers: int = None, cancel_token: CancelToken = None) -> Dict[str, Any]:
+        """
+        清理目标文件夹中过期的模组版本
+        - 同一模组的多个版本只保留最新版本和 keep_versions 个旧版本
+        - server_configs 为已加载的服务器配置 {配置名: 模组列表}；只有用户确认这些就是使用该目标文件夹的全部配置
+          （configs_complete=True）时，未被其中任何配置引用（也不是被引用模组的依赖）的模组才全部删除，
+          否则不按引用清理（unreferenced_skipped 为 True）
+        dry_run=True 时只报告，不删除
+        返回: 删除列表和回收的字节数
+        """
+        cancel_token = cancel_token or CancelToken()
+        index = self.build_target_index(target_folder)
+        referenced_mod_ids = None
+        unreferenced_skipped = False
+        if server_configs:
+            if configs_complete:
+                configured = [mod.get('modId', '') for mods in server_configs.values() for mod in mods]
+                # 配置中模组的依赖（含间接依赖，按目标中已安装的最新版本声明的依赖求闭包）同样被引用
+                graph = DependencyGraph({
+                    mod_id: build_metadata_record(mod_id, self.read_server_data(entries[0]['path']), 0)
+                    for mod_id, entries in index.items()
+                })
+                referenced_mod_ids = set(graph.closure(configured))
+            else:
+                unreferenced_skipped = True
+        candidates = []
+        for mod_id, entries in index.items():
+            if referenced_mod_ids is not None and mod_id not in referenced_mod_ids:
+                candidates.extend((mod_id, entry, "未被服务器配置引用") for entry in entries)
+            else:
+                candidates.extend((mod_id, entry, "已被新版本取代") for entry in entries[1 + keep_versions:])
+
+        def remove(candidate):
+            cancel_token.checkpoint()
+            mod_id, entry, reason = candidate
+            size = self.get_folder_size(entry['path'])
+            error = ""
+            if not dry_run:
+                try:
+                    shutil.rmtree(entry['path'])
+                except OSError as e:
+                    error = str(e)
+            return {'mod_id': mod_id, 'name': entry['name'], 'version': entry['version'],
+                    'reason': reason, 'size': size, 'error': error}
+
+        with ThreadPoolExecutor(max_workers=max_workers, initializer=self.io_throttle.apply_priority) as executor:
+            removed = list(executor.map(remove, candidates))
+        if not dry_run:
+            self.clear_listing_cache()
+
+        return {
+            'removed': removed,
+            'reclaimed_bytes': sum(item['size'] for item in removed if not item['error']),
+            'indexed_mods': len(index),
+            'unreferenced_skipped': unreferenced_skipped,
+            'dry_run': dry_run
+        }
+
+    def scan_mods_metadata(self, mods: List[Dict[str, Any]], source_folder: str,
+                           cancel_token: CancelToken = None) -> Dict[str, Dict[str, Any]]:
+        """
+        批量读取配置中各模组在源中的元数据（普通目录中的模组分散到进程池并行解析，
+        树指纹与上次相同的模组直接使用元数据缓存）
+        返回: {mod_id: {'id', 'name', 'version', 'dependencies', 'size', 'path'}}，源中找不到的模组不在结果中
+        """
+        cancel_token = cancel_token or CancelToken()
+        directory_mods = {}
+        records = {}
+        for mod in mods:
+            mod_id = mod.get('modId', '')
+            if not mod_id or mod_id in records or mod_id in directory_mods:
+                continue
+            mod_path = self.find_mod_folder(source_folder, mod_id)
+            if not mod_path:
+                continue
+            archive, folder, _ = self.split_archive_path(mod_path)
+            if archive is not None:
+                try:
+                    with self.open_source_text(os.path.join(mod_path, 'ServerData.json')) as f:
+                        server_data = json.load(f)
+                except (OSError, ValueError):
+                    server_data = None
+                record = build_metadata_record(mod_id, server_data, archive.mod_size(folder))
+                records[mod_id] = dict(record, path=mod_path)
+            else:
+                directory_mods[mod_id] = mod_path
+        cancel_token.checkpoint()
+
+        # 树指纹（经由状态缓存，一次并发扫描）未变化的模组直接使用缓存的记录，其余模组重新解析；
+        # ServerData.json 可能被原地改写（目录 mtime 不变），因此另外直接 stat 一次
+        def server_data_stat(mod_path):
+            try:
+                st = os.stat(os.path.join(mod_path, 'ServerData.json'))
+                return f"{st.st_size}:{st.st_mtime_ns}"
+            except OSError:
+                return "-"
+
+        fingerprints = {}
+        sizes = {}
+        with ThreadPoolExecutor(max_workers=self.stat_cache.max_workers) as executor:
+            server_data_stats = dict(zip(directory_mods, executor.map(server_data_stat, directory_mods.values())))
+        with self.stat_cache.snapshot(directory_mods.values(), checkpoint=cancel_token.checkpoint):
+            for mod_id, mod_path in directory_mods.items():
+                fingerprint = self.get_tree_fingerprint(mod_path, cancel_token)
+                sizes[mod_id] = fingerprint.size
+                fingerprints[mod_id] = (f"{fingerprint.files}:{fingerprint.size}:{fingerprint.hexdigest}:"
+                                        f"{server_data_stats[mod_id]}")
+                cached = self.metadata_cache.lookup(mod_id, mod_path, fingerprints[mod_id])
+                if cached is not None:
+                    records[mod_id] = cached
+        # 总大小直接取自树指纹，扫描进程只解析 ServerData.json
+        changed = {mod_id: (mod_path, sizes[mod_id]) for mod_id, mod_path in directory_mods.items()
+                   if mod_id not in records}
+        # 扫描进程不继承父进程中已降低的线程优先级，由 initializer 在低优先级模式下降低
+        scanned = self.metadata_scanner.scan(changed, initializer=self.io_throttle.process_initializer)
+        for mod_id, record in scanned.items():
+            self.metadata_cache.remember(record['path'], fingerprints[mod_id], record)
+            records[mod_id] = record
+        self.metadata_cache.save()
+        return records
+
+    def resolve_dependencies(self, mods: List[Dict[str, Any]], source_folder: str,
+                             metadata: Dict[str, Dict[str, Any]], cancel_token: CancelToken = None) -> Dict[str, Any]:
+        """
+        求配置中模组在源中的依赖传递闭包：依赖图按源文件夹在多次调用间复用，
+        闭包中的依赖逐层从源中重新读取元数据（有元数据缓存，未变化的模组不再解析），直到闭包不再扩大
+        metadata 为 scan_mods_metadata 的结果，配置之外、源中存在的依赖会加入其中
+        返回: {'graph': 依赖图, 'added': [加入的依赖模组 ID], 'problems': 缺失或版本不一致的依赖}
+        """
+        cancel_token = cancel_token or CancelToken()
+        graph = self._dependency_graphs.setdefault(os.path.abspath(source_folder), DependencyGraph())
+        graph.add_records(metadata)
+        roots = [mod_id for mod_id in (mod.get('modId', '') for mod in mods) if mod_id in metadata]
+        configured = {mod.get('modId', '') for mod in mods}
+        scanned = set(metadata)
+        added = []
+        while True:
+            cancel_token.checkpoint()
+            frontier = [mod_id for mod_id in graph.closure(roots) if mod_id not in scanned]
+            if not frontier:
+                break
+            scanned.update(frontier)
+            records = self.scan_mods_metadata([{'modId': mod_id} for mod_id in frontier], source_folder, cancel_token)
+            for mod_id in frontier:
+                if mod_id in records:
+                    graph.add_records({mod_id: records[mod_id]})
+                    if mod_id not in configured:
+                        metadata[mod_id] = records[mod_id]
+                        added.append(mod_id)
+                else:
+                    # 源中已不存在的模组不能沿用之前的记录
+                    graph.records.pop(mod_id, None)
+        return {'graph': graph, 'added': added, 'problems': graph.check(roots)}
+
+    @staticmethod
+    def dependency_copy_order(graph: DependencyGraph, jobs: Dict[str, str]) -> Dict[str, List[str]]:
+        """
+        把模组之间的依赖转换为复制任务之间的依赖
+        jobs 为 {mod_id: 目标模组路径}；返回 run_copy_jobs 的 dependencies 参数
+        """
+        edges = graph.ordering_edges(jobs)
+        return {jobs[mod_id]: [jobs[dep_id] for dep_id in dep_ids] for mod_id, dep_ids in edges.items() if dep_ids}
+
+    def planning_snapshot(self, records: Dict[str, Dict[str, Any]], target_folders: List[str],
+                          cancel_token: CancelToken = None):
+        """
+        规划阶段的目录快照（with 语句使用）：并发扫描源中各模组和目标中已存在的对应模组，
+        规划期间对这些目录的查询直接使用快照，不再逐个往返网络共享
+        records 为 scan_mods_metadata 的结果
+        """
+        roots = [record['path'] for record in records.values() if self.split_archive_path(record['path'])[0] is None]
+        for target_folder in target_folders:
+            names = self.stat_cache.subdirs(target_folder)
+            for mod_id in records:
+                name = next((name for name in names if mod_id in name), "")
+                if name:
+                    roots.append(os.path.join(target_folder, name))
+        return self.stat_cache.snapshot(roots, shallow=target_folders,
+                                        checkpoint=cancel_token.checkpoint if cancel_token else None)
+
     def parse_mod_info(self, mod_source_path: str, mod_id: str) -> Dict[str, str]:
         """解析模组信息"""
         try:
             server_data_path = os.path.join(mod_source_path, 'ServerData.json')
-            if os.path.isfile(server_data_path):
-                with open(server_data_path, 'r', encoding='utf-8-sig') as server_file:
+            if self.is_source_file(server_data_path):
+                with self.open_source_text(server_data_path) as server_file:
                     server_data = json.load(server_file)
                     # 修复：优先读取name字段，如果没有则使用id字段作为名称
                     mod_name = server_data.get('name', server_data.get('id', mod_id))
                     mod_version = server_data.get('revision', {}).get('version', '')
                     return {'name': mod_name, 'version': mod_version}
         except Exception as e:
-            print(f"解析模组信息时出错: {e}")
+            logger.error(f"解析模组信息时出错: {e}", extra=log_fields(mod_id=mod_id, phase='metadata'))
         
         return {'name': mod_id, 'version': '未知'}
     
-    def copy_mod_folder(self, source_path: str, target_path: str) -> bool:
-        """复制模组文件夹"""
+    def copy_mod_folder(self, source_path: str, target_path: str, verify: bool = False,
+                        journal: TransferJournal = None, cancel_token: CancelToken = None) -> bool:
+        """
+        复制模组文件夹
+        verify=True 时边复制边计算哈希并校验，写入清单；
+        传入 journal 时逐文件记录进度，中断后可从上次完成的文件继续
+        """
         try:
-            shutil.copytree(source_path, target_path, dirs_exist_ok=True)
+            if verify or journal is not None or self.io_throttle.enabled or self.split_archive_path(source_path)[0]:
+                self.copy_mod_folder_files(source_path, target_path, verify=verify, journal=journal,
+                                           cancel_token=cancel_token)
+            else:
+                shutil.copytree(source_path, target_path, dirs_exist_ok=True,
+                                copy_function=lambda src, dst: self.copy_file(src, dst, cancel_token))
+                # 原地覆盖已有文件不会改变目录 mtime，主动清除状态缓存
+                self.stat_cache.invalidate(target_path)
             return True
+        except OperationCancelled:
+            raise
         except Exception as e:
-            print(f"复制模组文件夹时出错: {e}")
+            logger.error(f"复制模组文件夹时出错: {e}", extra=log_fields(phase='copy', path=source_path))
             return False
+
+    def hash_file(self, file_path: str) -> str:
+        """计算单个文件的哈希值（普通文件或压缩包中的文件）"""
+        digest = hashlib.new(HASH_ALGORITHM)
+        buffer = bytearray(COPY_CHUNK_SIZE)
+        view = memoryview(buffer)
+        with self.open_source_file(file_path) as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                self.io_throttle.throttle(n)
+                digest.update(view[:n])
+        return digest.hexdigest()
+
+    def copy_file(self, source_file: str, target_file: str, cancel_token: CancelToken = None) -> str:
+        """
+        复制单个文件（含元数据），使用 self.copy_backend 指定的复制后端
+        启用限速时按块限速；返回目标文件路径（兼容 shutil.copytree 的 copy_function）
+        """
+        if cancel_token is not None:
+            cancel_token.checkpoint()
+        throttle = (lambda n: self.io_throttle.throttle(n, ops=2)) if self.io_throttle.enabled else None
+        copy_file_data(source_file, target_file, backend=self.copy_backend, throttle=throttle)
+        shutil.copystat(source_file, target_file)
+        return target_file
+
+    def copy_file_verified(self, source_file: str, target_file: str) -> Tuple[int, str]:
+        """
+        复制单个文件：源文件只读取一次，读取的数据同时用于写入和计算哈希；
+        写入完成后回读目标文件校验哈希
+        返回: (文件大小, 哈希值)
+        """
+        digest = hashlib.new(HASH_ALGORITHM)
+        buffer = bytearray(COPY_CHUNK_SIZE)
+        view = memoryview(buffer)
+        size = 0
+        with open(source_file, 'rb') as fsrc, open(target_file, 'wb') as fdst:
+            while True:
+                n = fsrc.readinto(buffer)
+                if not n:
+                    break
+                self.io_throttle.throttle(n, ops=2)
+                digest.update(view[:n])
+                fdst.write(view[:n])
+                size += n
+        shutil.copystat(source_file, target_file)
+
+        expected = digest.hexdigest()
+        written_size = os.path.getsize(target_file)
+        if written_size != size:
+            raise IOError(f"写入大小不一致: {target_file} (期望 {size}, 实际 {written_size})")
+        if self.hash_file(target_file) != expected:
+            raise IOError(f"写入内容校验失败: {target_file}")
+        return size, expected
+
+    def copy_archive_file(self, archive: ArchiveModSource, folder: str, rel_path: str, target_file: str,
+                          verify: bool = False) -> Tuple[int, str]:
+        """
+        从压缩包中流式解压单个文件（zipfile 在读取结束时校验 CRC），并设置修改时间
+        verify=True 时同时计算哈希，写入后回读目标文件校验
+        返回: (文件大小, 哈希值)，未校验时哈希为空字符串
+        """
+        digest = hashlib.new(HASH_ALGORITHM) if verify else None
+        size = 0
+        with archive.open(folder, rel_path) as fsrc, open(target_file, 'wb') as fdst:
+            while True:
+                chunk = fsrc.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.io_throttle.throttle(len(chunk), ops=2)
+                if digest is not None:
+                    digest.update(chunk)
+                fdst.write(chunk)
+                size += len(chunk)
+        mtime_ns = zip_mtime_ns(archive.mods[folder][rel_path])
+        os.utime(target_file, ns=(mtime_ns, mtime_ns))
+
+        if digest is None:
+            return size, ""
+        expected = digest.hexdigest()
+        if self.hash_file(target_file) != expected:
+            raise IOError(f"写入内容校验失败: {target_file}")
+        return size, expected
+
+    def list_mod_files(self, source_path: str, cancel_token: CancelToken = None) -> Dict[str, List[int]]:
+        """
+        列出模组文件夹中的所有文件: {相对路径(以/分隔): [大小, mtime_ns]}
+        目录结构来自状态缓存，各文件重新 stat（原地改写的文件不改变目录 mtime，缓存中的状态可能已过期）
+        """
+        archive, folder, _ = self.split_archive_path(source_path)
+        if archive is not None:
+            files = archive.list_files(folder)
+            files.pop(MANIFEST_FILE_NAME, None)
+            return files
+        return self.stat_cache.walk_files(source_path, (MANIFEST_FILE_NAME,),
+                                          checkpoint=cancel_token.checkpoint if cancel_token else None, restat=True)
+
+    def estimate_copy_bytes(self, source_path: str, target_path: str, journal: TransferJournal = None,
+                            cancel_token: CancelToken = None) -> int:
+        """
+        估算复制一个模组需要占用的新空间：要写入的文件大小之和，减去被替换的同名目标文件
+        （传输日志中已完成的文件不计）；至少为最大文件的大小，因为写入时临时文件与旧文件同时存在
+        """
+        files = self.list_mod_files(source_path, cancel_token)
+        existing = self.list_mod_files(target_path, cancel_token) if os.path.isdir(target_path) else {}
+        written = replaced = largest = 0
+        for rel_path, (size, _) in files.items():
+            old = existing.get(rel_path)
+            if journal is not None and journal.is_file_done(target_path, rel_path) and old and old[0] == size:
+                continue
+            written += size
+            largest = max(largest, size)
+            if old:
+                replaced += old[0]
+        return max(written - replaced, largest)
+
+    def check_copy_space(self, jobs: List[Tuple[str, str]], journal: TransferJournal = None,
+                         cancel_token: CancelToken = None) -> List[Dict[str, Any]]:
+        """
+        复制前的磁盘空间预检，jobs 为 [(源模组路径, 目标模组路径), ...]（同一目标只计一次）
+        返回空间不足的文件系统列表（见 disk_space.check_space），为空表示空间足够
+        """
+        requirements = {}
+        for source_path, target_path in jobs:
+            if target_path not in requirements:
+                requirements[target_path] = self.estimate_copy_bytes(source_path, target_path, journal, cancel_token)
+        return [entry for entry in check_space(requirements) if not entry['ok']]
+
+    def copy_mod_folder_files(self, source_path: str, target_path: str, verify: bool = False,
+                              journal: TransferJournal = None, cancel_token: CancelToken = None) -> None:
+        """
+        逐文件复制模组文件夹
+        每个文件先写入临时文件再重命名，保证目标中不会出现写了一半的最终文件；
+        verify=True 时校验每个文件并在目标模组文件夹中写入清单
+        低优先级模式下在常驻的低优先级线程中复制（调用线程可能是长期存在的任务线程，其优先级不应被永久降低）
+        """
+        self.io_throttle.call(self._copy_mod_folder_files, source_path, target_path, verify, journal, cancel_token)
+
+    def _copy_mod_folder_files(self, source_path: str, target_path: str, verify: bool,
+                               journal: TransferJournal = None, cancel_token: CancelToken = None) -> None:
+        files = self.plan_mod_copy(source_path, target_path, journal, cancel_token)
+        manifest_files = {}
+        for rel_path, (size, mtime_ns) in files.items():
+            manifest_files[rel_path], _ = self.copy_mod_file(source_path, target_path, rel_path, size, verify,
+                                                             journal, cancel_token)
+        self.finish_mod_copy(target_path, manifest_files, verify, journal)
+
+    def plan_mod_copy(self, source_path: str, target_path: str, journal: TransferJournal = None,
+                      cancel_token: CancelToken = None) -> Dict[str, List[int]]:
+        """列出模组需要复制的文件，并写入传输日志的计划记录"""
+        files = self.list_mod_files(source_path, cancel_token)
+        os.makedirs(target_path, exist_ok=True)
+        if journal is not None:
+            journal.plan_mod(target_path, source_path, files)
+        return files
+
+    def copy_mod_file(self, source_path: str, target_path: str, rel_path: str, size: int,
+                      verify: bool = False, journal: TransferJournal = None,
+                      cancel_token: CancelToken = None) -> Tuple[Dict[str, Any], int]:
+        """
+        复制模组中的单个文件（临时文件 + 重命名）
+        返回: (清单条目（未校验时为空字典）, 本次实际写入的字节数（按传输日志跳过的文件为 0）)
+        """
+        if cancel_token is not None:
+            cancel_token.checkpoint()
+        source_file = os.path.join(source_path, *rel_path.split('/'))
+        target_file = os.path.join(target_path, *rel_path.split('/'))
+
+        # 上次运行已完成且目标文件完好的文件直接跳过
+        if (journal is not None and journal.is_file_done(target_path, rel_path)
+                and os.path.isfile(target_file) and os.path.getsize(target_file) == size):
+            if not verify:
+                return {}, 0
+            file_hash = journal.get_file_hash(target_path, rel_path) or self.hash_file(target_file)
+            return {'size': size, HASH_ALGORITHM: file_hash}, 0
+
+        os.makedirs(os.path.dirname(target_file), exist_ok=True)
+        partial_file = target_file + PARTIAL_FILE_SUFFIX
+        entry = {}
+        file_hash = ""
+        archive, folder, _ = self.split_archive_path(source_path)
+        if archive is not None:
+            size, file_hash = self.copy_archive_file(archive, folder, rel_path, partial_file, verify)
+            entry = {'size': size, HASH_ALGORITHM: file_hash} if verify else {}
+        elif verify:
+            size, file_hash = self.copy_file_verified(source_file, partial_file)
+            entry = {'size': size, HASH_ALGORITHM: file_hash}
+        else:
+            self.copy_file(source_file, partial_file)
+        os.replace(partial_file, target_file)
+        if file_hash:
+            # 校验复制时已得到目标文件哈希，直接写入哈希缓存
+            self.content_hasher.remember(target_file, file_hash)
+
+        if journal is not None:
+            journal.file_done(target_path, rel_path, file_hash)
+        return entry, size
+
+    def finish_mod_copy(self, target_path: str, manifest_files: Dict[str, Dict[str, Any]],
+                        verify: bool = False, journal: TransferJournal = None) -> None:
+        """模组全部文件复制完成后写入清单并记录日志"""
+        if verify:
+            self.write_manifest(target_path, manifest_files)
+        if journal is not None:
+            journal.mod_done(target_path)
+
+    def run_copy_jobs(self, jobs: List[Tuple[str, str]], verify: bool = False, journal: TransferJournal = None,
+                      max_workers: int = DEFAULT_COPY_WORKERS, order: str = 'largest',
+                      progress_callback=None, mod_callback=None,
+                      dependencies: Dict[str, List[str]] = None, cancel_token: CancelToken = None) -> Dict[str, Any]:
+        """
+        按大小调度并行复制多个模组
+        jobs 为 [(源模组路径, 目标模组路径), ...]；order='largest' 时大任务优先，'smallest' 时小任务优先；
+        dependencies 为 {目标模组路径: [需要先复制完成的目标模组路径, ...]}（见 dependency_copy_order）
+        返回: 每个目标路径的复制结果与各工作线程的空闲时间报告
+        """
+        scheduler = CopyScheduler(self, max_workers=max_workers, order=order)
+        return scheduler.run(jobs, verify=verify, journal=journal, progress_callback=progress_callback,
+                             mod_callback=mod_callback, dependencies=dependencies, cancel_token=cancel_token)
+
+    def open_copy_journal(self, target_folder: str) -> TransferJournal:
+        """打开复制模组使用的传输日志（存在未完成记录时可继续）"""
+        return TransferJournal(os.path.join(target_folder, COPY_JOURNAL_FILE_NAME))
+
+    def cleanup_cancelled_copy(self, journal: TransferJournal, remove_incomplete: bool = False) -> List[str]:
+        """
+        取消复制后清理未完成的模组：删除其中的临时文件；
+        remove_incomplete=True 时（例如暂存文件夹中的模组）直接删除整个未完成的模组文件夹
+        返回: 被清理的模组路径列表
+        """
+        cleaned = []
+        for pending_path in journal.pending_targets():
+            if not os.path.isdir(pending_path):
+                continue
+            if remove_incomplete:
+                shutil.rmtree(pending_path, ignore_errors=True)
+            else:
+                for dirpath, dirnames, filenames in os.walk(pending_path):
+                    for filename in filenames:
+                        if filename.endswith(PARTIAL_FILE_SUFFIX):
+                            os.remove(os.path.join(dirpath, filename))
+            cleaned.append(pending_path)
+        return cleaned
+
+    def write_manifest(self, mod_path: str, files: Dict[str, Dict[str, Any]]) -> str:
+        """写入模组清单文件"""
+        manifest_path = os.path.join(mod_path, MANIFEST_FILE_NAME)
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({'algorithm': HASH_ALGORITHM, 'files': files}, f, ensure_ascii=False, indent=4)
+        return manifest_path
+
+    def read_manifest(self, mod_path: str) -> Dict[str, Any]:
+        """读取模组清单文件，不存在或无法解析时返回空字典"""
+        manifest_path = os.path.join(mod_path, MANIFEST_FILE_NAME)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def verify_target_tree(self, target_folder: str, max_workers: int = None,
+                           cancel_token: CancelToken = None) -> Dict[str, Any]:
+        """
+        按清单并行校验目标文件夹中的所有模组
+        返回: 已校验模组数、已校验文件数、失败列表和缺少清单的模组列表
+        """
+        cancel_token = cancel_token or CancelToken()
+        tasks = []
+        missing_manifest = []
+        checked_mods = 0
+        for name in self.stat_cache.subdirs(target_folder):
+            if name in TOOL_FOLDER_NAMES:
+                continue
+            mod_path = os.path.join(target_folder, name)
+            manifest = self.read_manifest(mod_path)
+            if not manifest.get('files'):
+                missing_manifest.append(name)
+                continue
+            checked_mods += 1
+            for rel_path, entry in manifest['files'].items():
+                tasks.append((name, mod_path, rel_path, entry))
+
+        def check(task):
+            cancel_token.checkpoint()
+            name, mod_path, rel_path, entry = task
+            file_path = os.path.join(mod_path, *rel_path.split('/'))
+            try:
+                if os.path.getsize(file_path) != entry.get('size'):
+                    return {'mod': name, 'file': rel_path, 'reason': "大小不一致"}
+                if self.hash_file(file_path) != entry.get(HASH_ALGORITHM):
+                    return {'mod': name, 'file': rel_path, 'reason': "哈希不一致"}
+            except OSError as e:
+                return {'mod': name, 'file': rel_path, 'reason': f"无法读取: {e}"}
+            return None
+
+        with ThreadPoolExecutor(max_workers=max_workers, initializer=self.io_throttle.apply_priority) as executor:
+            failures = [result for result in executor.map(check, tasks) if result]
+
+        return {
+            'checked_mods': checked_mods,
+            'checked_files': len(tasks),
+            'failed': failures,
+            'missing_manifest': missing_manifest
+        }
     
-    def save_mod_info_json(self, mod_info: Dict[str, Any], target_folder: str) -> str:
-        """保存模组信息到JSON文件"""
+    def sync_to_targets(self, json_content: str, source_folder: str, target_folders: List[str],
+                        verify: bool = False, max_workers: int = DEFAULT_COPY_WORKERS,
+                        progress_callback=None, cancel_token: CancelToken = None) -> Dict[str, Any]:
+        """
+        把配置中的模组同步到多个目标文件夹
+        每个需要复制的源文件只读取一次，同时写入各目标；同一文件系统上的目标之间使用硬链接。
+        每个目标各自判断是否需要更新，并各自生成 mod_info.json
+        返回: 每个目标的统计（新增/更新/跳过/失败、mod_info.json 路径）以及读取与写入的字节数
+        """
+        try:
+            config = json.loads(json_content)
+        except Exception as e:
+            raise ValueError(f"解析JSON内容时出错: {e}")
+
+        if 'game' not in config or 'mods' not in config['game']:
+            raise ValueError("JSON文件格式不正确")
+        if not target_folders:
+            raise ValueError("未指定目标文件夹")
+
+        self.clear_listing_cache()
+        syncer = FanoutSync(self, max_workers=max_workers, hash_algorithm=HASH_ALGORITHM, cancel_token=cancel_token)
+        return syncer.run(config['game']['mods'], source_folder, target_folders,
+                          verify=verify, progress_callback=progress_callback)
+
+    def export_mod_info(self, json_content: str, source_folder: str, cancel_token: CancelToken = None) -> Dict[str, Any]:
+        """
+        仅导出模组信息：读取配置中各模组在源中的元数据并生成 mod_info.json
+        （保存在源文件夹中，源为压缩包时保存在压缩包所在的文件夹）
+        返回: {'total_mods', 'found_mods', 'mod_info_path'}
+        """
+        try:
+            config = json.loads(json_content)
+        except Exception as e:
+            raise ValueError(f"解析JSON内容时出错: {e}")
+
+        if 'game' not in config or 'mods' not in config['game']:
+            raise ValueError("JSON文件格式不正确")
+
+        mods = config['game']['mods']
+        self.clear_listing_cache()
+        metadata = self.scan_mods_metadata(mods, source_folder, cancel_token)
+        mod_info = {mod_id: mod_info_entry(record) for mod_id, record in metadata.items()}
+        mod_info_path = ""
+        if mod_info:
+            info_folder = os.path.dirname(source_folder) if os.path.isfile(source_folder) else source_folder
+            mod_info_path = self.save_mod_info_json(mod_info, info_folder)
+        return {'total_mods': len(mods), 'found_mods': len(mod_info), 'mod_info_path': mod_info_path}
+
+    def save_mod_info_json(self, mod_info: Dict[str, Any], target_folder: str, merge: bool = False,
+                           compact: bool = None, sort_keys: bool = None) -> str:
+        """
+        保存模组信息到JSON文件（先写临时文件再重命名，内容未变化时不重写）
+        merge=True 时合并到已有的 mod_info.json：只替换本次涉及的模组条目，保留其他模组；
+        compact / sort_keys 默认使用 mod_info_compact / mod_info_sort_keys（紧凑输出、按模组 ID 排序）
+        """
         try:
             mod_info_path = os.path.join(target_folder, 'mod_info.json')
-            with open(mod_info_path, 'w', encoding='utf-8') as f:
-                json.dump(mod_info, f, ensure_ascii=False, indent=4)
+            compact = self.mod_info_compact if compact is None else compact
+            sort_keys = self.mod_info_sort_keys if sort_keys is None else sort_keys
+            existing_text = None
+            if os.path.isfile(mod_info_path):
+                with open(mod_info_path, 'r', encoding='utf-8') as f:
+                    existing_text = f.read()
+            if merge and existing_text:
+                try:
+                    existing = json.loads(existing_text)
+                except ValueError:
+                    existing = None
+                if isinstance(existing, dict):
+                    existing.update(mod_info)
+                    mod_info = existing
+            if compact:
+                text = json.dumps(mod_info, ensure_ascii=False, separators=(',', ':'), sort_keys=sort_keys)
+            else:
+                text = json.dumps(mod_info, ensure_ascii=False, indent=4, sort_keys=sort_keys)
+            if text == existing_text:
+                return mod_info_path
+            temp_path = mod_info_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, mod_info_path)
             return mod_info_path
         except Exception as e:
-            print(f"保存模组信息文件时出错: {e}")
+            logger.error(f"保存模组信息文件时出错: {e}", extra=log_fields(phase='mod_info', path=target_folder))
             return ""
     
-    def process_mods_from_json(self, json_content: str, source_folder: str, target_folder: str) -> Dict[str, Any]:
+    def process_mods_from_json(self, json_content: str, source_folder: str, target_folder: str,
+                               cancel_token: CancelToken = None) -> Dict[str, Any]:
         """从JSON内容处理模组"""
         try:
             config = json.loads(json_content)
@@ -253,6 +1588,8 @@ class ModManager:
             raise ValueError("JSON文件格式不正确")
         
         mods = config['game']['mods']
+        cancel_token = cancel_token or CancelToken()
+        self.clear_listing_cache()
         total_mods = len(mods)
         found_and_copied = False
         mod_info = {}
@@ -263,54 +1600,41 @@ class ModManager:
         skipped_mods_count = 0
         new_mods_count = 0
         
+        metadata = self.scan_mods_metadata(mods, source_folder, cancel_token)
         for mod in mods:
+            cancel_token.checkpoint()
             mod_id = mod.get('modId', '')
-            if not mod_id:
+            record = metadata.pop(mod_id, None)
+            if not record:
                 continue
-                
-            for folder_name in os.listdir(source_folder):
-                if mod_id in folder_name:
-                    mod_source_path = os.path.join(source_folder, folder_name)
-                    if not os.path.isdir(mod_source_path):
-                        continue
-
-                    parsed = self.parse_mod_info(mod_source_path, mod_id)
-                    standardized_name = self.generate_mod_folder_name(os.path.basename(mod_source_path), parsed.get('version', '未知'))
 
-                    standardized_target_path = os.path.join(target_folder, standardized_name)
-                    existing_path = self.find_existing_mod_path(target_folder, mod_id)
+            mod_source_path = record['path']
+            parsed = mod_info_entry(record)
+            standardized_name = self.generate_mod_folder_name(os.path.basename(mod_source_path), parsed.get('version', '未知'))
 
-                    # 若存在旧命名目录且标准化目录不存在，则先重命名为标准化目录，避免重复目录
-                    if existing_path and existing_path != standardized_target_path and not os.path.exists(standardized_target_path):
-                        try:
-                            os.rename(existing_path, standardized_target_path)
-                            existing_path = standardized_target_path
-                        except Exception:
-                            # 如果重命名失败，继续后续逻辑，复制时将覆盖/合并到标准化目录
-                            pass
+            mod_target_path, standardized_target_path = self.standardize_target_mod_path(
+                target_folder, mod_id, standardized_name
+            )
+            existed_before = os.path.exists(mod_target_path)
 
-                    mod_target_path = standardized_target_path if os.path.exists(standardized_target_path) else (existing_path or standardized_target_path)
-                    existed_before = os.path.exists(mod_target_path)
+            # 检查是否需要更新
+            needs_update, reason, source_version, target_version = self.check_mod_needs_update(
+                mod_source_path, mod_target_path, mod_id, cancel_token
+            )
 
-                    # 检查是否需要更新
-                    needs_update, reason, source_version, target_version = self.check_mod_needs_update(
-                        mod_source_path, mod_target_path, mod_id
-                    )
-
-                    if needs_update:
-                        # 复制模组文件夹到目标文件夹（使用标准化名称）
-                        if self.copy_mod_folder(mod_source_path, standardized_target_path):
-                            if existed_before:
-                                updated_mods_count += 1
-                            else:
-                                new_mods_count += 1
-                            found_and_copied = True
+            if needs_update:
+                # 复制模组文件夹到目标文件夹（使用标准化名称）
+                if self.copy_mod_folder(mod_source_path, standardized_target_path, cancel_token=cancel_token):
+                    if existed_before:
+                        updated_mods_count += 1
                     else:
-                        skipped_mods_count += 1
+                        new_mods_count += 1
+                    found_and_copied = True
+            else:
+                skipped_mods_count += 1
 
-                    # 记录模组信息
-                    mod_info[mod_id] = parsed
-                    break
+            # 记录模组信息
+            mod_info[mod_id] = parsed
         
         return {
             'total_mods': total_mods_count,
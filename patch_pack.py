@@ -0,0 +1,298 @@
+"""
+补丁包模块
+为已安装的旧版本模组与新版本模组之间生成二进制补丁包（zip 格式：补丁清单 + 每个文件的增量数据），
+在服务器上流式应用补丁、检查旧版本并校验结果，生成的新版本暂存到 mods_update/ 后可用“应用暂存的更新”安装
+
+用法:
+    python patch_pack.py create <服务器配置.json> <源文件夹> <目标文件夹> <输出文件夹>
+    python patch_pack.py apply <补丁包.modpatch> <目标文件夹> [--install]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import struct
+import time
+import zipfile
+from typing import Callable, Dict, List, Any, BinaryIO
+
+from cancellation import CancelToken
+from delta_transfer import choose_block_size, copy_basis_blocks, file_signature, generate_delta
+
+# 补丁包格式版本与文件扩展名
+PATCH_FORMAT_VERSION = 1
+PATCH_PACK_SUFFIX = '.modpatch'
+# 补丁包中的清单文件名与增量数据目录
+PATCH_MANIFEST_NAME = 'patch_manifest.json'
+PATCH_DELTA_PREFIX = 'delta/'
+# 写入过程中的临时文件后缀
+PARTIAL_FILE_SUFFIX = '.part'
+
+# 增量数据记录: b'C' + 块序号 + 连续块数 / b'D' + 长度 + 字面数据 / b'E' 结束
+_COPY_RECORD = struct.Struct('>QI')
+_DATA_RECORD = struct.Struct('>I')
+
+
+def write_delta_entry(stream: BinaryIO, path: str, block_size: int, blocks: List[List[Any]],
+                      stats: Dict[str, Any], open_file: Callable[[str], BinaryIO] = None) -> str:
+    """把 path 相对于基准文件（块签名 blocks）的增量指令写入 stream，返回 path 的 SHA-256（open_file 见 generate_delta）"""
+    for instruction in generate_delta(path, block_size, blocks, stats, open_file):
+        if instruction[0] == 'copy':
+            stream.write(b'C' + _COPY_RECORD.pack(instruction[1], instruction[2]))
+        elif instruction[0] == 'data':
+            stream.write(b'D' + _DATA_RECORD.pack(len(instruction[1])))
+            stream.write(instruction[1])
+        else:
+            stream.write(b'E')
+            return instruction[1]
+    return ""
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    """从流中读取指定字节数，不足时视为补丁包损坏"""
+    data = stream.read(size)
+    if len(data) < size:
+        raise ValueError("补丁数据不完整")
+    return data
+
+
+def apply_delta_entry(stream: BinaryIO, basis_file: str, output_file: str, block_size: int) -> str:
+    """按顺序读取增量记录并重建文件（basis_file 为空表示没有基准文件），返回重建结果的 SHA-256"""
+    digest = hashlib.sha256()
+    basis_f = open(basis_file, 'rb') if basis_file else None
+    try:
+        with open(output_file, 'wb') as out:
+            while True:
+                op = stream.read(1)
+                if op == b'E':
+                    break
+                if op == b'D':
+                    data = _read_exact(stream, _DATA_RECORD.unpack(_read_exact(stream, _DATA_RECORD.size))[0])
+                    out.write(data)
+                    digest.update(data)
+                elif op == b'C' and basis_f is not None:
+                    index, count = _COPY_RECORD.unpack(_read_exact(stream, _COPY_RECORD.size))
+                    copy_basis_blocks(basis_f, out, digest, index, count, block_size)
+                else:
+                    raise ValueError(f"无效的补丁记录: {op!r}")
+    finally:
+        if basis_f is not None:
+            basis_f.close()
+    return digest.hexdigest()
+
+
+def read_patch_manifest(pack_path: str) -> Dict[str, Any]:
+    """读取补丁包清单"""
+    with zipfile.ZipFile(pack_path, 'r') as pack:
+        manifest = json.loads(pack.read(PATCH_MANIFEST_NAME).decode('utf-8'))
+    if manifest.get('format') != PATCH_FORMAT_VERSION:
+        raise ValueError(f"不支持的补丁包格式: {manifest.get('format')}")
+    return manifest
+
+
+def create_patch_pack(mod_manager, mod_id: str, old_mod_path: str, new_mod_path: str, new_folder_name: str,
+                      output_folder: str, compression: int = zipfile.ZIP_DEFLATED,
+                      cancel_token: CancelToken = None) -> Dict[str, Any]:
+    """
+    生成从 old_mod_path（已安装版本）到 new_mod_path（新版本，可以是压缩包中的模组）的补丁包
+    未变化的文件只记录哈希；变化的文件写入相对旧文件的增量；新增文件写入全部内容
+    返回: 补丁包路径、各类文件数与大小统计
+    """
+    cancel_token = cancel_token or CancelToken()
+    old_version = mod_manager.read_mod_version(old_mod_path)
+    new_version = mod_manager.read_mod_version(new_mod_path)
+    old_files = mod_manager.list_mod_files(old_mod_path, cancel_token)
+    new_files = mod_manager.list_mod_files(new_mod_path, cancel_token)
+    hasher = mod_manager.content_hasher
+    # 压缩包中的新版本文件通过 open_source_file 流式读取（内容哈希缓存只适用于普通文件）
+    new_in_archive = mod_manager.split_archive_path(new_mod_path)[0] is not None
+    hash_new_file = mod_manager.hash_file if new_in_archive else hasher.hash_file
+
+    pack_name = mod_manager.sanitize_folder_name(
+        f"{new_folder_name}_from_{old_version or '未知'}"
+    ) + PATCH_PACK_SUFFIX
+    os.makedirs(output_folder, exist_ok=True)
+    pack_path = os.path.join(output_folder, pack_name)
+    partial_path = pack_path + PARTIAL_FILE_SUFFIX
+
+    stats = {'bytes_literal': 0, 'bytes_matched': 0}
+    counts = {'kept': 0, 'patched': 0, 'added': 0}
+    files = {}
+    try:
+        with zipfile.ZipFile(partial_path, 'w', compression=compression) as pack:
+            for rel_path, (size, mtime_ns) in sorted(new_files.items()):
+                cancel_token.checkpoint()
+                new_file = os.path.join(new_mod_path, *rel_path.split('/'))
+                old_file = os.path.join(old_mod_path, *rel_path.split('/'))
+                entry = {'size': size, 'mtime_ns': mtime_ns}
+                base_hash = hasher.hash_file(old_file) if rel_path in old_files else ""
+
+                if base_hash and old_files[rel_path][0] == size and hash_new_file(new_file) == base_hash:
+                    entry.update({'action': 'keep', 'base_sha256': base_hash, 'sha256': base_hash})
+                    counts['kept'] += 1
+                else:
+                    block_size = choose_block_size(old_files[rel_path][0] if base_hash else size)
+                    blocks = file_signature(old_file, block_size) if base_hash else []
+                    delta_name = PATCH_DELTA_PREFIX + rel_path
+                    with pack.open(delta_name, 'w', force_zip64=True) as stream:
+                        file_hash = write_delta_entry(stream, new_file, block_size, blocks, stats,
+                                                      mod_manager.open_source_file)
+                    entry.update({
+                        'action': 'patch' if base_hash else 'add',
+                        'base_sha256': base_hash,
+                        'sha256': file_hash,
+                        'block_size': block_size,
+                        'delta': delta_name
+                    })
+                    counts['patched' if base_hash else 'added'] += 1
+                files[rel_path] = entry
+
+            manifest = {
+                'format': PATCH_FORMAT_VERSION,
+                'mod_id': mod_id,
+                'name': mod_manager.parse_mod_info(new_mod_path, mod_id).get('name', mod_id),
+                'old_version': old_version,
+                'new_version': new_version,
+                'new_folder_name': new_folder_name,
+                'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'files': files,
+                'removed': sorted(set(old_files) - set(new_files))
+            }
+            pack.writestr(PATCH_MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=4))
+        os.replace(partial_path, pack_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    return {
+        'pack_path': pack_path,
+        'mod_id': mod_id,
+        'old_version': old_version,
+        'new_version': new_version,
+        'pack_size': os.path.getsize(pack_path),
+        'new_size': sum(size for size, _ in new_files.values()),
+        'bytes_literal': stats['bytes_literal'],
+        'bytes_matched': stats['bytes_matched'],
+        'removed': len(manifest['removed']),
+        **counts
+    }
+
+
+def apply_patch_pack(mod_manager, pack_path: str, target_folder: str, staging_folder: str,
+                     cancel_token: CancelToken = None) -> Dict[str, Any]:
+    """
+    应用补丁包：检查目标中已安装的模组版本与各基准文件的哈希，
+    流式重建新版本到 staging_folder/{新文件夹名}/ 并逐文件校验 SHA-256，最后写入模组清单
+    任何检查失败都会抛出 ValueError，且不会留下不完整的暂存模组
+    """
+    cancel_token = cancel_token or CancelToken()
+    manifest = read_patch_manifest(pack_path)
+    mod_id = manifest['mod_id']
+    installed_path = mod_manager.find_existing_mod_path(target_folder, mod_id)
+    if not installed_path:
+        raise ValueError(f"目标文件夹中未安装模组 {mod_id}，无法应用补丁")
+    installed_version = mod_manager.read_mod_version(installed_path)
+    if installed_version != manifest['old_version']:
+        raise ValueError(
+            f"已安装版本 {installed_version} 与补丁要求的旧版本 {manifest['old_version']} 不一致: {mod_id}"
+        )
+
+    # 先并行检查全部基准文件，再开始写入
+    files = manifest['files']
+    base_paths = {
+        rel_path: os.path.join(installed_path, *rel_path.split('/'))
+        for rel_path, entry in files.items() if entry['base_sha256']
+    }
+    missing = [rel_path for rel_path, path in base_paths.items() if not os.path.isfile(path)]
+    if missing:
+        raise ValueError(f"已安装模组缺少文件: {', '.join(missing[:5])}")
+    base_hashes = mod_manager.content_hasher.hash_files(list(base_paths.values()),
+                                                       checkpoint=cancel_token.checkpoint)
+    mismatched = [rel_path for rel_path, path in base_paths.items() if base_hashes[path] != files[rel_path]['base_sha256']]
+    if mismatched:
+        raise ValueError(f"已安装模组的文件与补丁基准不一致: {', '.join(mismatched[:5])}")
+
+    staged_path = os.path.join(staging_folder, manifest['new_folder_name'])
+    if os.path.exists(staged_path):
+        shutil.rmtree(staged_path)
+    manifest_files = {}
+    try:
+        with zipfile.ZipFile(pack_path, 'r') as pack:
+            for rel_path, entry in files.items():
+                cancel_token.checkpoint()
+                target_file = os.path.join(staged_path, *rel_path.split('/'))
+                partial_file = target_file + PARTIAL_FILE_SUFFIX
+                os.makedirs(os.path.dirname(target_file), exist_ok=True)
+                if entry['action'] == 'keep':
+                    _, file_hash = mod_manager.copy_file_verified(base_paths[rel_path], partial_file)
+                else:
+                    with pack.open(entry['delta'], 'r') as stream:
+                        file_hash = apply_delta_entry(
+                            stream, base_paths.get(rel_path, ""), partial_file, entry['block_size']
+                        )
+                if file_hash != entry['sha256'] or os.path.getsize(partial_file) != entry['size']:
+                    raise ValueError(f"补丁应用后的文件校验失败: {rel_path}")
+                os.replace(partial_file, target_file)
+                os.utime(target_file, ns=(entry['mtime_ns'], entry['mtime_ns']))
+                mod_manager.content_hasher.remember(target_file, file_hash)
+                manifest_files[rel_path] = {'size': entry['size'], 'sha256': file_hash}
+        mod_manager.write_manifest(staged_path, manifest_files)
+    except BaseException:
+        shutil.rmtree(staged_path, ignore_errors=True)
+        raise
+
+    return {
+        'mod_id': mod_id,
+        'name': manifest.get('name', mod_id),
+        'old_version': manifest['old_version'],
+        'new_version': manifest['new_version'],
+        'installed_path': installed_path,
+        'staged_path': staged_path,
+        'files': len(files)
+    }
+
+
+def main() -> None:
+    """命令行入口：在没有图形界面的服务器上生成或应用补丁包"""
+    from mod_manager import ModManager
+    from structured_log import start_logging
+
+    parser = argparse.ArgumentParser(description="模组二进制补丁包")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    create_parser = subparsers.add_parser('create', help="为服务器配置中版本变化的模组生成补丁包")
+    create_parser.add_argument('config', help="服务器配置 JSON 文件")
+    create_parser.add_argument('source', help="源文件夹（新版本模组）")
+    create_parser.add_argument('target', help="目标文件夹（与服务器上已安装的版本一致）")
+    create_parser.add_argument('output', help="补丁包输出文件夹")
+    apply_parser = subparsers.add_parser('apply', help="应用补丁包，新版本暂存到目标文件夹的 mods_update")
+    apply_parser.add_argument('packs', nargs='+', help="补丁包文件")
+    apply_parser.add_argument('target', help="目标文件夹（服务器模组目录）")
+    apply_parser.add_argument('--install', action='store_true', help="全部应用成功后立即安装暂存的更新")
+    args = parser.parse_args()
+
+    start_logging()
+    manager = ModManager()
+    if args.command == 'create':
+        with open(args.config, 'r', encoding='utf-8') as f:
+            result = manager.build_patch_packs(f.read(), args.source, args.target, args.output)
+        for pack in result['packs']:
+            print(f"{os.path.basename(pack['pack_path'])}: {pack['old_version']} -> {pack['new_version']}, "
+                  f"{pack['pack_size']} 字节 (完整模组 {pack['new_size']} 字节)")
+        for mod_id in result['full_copy']:
+            print(f"模组 {mod_id} 未安装在目标中，需要完整复制")
+        for failure in result['failed']:
+            print(f"生成补丁包失败: {failure['mod_id']} - {failure['error']}")
+    else:
+        for pack_path in args.packs:
+            result = manager.apply_patch_pack(pack_path, args.target)
+            print(f"已暂存 {result['name']}: {result['old_version']} -> {result['new_version']} ({result['staged_path']})")
+        if args.install:
+            result = manager.apply_staged_updates(args.target)
+            print(f"已安装 {len(result['applied'])} 个模组，回滚区: {result['rollback_folder']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+运行报告模块
+操作在运行过程中逐条产生结果记录（每个模组一条），追加写入 JSONL 运行报告：
+每条记录单独一行并立即刷新到磁盘，外部工具可以像 tail -f 一样在运行中跟踪报告
+报告只保留最近 DEFAULT_KEEP_RUNS 次运行的记录，每次开始新的运行前删除更早的记录
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Any, Iterable, Iterator
+
+from cancellation import OperationCancelled
+
+# 运行报告文件名（位于目标文件夹的报告子文件夹中）
+RUN_REPORT_FILE_NAME = 'run_report.jsonl'
+# 报告中保留的运行次数
+DEFAULT_KEEP_RUNS = 20
+
+# 记录类型
+RECORD_START = 'start'
+RECORD_MOD = 'mod'
+RECORD_DEPENDENCY = 'dependency'
+RECORD_SUMMARY = 'summary'
+RECORD_CANCELLED = 'cancelled'
+RECORD_ERROR = 'error'
+
+
+def prune_run_report(path: str, keep_runs: int) -> None:
+    """只保留报告中最近 keep_runs 次运行的记录（先写临时文件再重命名），记录未超出时不重写"""
+    if not os.path.isfile(path):
+        return
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append((json.loads(line).get('run_id'), line.rstrip('\n')))
+            except ValueError:
+                continue
+    run_ids = list(dict.fromkeys(run_id for run_id, _ in records))
+    if len(run_ids) <= keep_runs:
+        return
+    kept = set(run_ids[len(run_ids) - keep_runs:]) if keep_runs > 0 else set()
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for run_id, line in records:
+            if run_id in kept:
+                f.write(line + '\n')
+    os.replace(temp_path, path)
+
+
+class RunReport:
+    """一次运行的 JSONL 报告写入器（追加模式，线程安全）；打开时只保留之前 keep_runs - 1 次运行的记录"""
+
+    def __init__(self, path: str, operation: str, keep_runs: int = DEFAULT_KEEP_RUNS):
+        self.path = path
+        self.operation = operation
+        self.run_id = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        prune_run_report(path, max(0, keep_runs - 1))
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """追加一条记录（补充运行 ID、操作名和时间）并立即刷新，返回写入的记录"""
+        record = dict(record, run_id=self.run_id, operation=self.operation, time=time.time())
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+        return record
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def report_records(records: Iterable[Dict[str, Any]], report: RunReport) -> Iterator[Dict[str, Any]]:
+    """
+    把操作产生的记录逐条写入报告后再交给调用方
+    操作被取消或出错时写入一条 cancelled / error 记录后继续抛出异常；结束后关闭报告
+    """
+    try:
+        for record in records:
+            yield report.write(record)
+    except OperationCancelled:
+        report.write({'type': RECORD_CANCELLED})
+        raise
+    except Exception as e:
+        report.write({'type': RECORD_ERROR, 'error': str(e)})
+        raise
+    finally:
+        report.close()
+
+
+def read_run_report(path: str, run_id: str = None) -> Iterator[Dict[str, Any]]:
+    """逐行读取运行报告（可只读取某次运行的记录），跳过写了一半的最后一行"""
+    if not os.path.isfile(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if run_id is None or record.get('run_id') == run_id:
+                yield record
@@ -0,0 +1,317 @@
+"""
+持久化状态缓存模块
+类似 git 的索引：为已扫描的每个目录记录目录自身的 mtime_ns、其中文件的 (大小, mtime_ns, inode)
+和子目录列表，保存在磁盘上跨运行复用。
+再次访问时每个目录只需一次 stat：目录 mtime 未变化就直接使用缓存的条目，不再列出目录、逐个 stat 文件，
+在网络共享（SMB）上可以把几分钟的扫描缩短到几秒。
+文件的增删和重命名（包括本工具的临时文件 + 重命名写入）都会改变所在目录的 mtime；
+原地改写已有文件不会改变目录的 mtime，因此目录 mtime 只用于发现目录和文件列表，
+要比较或复制的文件用 walk_files(restat=True) 逐个重新 stat（并发执行），并把变化写回缓存。
+目录树按层并发扫描：同一层的目录检查与列出、以及重新列出的目录中的文件 stat 都在有界线程池中并发执行，
+网络共享上的扫描耗时约为 网络延迟 × 树深度，而不是 网络延迟 × 文件数
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterable, Callable, Optional, Tuple
+
+from structured_log import get_logger, log_fields
+
+logger = get_logger('stat_cache')
+
+# 缓存文件格式版本
+STAT_CACHE_VERSION = 1
+# 目录 mtime 距扫描时间小于该值时不信任缓存（同一时间精度内可能还有修改，FAT/SMB 的精度为 2 秒）
+RACY_WINDOW_NS = 2 * 1_000_000_000
+# 并发扫描的最大线程数（网络文件系统上同时进行的请求数上限）
+DEFAULT_SCAN_WORKERS = 16
+
+
+class StatCache:
+    """持久化的目录树状态缓存（线程安全）"""
+
+    def __init__(self, cache_path: str = None, checkpoint: Callable[[], None] = None,
+                 max_workers: int = DEFAULT_SCAN_WORKERS):
+        self.cache_path = cache_path
+        # checkpoint() 在扫描每个目录前调用（取消时抛出异常，暂停时阻塞）；各扫描方法也可传入本次扫描使用的 checkpoint
+        self.checkpoint = checkpoint
+        self.max_workers = max(1, max_workers)
+        self._executor = None
+        # {规范化目录路径: [目录 mtime_ns, {文件名: [大小, mtime_ns, inode]}, [子目录名, ...]]}
+        self._dirs = {}
+        # 快照期间无需再次检查 mtime 的目录: {规范化目录路径: 引用计数}
+        self._fresh = {}
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self) -> None:
+        """首次使用时加载持久化缓存"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.cache_path and os.path.isfile(self.cache_path):
+            try:
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == STAT_CACHE_VERSION:
+                    self._dirs.update(data.get('dirs', {}))
+            except (OSError, ValueError) as e:
+                logger.warning(f"加载状态缓存时出错: {e}", extra=log_fields(phase='cache'))
+
+    def save(self) -> None:
+        """将缓存写入磁盘（先写临时文件再重命名）"""
+        if not self.cache_path or not self._dirty:
+            return
+        with self._lock:
+            data = {'version': STAT_CACHE_VERSION, 'dirs': dict(self._dirs)}
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        temp_path = self.cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, self.cache_path)
+
+    @staticmethod
+    def _cache_key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def _map(self, func: Callable, items: List[Any]) -> List[Any]:
+        """在有界线程池中并发执行 func（任务按块分配以减少调度开销），保持结果顺序"""
+        if len(items) <= 1 or self.max_workers == 1:
+            return [func(item) for item in items]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stat')
+        chunk_size = max(1, -(-len(items) // (self.max_workers * 2)))
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        results = []
+        for chunk_result in self._executor.map(lambda chunk: [func(item) for item in chunk], chunks):
+            results.extend(chunk_result)
+        return results
+
+    def _probe_dir(self, path: str, checkpoint: Callable[[], None] = None
+                   ) -> Tuple[Optional[List[Any]], Optional[Tuple[int, List[os.DirEntry]]]]:
+        """
+        检查单个目录：返回 (有效的缓存条目, None)，或需要重新列出时返回 (None, (目录 mtime_ns, 目录条目))；
+        目录不存在时返回 (None, None)
+        """
+        key = self._cache_key(path)
+        with self._lock:
+            cached = self._dirs.get(key)
+            fresh = key in self._fresh
+        if fresh and cached is not None:
+            return cached, None
+        try:
+            dir_mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            with self._lock:
+                if self._dirs.pop(key, None) is not None:
+                    self._dirty = True
+            return None, None
+        if cached is not None and cached[0] == dir_mtime_ns:
+            with self._lock:
+                self.hits += 1
+            return cached, None
+        checkpoint = checkpoint or self.checkpoint
+        if checkpoint:
+            checkpoint()
+        try:
+            with os.scandir(path) as entries:
+                return None, (dir_mtime_ns, list(entries))
+        except OSError:
+            return None, None
+
+    @staticmethod
+    def _stat_entry(entry: os.DirEntry) -> Optional[os.stat_result]:
+        """取得目录条目的状态（Windows 上直接使用列目录时返回的数据），文件已消失时返回 None"""
+        try:
+            return entry.stat(follow_symlinks=False)
+        except OSError:
+            return None
+
+    def scan_dirs(self, paths: List[str], checkpoint: Callable[[], None] = None) -> List[Optional[List[Any]]]:
+        """
+        并发扫描一组目录，按顺序返回各目录的缓存条目 [mtime_ns, {文件名: [大小, mtime_ns, inode]}, [子目录名, ...]]
+        目录 mtime 未变化时直接使用缓存；需要重新列出的目录，其中文件的 stat 也并发执行；目录不存在时为 None
+        """
+        self._load()
+        probes = self._map(lambda path: self._probe_dir(path, checkpoint), paths)
+
+        # 重新列出的目录：区分文件和子目录（使用 DirEntry 中的类型信息），再并发获取文件状态
+        listings = []
+        file_entries = []
+        for cached, listing in probes:
+            if listing is None:
+                listings.append(None)
+                continue
+            dir_mtime_ns, entries = listing
+            files, dirs = [], []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append(entry)
+            file_entries.extend(files)
+            listings.append((dir_mtime_ns, files, sorted(dirs)))
+        stats = dict(zip((id(entry) for entry in file_entries), self._map(self._stat_entry, file_entries)))
+
+        results = []
+        now_ns = time.time_ns()
+        for path, (cached, _), listing in zip(paths, probes, listings):
+            if listing is None:
+                results.append(cached)
+                continue
+            dir_mtime_ns, files, dirs = listing
+            file_stats = {}
+            for entry in files:
+                st = stats[id(entry)]
+                if st is not None:
+                    file_stats[entry.name] = [st.st_size, st.st_mtime_ns, entry.inode()]
+            # 刚被修改的目录在同一时间精度内可能还会变化，记为无效 mtime，下次访问时重新列出
+            if now_ns - dir_mtime_ns < RACY_WINDOW_NS:
+                dir_mtime_ns = -1
+            entry = [dir_mtime_ns, file_stats, dirs]
+            with self._lock:
+                self._dirs[self._cache_key(path)] = entry
+                self._dirty = True
+                self.misses += 1
+            results.append(entry)
+        return results
+
+    def scan_dir(self, path: str) -> Optional[List[Any]]:
+        """扫描单个目录，返回缓存条目（见 scan_dirs），目录不存在时返回 None"""
+        return self.scan_dirs([path])[0]
+
+    def scan_trees(self, roots: List[str], checkpoint: Callable[[], None] = None) -> Dict[str, List[Any]]:
+        """
+        按层并发扫描多个目录树，返回 {目录路径: 缓存条目}
+        每一层的所有目录同时检查，耗时与树深度成正比
+        """
+        found = {}
+        level = list(roots)
+        while level:
+            next_level = []
+            for path, entry in zip(level, self.scan_dirs(level, checkpoint)):
+                if entry is None:
+                    continue
+                found[path] = entry
+                next_level.extend(os.path.join(path, name) for name in entry[2])
+            level = next_level
+        return found
+
+    @contextmanager
+    def snapshot(self, roots: Iterable[str], shallow: Iterable[str] = (), checkpoint: Callable[[], None] = None):
+        """
+        扫描目录树（shallow 中的目录只扫描自身，不递归）并在 with 块内把它们作为一致的快照使用：
+        块内再次访问这些目录时不再检查 mtime（适合规划阶段对同一批模组反复查询；块内写入的目录需调用 invalidate）
+        """
+        shallow = [path for path in shallow if path]
+        scanned = list(self.scan_trees([root for root in roots if root], checkpoint))
+        scanned += [path for path, entry in zip(shallow, self.scan_dirs(shallow, checkpoint)) if entry is not None]
+        keys = [self._cache_key(path) for path in scanned]
+        with self._lock:
+            for key in keys:
+                self._fresh[key] = self._fresh.get(key, 0) + 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                for key in keys:
+                    count = self._fresh.get(key, 0) - 1
+                    if count > 0:
+                        self._fresh[key] = count
+                    else:
+                        self._fresh.pop(key, None)
+
+    def list_dir(self, path: str) -> List[str]:
+        """列出目录中的文件和子目录名（排序），目录不存在时抛出 FileNotFoundError"""
+        entry = self.scan_dir(path)
+        if entry is None:
+            raise FileNotFoundError(f"目录不存在: {path}")
+        return sorted(list(entry[1]) + entry[2])
+
+    def subdirs(self, path: str) -> List[str]:
+        """列出目录中的子目录名（排序），目录不存在时返回空列表"""
+        entry = self.scan_dir(path)
+        return list(entry[2]) if entry else []
+
+    def is_file(self, path: str) -> bool:
+        """是否为文件（通过所在目录的缓存条目判断）"""
+        path = os.path.normpath(os.path.abspath(path))
+        entry = self.scan_dir(os.path.dirname(path))
+        return entry is not None and os.path.basename(path) in entry[1]
+
+    def is_dir(self, path: str) -> bool:
+        """是否为目录（通过上级目录的缓存条目判断）"""
+        path = os.path.normpath(os.path.abspath(path))
+        parent = os.path.dirname(path)
+        if parent == path:
+            return os.path.isdir(path)
+        entry = self.scan_dir(parent)
+        return entry is not None and os.path.basename(path) in entry[2]
+
+    def _restat_files(self, found: Dict[str, List[Any]]) -> None:
+        """并发重新 stat 已扫描目录中的文件，把变化的大小/mtime 写回缓存条目，删除已消失的文件"""
+        items = [(dir_path, entry, name) for dir_path, entry in found.items() for name in list(entry[1])]
+
+        def stat(item):
+            try:
+                return os.stat(os.path.join(item[0], item[2]), follow_symlinks=False)
+            except OSError:
+                return None
+
+        stats = self._map(stat, items)
+        with self._lock:
+            for (_, entry, name), st in zip(items, stats):
+                if st is None:
+                    entry[1].pop(name, None)
+                    self._dirty = True
+                    continue
+                current = [st.st_size, st.st_mtime_ns, st.st_ino]
+                if entry[1].get(name) != current:
+                    entry[1][name] = current
+                    self._dirty = True
+
+    def walk_files(self, root: str, ignored_files: Iterable[str] = (),
+                   checkpoint: Callable[[], None] = None, restat: bool = False) -> Dict[str, List[int]]:
+        """
+        列出目录树中的所有文件: {相对路径(以/分隔): [大小, mtime_ns]}
+        ignored_files 为要跳过的相对路径；只有 mtime 变化的目录会被重新列出，各层目录并发扫描；
+        restat=True 时再逐个重新 stat 文件（原地改写的文件不改变目录 mtime），用于要比较或复制的文件
+        """
+        ignored = set(ignored_files)
+        files = {}
+        found = self.scan_trees([root], checkpoint)
+        if restat:
+            self._restat_files(found)
+        for dir_path, entry in found.items():
+            rel_dir = os.path.relpath(dir_path, root)
+            prefix = '' if rel_dir == '.' else rel_dir.replace(os.sep, '/') + '/'
+            for name, (size, mtime_ns, _) in entry[1].items():
+                rel_path = prefix + name
+                if rel_path not in ignored:
+                    files[rel_path] = [size, mtime_ns]
+        return files
+
+    def invalidate(self, path: str = None, recursive: bool = True) -> None:
+        """清除某个目录及其所有子目录（recursive=False 时只清除该目录本身，path 为 None 时清除全部）的缓存，下次访问时重新扫描"""
+        self._load()
+        with self._lock:
+            if path is None:
+                self._dirs.clear()
+                self._fresh.clear()
+            else:
+                key = self._cache_key(path)
+                prefix = key.rstrip(os.sep) + os.sep
+                for cached_key in [k for k in self._dirs if k == key or (recursive and k.startswith(prefix))]:
+                    del self._dirs[cached_key]
+                    self._fresh.pop(cached_key, None)
+                self._fresh.pop(key, None)
+            self._dirty = True
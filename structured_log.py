@@ -0,0 +1,157 @@
+"""
+结构化日志模块
+各模块通过标准 logging 记录日志，记录放入内存队列后立即返回（复制线程不会因写日志而阻塞）；
+后台线程从队列取出记录交给各个消费者：按大小轮转的 JSONL 日志文件、控制台，以及界面日志等后来加入的消费者。
+每条 JSONL 记录包含时间、级别、来源和消息，以及可选的 mod_id / phase / bytes / duration / path 字段
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Any
+
+# 所有日志记录器的根名称
+LOGGER_NAME = 'mod_user_tool'
+# 日志文件（超过大小后轮转为 .1 .2 ...）
+LOG_PATH = os.path.join(os.path.expanduser('~'), '.mod_user_tool', 'logs', 'mod_user_tool.jsonl')
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+# 记录中的结构化字段（通过 extra 传入）
+LOG_FIELDS = ('mod_id', 'phase', 'bytes', 'duration', 'path')
+
+# 界面中“成功”消息使用的级别（介于 INFO 和 WARNING 之间）
+SUCCESS = 25
+logging.addLevelName(SUCCESS, 'SUCCESS')
+
+# 界面日志级别名与 logging 级别的对应关系
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'success': SUCCESS,
+    'warning': logging.WARNING,
+    'error': logging.ERROR
+}
+
+
+def get_logger(name: str = None) -> logging.Logger:
+    """获取本工具的日志记录器（name 为模块名，例如 'mod_manager'）"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def log_fields(mod_id: str = None, phase: str = None, size: int = None, duration: float = None,
+               path: str = None) -> Dict[str, Any]:
+    """构建结构化字段，用作 logger 方法的 extra 参数（size 写入记录的 bytes 字段）"""
+    values = {'mod_id': mod_id, 'phase': phase, 'bytes': size, 'duration': duration, 'path': path}
+    return {key: value for key, value in values.items() if value is not None}
+
+
+def level_name(levelno: int) -> str:
+    """logging 级别对应的界面级别名（debug / info / success / warning / error）"""
+    if levelno >= logging.ERROR:
+        return 'error'
+    if levelno >= logging.WARNING:
+        return 'warning'
+    if levelno >= SUCCESS:
+        return 'success'
+    if levelno >= logging.INFO:
+        return 'info'
+    return 'debug'
+
+
+class JsonFormatter(logging.Formatter):
+    """把日志记录格式化为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': record.created,
+            'level': level_name(record.levelno),
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data['error'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class LogPipeline:
+    """日志管线：队列 + 后台写入线程，消费者可以在运行中加入或移除"""
+
+    def __init__(self, path: str = LOG_PATH, max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT):
+        self.path = path
+        self._queue = queue.Queue()
+        self._queue_handler = QueueHandler(self._queue)
+        self._lock = threading.Lock()
+        handlers = []
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                    encoding='utf-8', delay=True)
+            self.file_handler.setFormatter(JsonFormatter())
+            handlers.append(self.file_handler)
+        except OSError as e:
+            self.file_handler = None
+            sys.stderr.write(f"无法打开日志文件 {path}: {e}\n")
+        # 控制台只输出 INFO 及以上的消息文本（与之前 print 的输出一致）
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setLevel(logging.INFO)
+        console_handler.setFormatter(logging.Formatter('%(message)s'))
+        handlers.append(console_handler)
+        self._listener = QueueListener(self._queue, *handlers, respect_handler_level=True)
+        self._started = False
+
+    def start(self) -> None:
+        """挂到本工具的根日志记录器上并启动后台线程"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            logger = get_logger()
+            logger.setLevel(logging.DEBUG)
+            logger.propagate = False
+            logger.addHandler(self._queue_handler)
+            self._listener.start()
+
+    def add_consumer(self, handler: logging.Handler) -> None:
+        """加入一个消费者（在后台线程中被调用，界面消费者需要自行切换到界面线程）"""
+        with self._lock:
+            self._listener.handlers = self._listener.handlers + (handler,)
+
+    def remove_consumer(self, handler: logging.Handler) -> None:
+        with self._lock:
+            self._listener.handlers = tuple(h for h in self._listener.handlers if h is not handler)
+
+    def stop(self) -> None:
+        """写完队列中剩余的记录后停止后台线程并关闭日志文件"""
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+            get_logger().removeHandler(self._queue_handler)
+            self._listener.stop()
+            if self.file_handler is not None:
+                self.file_handler.close()
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def start_logging(path: str = LOG_PATH) -> LogPipeline:
+    """启动进程内唯一的日志管线（已启动时直接返回），进程退出时写完剩余记录"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = LogPipeline(path)
+            _pipeline.start()
+            atexit.register(_pipeline.stop)
+        return _pipeline
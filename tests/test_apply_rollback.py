@@ -0,0 +1,112 @@
+"""应用暂存更新测试：通过重命名替换模组并可回滚、重命名失败时撤销、智能更新未完成时拒绝应用"""
+
+import json
+import os
+
+import pytest
+
+import mod_manager as mod_manager_module
+from mod_manager import ModManager, UPDATE_JOURNAL_FILE_NAME
+from transfer_journal import TransferJournal
+
+MOD_A = 'AAAAAAAAAAAAAAAA'
+MOD_B = 'BBBBBBBBBBBBBBBB'
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    return manager
+
+
+def make_mod(folder, name, mod_id, version):
+    mod_path = os.path.join(folder, name)
+    os.makedirs(mod_path)
+    with open(os.path.join(mod_path, 'ServerData.json'), 'w', encoding='utf-8') as f:
+        json.dump({'id': mod_id, 'name': name, 'revision': {'version': version}}, f)
+    with open(os.path.join(mod_path, 'data.pak'), 'w', encoding='utf-8') as f:
+        f.write(version)
+    return mod_path
+
+
+def write_info(folder, content):
+    with open(os.path.join(folder, 'mod_info.json'), 'w', encoding='utf-8') as f:
+        json.dump(content, f)
+
+
+def read_info(folder):
+    with open(os.path.join(folder, 'mod_info.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def target(tmp_path):
+    """目标中已安装 A 1.0；mods_update 中暂存了 A 1.1 和新模组 B"""
+    target = str(tmp_path / 'target')
+    make_mod(target, f"ModA_{MOD_A}_1.0", MOD_A, '1.0')
+    write_info(target, {MOD_A: {'version': '1.0'}})
+    update = os.path.join(target, 'mods_update')
+    make_mod(update, f"ModA_{MOD_A}_1.1", MOD_A, '1.1')
+    make_mod(update, f"ModB_{MOD_B}_1.0", MOD_B, '1.0')
+    write_info(update, {MOD_A: {'version': '1.1'}, MOD_B: {'version': '1.0'}})
+    return target
+
+
+def test_apply_then_rollback(target, mod_manager):
+    staged_inode = os.stat(os.path.join(target, 'mods_update', f"ModA_{MOD_A}_1.1")).st_ino
+
+    result = mod_manager.apply_staged_updates(target)
+    assert sorted(result['applied']) == [f"ModA_{MOD_A}_1.1", f"ModB_{MOD_B}_1.0"]
+    assert result['replaced'] == [f"ModA_{MOD_A}_1.0"]
+    # 暂存的模组是被重命名过去的，而不是复制
+    assert os.stat(os.path.join(target, f"ModA_{MOD_A}_1.1")).st_ino == staged_inode
+    assert sorted(os.listdir(target)) == [f"ModA_{MOD_A}_1.1", f"ModB_{MOD_B}_1.0", 'mod_info.json',
+                                          'mods_rollback']
+    assert read_info(target) == {MOD_A: {'version': '1.1'}, MOD_B: {'version': '1.0'}}
+    assert os.path.isdir(os.path.join(result['rollback_folder'], f"ModA_{MOD_A}_1.0"))
+
+    restored = mod_manager.rollback_last_apply(target)
+    assert restored['rollback_folder'] == result['rollback_folder']
+    assert sorted(os.listdir(target)) == [f"ModA_{MOD_A}_1.0", 'mod_info.json', 'mods_rollback', 'mods_update']
+    assert read_info(target) == {MOD_A: {'version': '1.0'}}
+    # 新版本回到暂存文件夹，可以重新应用
+    assert sorted(os.listdir(os.path.join(target, 'mods_update'))) == [
+        f"ModA_{MOD_A}_1.1", f"ModB_{MOD_B}_1.0", 'mod_info.json']
+    with pytest.raises(ValueError, match="没有可回滚的更新"):
+        mod_manager.rollback_last_apply(target)
+
+
+def test_failed_rename_is_undone(target, mod_manager, monkeypatch):
+    before = sorted(os.listdir(target))
+    staged_b = os.path.join(target, 'mods_update', f"ModB_{MOD_B}_1.0")
+    real_rename = os.rename
+
+    def failing_rename(src, dst):
+        if src == staged_b:
+            raise OSError("模拟重命名失败")
+        real_rename(src, dst)
+
+    monkeypatch.setattr(mod_manager_module.os, 'rename', failing_rename)
+    with pytest.raises(OSError):
+        mod_manager.apply_staged_updates(target)
+    monkeypatch.setattr(mod_manager_module.os, 'rename', real_rename)
+
+    # 已完成的重命名全部撤销，目标与暂存文件夹保持原样
+    assert sorted(name for name in os.listdir(target) if name != 'mods_rollback') == before
+    assert read_info(target) == {MOD_A: {'version': '1.0'}}
+    assert len(os.listdir(os.path.join(target, 'mods_update'))) == 3
+    with pytest.raises(ValueError, match="没有可回滚的更新"):
+        mod_manager.rollback_last_apply(target)
+
+
+def test_apply_refuses_unfinished_update(target, mod_manager):
+    journal = TransferJournal(os.path.join(target, UPDATE_JOURNAL_FILE_NAME))
+    journal.plan_mod(os.path.join(target, 'mods_update', f"ModB_{MOD_B}_1.0"), 'source', {'data.pak': [3, 1]})
+    journal.close()
+    with pytest.raises(ValueError, match="智能更新尚未完成"):
+        mod_manager.apply_staged_updates(target)
+    assert os.path.isdir(os.path.join(target, f"ModA_{MOD_A}_1.0"))
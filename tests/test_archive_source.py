@@ -0,0 +1,81 @@
+"""压缩包模组源测试：中央目录索引（含外层文件夹）、在压缩包中查找和读取模组、从压缩包复制模组"""
+
+import json
+import os
+import zipfile
+
+import pytest
+
+from archive_source import ArchiveModSource
+from mod_manager import ModManager
+
+MOD_A = 'AAAAAAAAAAAAAAAA'
+MOD_B = 'BBBBBBBBBBBBBBBB'
+FILES = {
+    'ServerData.json': json.dumps({'id': MOD_A, 'name': 'ModA', 'revision': {'version': '1.2'}}).encode(),
+    'data/data.pak': b'pak' * 1000,
+    'data/extra.bin': b'\x00\x01' * 500,
+}
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    yield manager
+    manager.close_archive_sources()
+
+
+def make_archive(path, prefix=''):
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for rel_path, data in FILES.items():
+            zf.writestr(f"{prefix}ModA_{MOD_A}/{rel_path}", data)
+        zf.writestr(f"{prefix}ModB_{MOD_B}/ServerData.json", json.dumps({'id': MOD_B}))
+    return str(path)
+
+
+@pytest.mark.parametrize('prefix', ['', 'mods/', 'backup/mods/'])
+def test_index_finds_mod_folders(tmp_path, prefix):
+    archive = ArchiveModSource(make_archive(tmp_path / 'mods.zip', prefix))
+    try:
+        assert archive.folder_names() == [f"ModA_{MOD_A}", f"ModB_{MOD_B}"]
+        folder = f"ModA_{MOD_A}"
+        assert set(archive.list_files(folder)) == set(FILES)
+        assert archive.mod_size(folder) == sum(len(data) for data in FILES.values())
+        assert archive.has_file(folder, 'data/data.pak')
+        with archive.open(folder, 'data/extra.bin') as f:
+            assert f.read() == FILES['data/extra.bin']
+        with pytest.raises(FileNotFoundError):
+            archive.open(folder, 'missing.pak')
+    finally:
+        archive.close()
+
+
+def test_manager_reads_and_copies_from_archive(tmp_path, mod_manager):
+    archive_path = make_archive(tmp_path / 'mods.zip')
+    mod_path = mod_manager.find_mod_folder(archive_path, MOD_A)
+    assert mod_path == os.path.join(archive_path, f"ModA_{MOD_A}")
+    assert mod_manager.is_mod_folder(mod_path)
+    assert mod_manager.read_mod_version(mod_path) == '1.2'
+    assert mod_manager.list_mod_files(mod_path)['data/data.pak'][0] == len(FILES['data/data.pak'])
+
+    target = str(tmp_path / 'target' / f"ModA_{MOD_A}")
+    mod_manager.copy_mod_folder_files(mod_path, target, verify=True)
+    for rel_path, data in FILES.items():
+        with open(os.path.join(target, *rel_path.split('/')), 'rb') as f:
+            assert f.read() == data
+    assert set(mod_manager.read_manifest(target)['files']) == set(FILES)
+    # 压缩包中的模组与复制出的模组内容指纹相同（压缩包中的数据只流式读取，不解压到临时文件夹）
+    assert (mod_manager.get_mod_fingerprint(mod_path)['digest']
+            == mod_manager.get_mod_fingerprint(target)['digest'])
+
+
+def test_archive_hash_matches_file_hash(tmp_path, mod_manager):
+    archive_path = make_archive(tmp_path / 'mods.zip')
+    mod_path = mod_manager.find_mod_folder(archive_path, MOD_A)
+    plain = tmp_path / 'data.pak'
+    plain.write_bytes(FILES['data/data.pak'])
+    assert mod_manager.hash_file(os.path.join(mod_path, 'data', 'data.pak')) == mod_manager.hash_file(str(plain))
@@ -0,0 +1,87 @@
+"""清理旧版本测试：保留 N 个旧版本、确认配置完整后才清理未被引用的模组、被引用模组的依赖闭包不被清理"""
+
+import json
+import os
+
+import pytest
+
+from mod_manager import ModManager
+
+MOD_A = 'AAAAAAAAAAAAAAAA'
+MOD_B = 'BBBBBBBBBBBBBBBB'
+MOD_C = 'CCCCCCCCCCCCCCCC'
+MOD_D = 'DDDDDDDDDDDDDDDD'
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    return manager
+
+
+def make_mod(target, mod_id, version, dependencies=()):
+    mod_path = os.path.join(target, f"Mod{mod_id[0]}_{version}")
+    os.makedirs(mod_path)
+    server_data = {'id': mod_id, 'name': f"Mod{mod_id[0]}",
+                   'revision': {'version': version, 'dependencies': [{'id': dep} for dep in dependencies]}}
+    with open(os.path.join(mod_path, 'ServerData.json'), 'w', encoding='utf-8') as f:
+        json.dump(server_data, f)
+    with open(os.path.join(mod_path, 'data.pak'), 'wb') as f:
+        f.write(b'x' * 100)
+    return mod_path
+
+
+@pytest.fixture
+def target(tmp_path):
+    """A 有三个版本，最新版本依赖 B，B 依赖 C；D 没有被任何模组依赖"""
+    target = str(tmp_path / 'target')
+    make_mod(target, MOD_A, '1.0')
+    make_mod(target, MOD_A, '1.1')
+    make_mod(target, MOD_A, '1.2', [MOD_B])
+    make_mod(target, MOD_B, '2.0', [MOD_C])
+    make_mod(target, MOD_C, '3.0')
+    make_mod(target, MOD_D, '4.0')
+    os.makedirs(os.path.join(target, 'mods_update'))
+    return target
+
+
+def removed_names(report):
+    return sorted(item['name'] for item in report['removed'])
+
+
+def test_keeps_requested_old_versions(target, mod_manager):
+    report = mod_manager.collect_garbage(target, keep_versions=1, dry_run=True)
+    assert removed_names(report) == ['ModA_1.0']
+    assert os.path.isdir(os.path.join(target, 'ModA_1.0'))
+
+    result = mod_manager.collect_garbage(target, keep_versions=0, dry_run=False)
+    assert removed_names(result) == ['ModA_1.0', 'ModA_1.1']
+    assert result['reclaimed_bytes'] == sum(item['size'] for item in result['removed']) > 0
+    assert sorted(os.listdir(target)) == ['ModA_1.2', 'ModB_2.0', 'ModC_3.0', 'ModD_4.0', 'mods_update']
+
+
+def test_unreferenced_mods_require_confirmed_configs(target, mod_manager):
+    server_configs = {'server1': [{'modId': MOD_A}]}
+    report = mod_manager.collect_garbage(target, server_configs, keep_versions=1, dry_run=True)
+    assert report['unreferenced_skipped']
+    assert removed_names(report) == ['ModA_1.0']
+
+    result = mod_manager.collect_garbage(target, server_configs, configs_complete=True, keep_versions=1,
+                                         dry_run=False)
+    assert not result['unreferenced_skipped']
+    # B 和 C 是 A 的直接、间接依赖，保留；D 未被引用，删除
+    assert removed_names(result) == ['ModA_1.0', 'ModD_4.0']
+    reasons = {item['name']: item['reason'] for item in result['removed']}
+    assert reasons['ModD_4.0'] == "未被服务器配置引用"
+    assert sorted(os.listdir(target)) == ['ModA_1.1', 'ModA_1.2', 'ModB_2.0', 'ModC_3.0', 'mods_update']
+
+
+def test_unreferenced_mod_removes_every_version(target, mod_manager):
+    # 只有 D 被引用：A 的所有版本（及其依赖 B、C）都不再需要
+    report = mod_manager.collect_garbage(target, {'server1': [{'modId': MOD_D}]}, configs_complete=True,
+                                         keep_versions=5, dry_run=True)
+    assert removed_names(report) == ['ModA_1.0', 'ModA_1.1', 'ModA_1.2', 'ModB_2.0', 'ModC_3.0']
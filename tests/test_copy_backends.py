@@ -0,0 +1,97 @@
+"""复制后端测试：稀疏文件、内核路径失败时的回退、源文件提前结束"""
+
+import errno
+import os
+
+import pytest
+
+import copy_backends
+from copy_backends import available_backends, copy_file_data
+
+MB = 1024 * 1024
+
+
+def make_sparse_file(path):
+    """生成 [空洞 1MB][数据 1MB][空洞 1MB][数据 100 字节][空洞至 6MB] 的稀疏文件，返回其内容"""
+    data = os.urandom(MB)
+    tail = os.urandom(100)
+    with open(path, 'wb') as f:
+        f.seek(MB)
+        f.write(data)
+        f.seek(3 * MB)
+        f.write(tail)
+        f.truncate(6 * MB)
+    return b'\0' * MB + data + b'\0' * MB + tail + b'\0' * (3 * MB - 100)
+
+
+@pytest.mark.parametrize('backend', available_backends())
+def test_sparse_file(tmp_path, backend):
+    source = str(tmp_path / 'source.pak')
+    target = str(tmp_path / 'target.pak')
+    expected = make_sparse_file(source)
+
+    assert copy_file_data(source, target, backend=backend) == backend
+    with open(target, 'rb') as f:
+        assert f.read() == expected
+    # 文件系统报告了空洞时，目标也保留空洞（只分配数据区域的块）
+    fd = os.open(source, os.O_RDONLY)
+    try:
+        regions = copy_backends.data_regions(fd, len(expected))
+    finally:
+        os.close(fd)
+    if sum(length for _, length in regions) < len(expected) and hasattr(os.stat(target), 'st_blocks'):
+        assert os.stat(target).st_blocks * 512 < len(expected)
+
+
+@pytest.mark.skipif('copy_file_range' not in available_backends(), reason="平台不支持 copy_file_range")
+def test_fallback_when_kernel_copy_fails(tmp_path, monkeypatch):
+    source = str(tmp_path / 'source.pak')
+    target = str(tmp_path / 'target.pak')
+    data = os.urandom(3 * MB + 5)
+    with open(source, 'wb') as f:
+        f.write(data)
+
+    real_copy_file_range = os.copy_file_range
+
+    def cross_device(src_fd, dst_fd, count, offset_src=None, offset_dst=None):
+        # 先写入一部分再失败：回退前目标必须被清空
+        real_copy_file_range(src_fd, dst_fd, min(count, MB), offset_src, offset_dst)
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    def not_supported(*args):
+        raise OSError(errno.EINVAL, "Invalid argument")
+
+    monkeypatch.setattr(os, 'copy_file_range', cross_device)
+    expected = 'sendfile' if 'sendfile' in available_backends() else 'buffered'
+    assert copy_file_data(source, target) == expected
+    with open(target, 'rb') as f:
+        assert f.read() == data
+
+    # 指定的内核后端失败时回退到缓冲复制
+    if 'sendfile' in available_backends():
+        monkeypatch.setattr(os, 'sendfile', not_supported)
+        assert copy_file_data(source, target, backend='sendfile') == 'buffered'
+        with open(target, 'rb') as f:
+            assert f.read() == data
+
+    # 不属于回退范围的错误直接抛出
+    def disk_full(*args):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(os, 'copy_file_range', disk_full)
+    with pytest.raises(OSError) as excinfo:
+        copy_file_data(source, target, backend='copy_file_range')
+    assert excinfo.value.errno == errno.ENOSPC
+
+
+def test_buffered_short_read_raises(tmp_path, monkeypatch):
+    source = str(tmp_path / 'source.pak')
+    target = str(tmp_path / 'target.pak')
+    with open(source, 'wb') as f:
+        f.write(os.urandom(MB))
+
+    # 模拟复制开始后源文件被截断：数据区域比实际可读的内容长
+    monkeypatch.setattr(copy_backends, 'data_regions', lambda fd, size: [(0, size + MB)])
+    with pytest.raises(OSError) as excinfo:
+        copy_file_data(source, target, backend='buffered')
+    assert excinfo.value.errno == errno.EIO
@@ -0,0 +1,82 @@
+"""按大小调度测试：大任务优先/小任务优先的顺序、超大模组拆分为文件级工作单元、空闲时间报告"""
+
+import os
+
+import pytest
+
+from copy_scheduler import CopyScheduler, _ModCopyState
+from mod_manager import ModManager
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    return manager
+
+
+def make_mod(folder, name, sizes):
+    mod_path = os.path.join(folder, name)
+    os.makedirs(mod_path)
+    for index, size in enumerate(sizes):
+        with open(os.path.join(mod_path, f"{index}.pak"), 'wb') as f:
+            f.write(b'x' * size)
+    return mod_path
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    source = str(tmp_path / 'source')
+    target = str(tmp_path / 'target')
+    return [(make_mod(source, name, [size]), os.path.join(target, name))
+            for name, size in (('small', 100), ('large', 300), ('medium', 200))]
+
+
+@pytest.mark.parametrize('order, expected', [
+    ('largest', ['large', 'medium', 'small']),
+    ('smallest', ['small', 'medium', 'large']),
+])
+def test_single_worker_follows_size_order(jobs, mod_manager, order, expected):
+    finished = []
+    result = CopyScheduler(mod_manager, max_workers=1, order=order).run(
+        jobs, mod_callback=lambda path, ok, error: finished.append(os.path.basename(path)))
+    assert finished == expected
+    assert all(result['results'].values())
+    assert not result['cancelled']
+    assert [stats['bytes'] for stats in result['worker_stats']] == [600]
+
+
+def test_large_mod_is_split_into_file_units(mod_manager):
+    scheduler = CopyScheduler(mod_manager, split_threshold=250, unit_size=100)
+    large = _ModCopyState('source', 'target', {'a': [150, 0], 'b': [60, 0], 'c': [60, 0], 'd': [30, 0]})
+    small = _ModCopyState('source2', 'target2', {'e': [120, 0]})
+    units = scheduler.build_units([small, large])
+    # 同样大小的单元保持配置中的顺序
+    assert [(size, sorted(paths)) for size, _, paths in units] == [
+        (150, ['a']), (120, ['e']), (120, ['b', 'c']), (30, ['d'])]
+    assert large.remaining_units == 3
+    assert small.remaining_units == 1
+
+
+def test_split_mod_is_copied_by_several_workers(tmp_path, mod_manager):
+    source = make_mod(str(tmp_path / 'source'), 'huge', [150, 60, 60, 30])
+    target = str(tmp_path / 'target' / 'huge')
+    progress = []
+    result = CopyScheduler(mod_manager, max_workers=3, split_threshold=250, unit_size=100).run(
+        [(source, target)], verify=True, progress_callback=lambda done, total: progress.append((done, total)))
+    assert result['results'] == {target: True}
+    assert sum(stats['units'] for stats in result['worker_stats']) == 3
+    assert progress[-1] == (300, 300)
+    assert result['idle_seconds'] >= 0
+    # 拆分后的模组在最后一个单元完成时写入完整的清单
+    assert set(mod_manager.read_manifest(target)['files']) == {'0.pak', '1.pak', '2.pak', '3.pak'}
+    for index, size in enumerate([150, 60, 60, 30]):
+        assert os.path.getsize(os.path.join(target, f"{index}.pak")) == size
+
+
+def test_unknown_order_is_rejected(mod_manager):
+    with pytest.raises(ValueError):
+        CopyScheduler(mod_manager, order='random')
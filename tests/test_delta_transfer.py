@@ -0,0 +1,165 @@
+"""增量传输的本机端到端测试：接收端监听 127.0.0.1 的随机端口，发送端推送一个变化的文件和一个未变化的文件"""
+
+import errno
+import json
+import os
+import random
+
+import pytest
+
+import delta_transfer
+from delta_transfer import DeltaReceiver, DeltaSender, MIN_BLOCK_SIZE
+from mod_manager import ModManager, UPDATE_FOLDER_NAME
+
+MOD_ID = '0123456789ABCDEF'
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    return manager
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def write_server_data(mod_path, version):
+    data = json.dumps({'id': MOD_ID, 'name': 'Mod', 'revision': {'version': version}}).encode('utf-8')
+    write_file(os.path.join(mod_path, 'ServerData.json'), data)
+    return data
+
+
+def test_push_changed_and_unchanged_file(tmp_path, mod_manager):
+    rng = random.Random(0)
+    unchanged = rng.randbytes(3 * MIN_BLOCK_SIZE + 1000)
+    old = rng.randbytes(4 * MIN_BLOCK_SIZE)
+    # 只改动第 3 个块中的一个字节
+    new = bytearray(old)
+    new[2 * MIN_BLOCK_SIZE + 10] ^= 0xFF
+    new = bytes(new)
+
+    # 服务器上已安装的旧版本
+    server_folder = tmp_path / 'server'
+    installed = server_folder / f"Mod_{MOD_ID}_1.0"
+    write_file(str(installed / 'data' / 'changed.pak'), old)
+    write_file(str(installed / 'unchanged.pak'), unchanged)
+    write_server_data(str(installed), '1.0')
+
+    # 本机暂存的新版本
+    update_folder = tmp_path / 'local' / UPDATE_FOLDER_NAME
+    staged = update_folder / f"Mod_{MOD_ID}_1.1"
+    write_file(str(staged / 'data' / 'changed.pak'), new)
+    write_file(str(staged / 'unchanged.pak'), unchanged)
+    # ServerData.json 中的版本号变化，小于一个块，整体作为字面数据发送
+    server_data = write_server_data(str(staged), '1.1')
+
+    receiver = DeltaReceiver(mod_manager, str(server_folder), port=0, staging_folder_name=UPDATE_FOLDER_NAME)
+    host, port = receiver.start()
+    try:
+        stats = DeltaSender(mod_manager, host, port, timeout=10, token=receiver.token).push_folder(str(update_folder))
+    finally:
+        receiver.stop()
+
+    received = server_folder / UPDATE_FOLDER_NAME / f"Mod_{MOD_ID}_1.1"
+    assert (received / 'data' / 'changed.pak').read_bytes() == new
+    assert (received / 'unchanged.pak').read_bytes() == unchanged
+    assert (received / 'ServerData.json').read_bytes() == server_data
+    assert not list(received.rglob('*.part'))
+
+    assert stats['errors'] == []
+    assert stats['files'] == 3
+    assert stats['bytes_total'] == len(new) + len(unchanged) + len(server_data)
+    # 改动的文件只发送变化的那个块，未变化的文件全部由接收端的已有块重建
+    assert stats['bytes_literal'] == MIN_BLOCK_SIZE + len(server_data)
+    assert stats['bytes_matched'] == len(new) + len(unchanged) - MIN_BLOCK_SIZE
+
+
+@pytest.mark.parametrize('token', ['', 'wrong-token'])
+def test_reject_missing_or_wrong_token(tmp_path, mod_manager, token):
+    server_folder = tmp_path / 'server'
+    # 已暂存的内容不能被未授权的连接清空
+    existing = server_folder / UPDATE_FOLDER_NAME / 'Existing' / 'keep.pak'
+    write_file(str(existing), b'keep')
+
+    update_folder = tmp_path / 'local' / UPDATE_FOLDER_NAME
+    write_server_data(str(update_folder / f"Mod_{MOD_ID}_1.0"), '1.0')
+
+    receiver = DeltaReceiver(mod_manager, str(server_folder), port=0, staging_folder_name=UPDATE_FOLDER_NAME)
+    host, port = receiver.start()
+    try:
+        with pytest.raises(ConnectionError, match="令牌不正确"):
+            DeltaSender(mod_manager, host, port, timeout=10, token=token).push_folder(str(update_folder))
+    finally:
+        receiver.stop()
+
+    assert existing.read_bytes() == b'keep'
+    assert not (server_folder / UPDATE_FOLDER_NAME / f"Mod_{MOD_ID}_1.0").exists()
+
+
+def test_local_write_error_keeps_protocol_in_sync(tmp_path, mod_manager, monkeypatch):
+    rng = random.Random(1)
+    old = rng.randbytes(2 * MIN_BLOCK_SIZE)
+    added = rng.randbytes(1000)
+
+    server_folder = tmp_path / 'server'
+    write_file(str(server_folder / f"Mod_{MOD_ID}_1.0" / 'base.pak'), old)
+
+    # base.pak 由已有块重建（copy 指令），new.pak 和 ServerData.json 没有基准文件（data 指令）
+    update_folder = tmp_path / 'local' / UPDATE_FOLDER_NAME
+    staged = update_folder / f"Mod_{MOD_ID}_1.1"
+    write_file(str(staged / 'base.pak'), old)
+    write_file(str(staged / 'new.pak'), added)
+    server_data = write_server_data(str(staged), '1.1')
+
+    def disk_full(*args):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    # 模拟签名发出后写入基准块时磁盘已满
+    monkeypatch.setattr(delta_transfer, 'copy_basis_blocks', disk_full)
+
+    receiver = DeltaReceiver(mod_manager, str(server_folder), port=0, staging_folder_name=UPDATE_FOLDER_NAME)
+    host, port = receiver.start()
+    try:
+        stats = DeltaSender(mod_manager, host, port, timeout=10, token=receiver.token).push_folder(str(update_folder))
+    finally:
+        receiver.stop()
+
+    # 出错的文件之后的文件照常推送，统计只包含成功的文件
+    received = server_folder / UPDATE_FOLDER_NAME / f"Mod_{MOD_ID}_1.1"
+    assert [error['path'] for error in stats['errors']] == ['base.pak']
+    assert not (received / 'base.pak').exists()
+    assert (received / 'new.pak').read_bytes() == added
+    assert (received / 'ServerData.json').read_bytes() == server_data
+    assert not list(received.rglob('*.part'))
+    assert stats['files'] == 2
+    assert stats['bytes_total'] == len(added) + len(server_data)
+
+
+@pytest.mark.parametrize('reset', [True, False])
+def test_reset_clears_staging_folder(tmp_path, mod_manager, reset):
+    server_folder = tmp_path / 'server'
+    stale = server_folder / UPDATE_FOLDER_NAME / 'Stale' / 'old.pak'
+    write_file(str(stale), b'stale')
+
+    update_folder = tmp_path / 'local' / UPDATE_FOLDER_NAME
+    write_server_data(str(update_folder / f"Mod_{MOD_ID}_1.0"), '1.0')
+
+    receiver = DeltaReceiver(mod_manager, str(server_folder), port=0, staging_folder_name=UPDATE_FOLDER_NAME)
+    host, port = receiver.start()
+    try:
+        stats = DeltaSender(mod_manager, host, port, timeout=10, token=receiver.token).push_folder(
+            str(update_folder), reset=reset
+        )
+    finally:
+        receiver.stop()
+
+    assert stats['errors'] == []
+    assert (server_folder / UPDATE_FOLDER_NAME / f"Mod_{MOD_ID}_1.0" / 'ServerData.json').is_file()
+    assert stale.exists() is not reset
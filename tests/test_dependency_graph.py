@@ -0,0 +1,98 @@
+"""依赖图测试：传递闭包、缺失与版本不一致的依赖、去环后的调度关系、按依赖顺序并行复制"""
+
+import os
+import threading
+
+import pytest
+
+from copy_scheduler import CopyScheduler
+from dependency_graph import DependencyGraph, PROBLEM_MISSING, PROBLEM_VERSION_MISMATCH
+from mod_manager import ModManager
+
+
+def record(version, *dependencies):
+    return {'version': version, 'dependencies': [{'id': dep_id, 'version': dep_version}
+                                                 for dep_id, dep_version in dependencies]}
+
+
+@pytest.fixture
+def graph():
+    """A 依赖 B 和 C，B 依赖 C（要求 2.0，源中为 2.1）和缺失的 M；D 与 E 互相依赖"""
+    return DependencyGraph({
+        'A': record('1.0', ('B', ''), ('C', '')),
+        'B': record('1.0', ('C', '2.0'), ('M', '')),
+        'C': record('2.1'),
+        'D': record('1.0', ('E', '')),
+        'E': record('1.0', ('D', '')),
+    })
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    return manager
+
+
+def test_closure_and_unresolved(graph):
+    assert graph.closure(['A']) == ['A', 'B', 'C', 'M']
+    assert graph.closure(['C']) == ['C']
+    assert graph.unresolved(['A']) == ['M']
+    assert set(graph.closure(['D'])) == {'D', 'E'}
+
+
+def test_check_reports_problems(graph):
+    problems = {(p['mod_id'], p['dependency']): p for p in graph.check(['A'])}
+    assert set(problems) == {('B', 'C'), ('B', 'M')}
+    assert problems[('B', 'M')]['problem'] == PROBLEM_MISSING
+    assert problems[('B', 'C')]['problem'] == PROBLEM_VERSION_MISMATCH
+    assert (problems[('B', 'C')]['required_version'], problems[('B', 'C')]['available_version']) == ('2.0', '2.1')
+
+
+def test_ordering_edges_drop_cycles_and_outsiders(graph):
+    edges = graph.ordering_edges(['A', 'B', 'C', 'D', 'E'])
+    assert edges['A'] == ['B', 'C']
+    # M 不在给定模组中，不产生调度关系
+    assert edges['B'] == ['C']
+    assert edges['C'] == []
+    # 互相依赖的一对中只保留一条边，调度时不会互相等待
+    assert (edges['D'], edges['E']) in ((['E'], []), ([], ['D']))
+
+
+def test_dependencies_are_copied_first(tmp_path, graph, mod_manager, monkeypatch):
+    jobs = {}
+    copy_jobs = []
+    # 依赖它的模组更大：大任务优先时仍要等待依赖完成
+    for mod_id, size in (('A', 3000), ('B', 2000), ('C', 100), ('D', 500), ('E', 400)):
+        source = tmp_path / 'source' / mod_id
+        source.mkdir(parents=True)
+        (source / 'data.pak').write_bytes(b'x' * size)
+        jobs[mod_id] = str(tmp_path / 'target' / mod_id)
+        copy_jobs.append((str(source), jobs[mod_id]))
+    dependencies = ModManager.dependency_copy_order(graph, jobs)
+    assert dependencies[jobs['A']] == [jobs['B'], jobs['C']]
+
+    events = []
+    lock = threading.Lock()
+    original_copy = mod_manager.copy_mod_file
+
+    def recording_copy(source_path, target_path, *args, **kwargs):
+        with lock:
+            events.append(('start', os.path.basename(target_path)))
+        return original_copy(source_path, target_path, *args, **kwargs)
+
+    def finished(target_path, ok, error):
+        with lock:
+            events.append(('end', os.path.basename(target_path)))
+
+    monkeypatch.setattr(mod_manager, 'copy_mod_file', recording_copy)
+    result = CopyScheduler(mod_manager, max_workers=3).run(copy_jobs, dependencies=dependencies,
+                                                          mod_callback=finished)
+    assert all(result['results'].values())
+    assert len(result['results']) == 5
+    for mod_id, dep_ids in graph.ordering_edges(jobs).items():
+        for dep_id in dep_ids:
+            assert events.index(('end', dep_id)) < events.index(('start', mod_id))
@@ -0,0 +1,120 @@
+"""磁盘空间预检测试：按文件系统汇总需要的空间、估算替换后的新增空间、按剩余空间分批复制并应用"""
+
+import json
+import os
+
+import pytest
+
+import disk_space
+import mod_manager as mod_manager_module
+from disk_space import check_space, take_batch
+from mod_manager import ModManager
+
+MOD_IDS = {'A': 'AAAAAAAAAAAAAAAA', 'B': 'BBBBBBBBBBBBBBBB', 'C': 'CCCCCCCCCCCCCCCC'}
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    return manager
+
+
+def make_mod(folder, name, mod_id, size):
+    mod_path = os.path.join(folder, name)
+    os.makedirs(mod_path)
+    with open(os.path.join(mod_path, 'ServerData.json'), 'w', encoding='utf-8') as f:
+        json.dump({'id': mod_id, 'name': name}, f)
+    with open(os.path.join(mod_path, 'data.pak'), 'wb') as f:
+        f.write(b'x' * size)
+    return mod_path
+
+
+def test_take_batch_fills_budget_in_order():
+    items = [('a', 600), ('b', 500), ('c', 300), ('d', 100)]
+    batch, rest = take_batch(items, 1000)
+    # 放不下的 b 留到下一批，后面较小的任务先放入
+    assert batch == ['a', 'c', 'd']
+    assert rest == [('b', 500)]
+    assert take_batch(rest, 100) == ([], [('b', 500)])
+
+
+def test_check_space_sums_per_filesystem(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_space, 'available_bytes', lambda path, reserve=0: 1000)
+    # 同一文件系统上的两个目标（其中一个尚未创建）合并计算
+    entries = check_space({str(tmp_path / 'a'): 600, str(tmp_path / 'b' / 'new'): 300})
+    assert len(entries) == 1
+    assert (entries[0]['required'], entries[0]['ok']) == (900, True)
+    entries = check_space({str(tmp_path / 'a'): 600, str(tmp_path / 'b'): 500})
+    assert (entries[0]['required'], entries[0]['ok']) == (1100, False)
+    assert "目标磁盘空间不足" in disk_space.space_error(entries)
+
+
+def test_estimate_subtracts_replaced_files(tmp_path, mod_manager):
+    source = make_mod(str(tmp_path / 'source'), 'Mod', MOD_IDS['A'], 5000)
+    target = str(tmp_path / 'target' / 'Mod')
+    server_data_size = os.path.getsize(os.path.join(source, 'ServerData.json'))
+    assert mod_manager.estimate_copy_bytes(source, target) == 5000 + server_data_size
+
+    make_mod(str(tmp_path / 'target'), 'Mod', MOD_IDS['A'], 4000)
+    # 替换同名文件只新增差值，但至少需要最大文件的大小（写入时新旧文件同时存在）
+    assert mod_manager.estimate_copy_bytes(source, target) == 5000
+    assert mod_manager.check_copy_space([(source, target), (source, target)]) == []
+
+
+@pytest.fixture
+def staged_jobs(tmp_path, mod_manager):
+    source = str(tmp_path / 'source')
+    target = str(tmp_path / 'target')
+    os.makedirs(target)
+    jobs = []
+    for key, size in (('A', 2000), ('B', 1000), ('C', 400)):
+        source_path = make_mod(source, f"Mod{key}_{MOD_IDS[key]}", MOD_IDS[key], size)
+        jobs.append((source_path, os.path.join(target, 'mods_update', os.path.basename(source_path))))
+    job_sizes = {update_path: mod_manager.estimate_copy_bytes(source_path, update_path)
+                 for source_path, update_path in jobs}
+    return target, jobs, job_sizes
+
+
+def fake_space(monkeypatch, budgets):
+    """每次查询可用空间时依次返回 budgets 中的值"""
+    budgets = list(budgets)
+    monkeypatch.setattr(mod_manager_module, 'available_bytes', lambda path: budgets.pop(0))
+
+
+def test_staged_batches_fit_available_space(staged_jobs, mod_manager, monkeypatch):
+    target, jobs, job_sizes = staged_jobs
+    size_a, size_b, size_c = job_sizes.values()
+    fake_space(monkeypatch, [size_a + size_c + 1, size_b])
+
+    result = mod_manager.run_staged_batches(jobs, job_sizes, target)
+    assert result['batches'] == 2
+    assert all(result['results'].values()) and len(result['results']) == 3
+    # 每批复制后立即应用（不保留回滚），暂存文件夹与回滚文件夹都不留下
+    assert sorted(os.listdir(target)) == sorted(os.path.basename(update_path) for _, update_path in jobs)
+
+
+def test_staged_batches_stop_when_nothing_fits(staged_jobs, mod_manager, monkeypatch):
+    target, jobs, job_sizes = staged_jobs
+    size_a, size_b, size_c = job_sizes.values()
+    fake_space(monkeypatch, [size_a + size_c + 1, size_b - 1])
+
+    with pytest.raises(ValueError, match="目标磁盘空间不足"):
+        mod_manager.run_staged_batches(jobs, job_sizes, target)
+    # 第一批已经应用，放不下的模组没有写入任何数据
+    assert sorted(os.listdir(target)) == [f"ModA_{MOD_IDS['A']}", f"ModC_{MOD_IDS['C']}"]
+
+
+def test_fanout_preflight_writes_nothing(tmp_path, mod_manager, monkeypatch):
+    source = str(tmp_path / 'source')
+    make_mod(source, f"ModA_{MOD_IDS['A']}", MOD_IDS['A'], 2000)
+    targets = [str(tmp_path / 'server1'), str(tmp_path / 'server2')]
+    monkeypatch.setattr(disk_space, 'available_bytes', lambda path, reserve=0: 1000)
+
+    config = json.dumps({'game': {'mods': [{'modId': MOD_IDS['A']}]}})
+    with pytest.raises(ValueError, match="目标磁盘空间不足"):
+        mod_manager.sync_to_targets(config, source, targets)
+    assert not any(os.path.exists(target) and os.listdir(target) for target in targets)
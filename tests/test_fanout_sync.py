@@ -0,0 +1,102 @@
+"""多目标同步测试：每个源文件只读取一次，同一文件系统上的其他目标使用硬链接（不支持时复制），各目标生成 mod_info.json"""
+
+import json
+import os
+
+import pytest
+
+import fanout_sync
+from mod_manager import ModManager
+
+MOD_A = 'AAAAAAAAAAAAAAAA'
+MOD_B = 'BBBBBBBBBBBBBBBB'
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    return manager
+
+
+def make_mod(folder, name, mod_id, data):
+    mod_path = os.path.join(folder, name)
+    os.makedirs(mod_path)
+    with open(os.path.join(mod_path, 'ServerData.json'), 'w', encoding='utf-8') as f:
+        json.dump({'id': mod_id, 'name': name, 'revision': {'version': '1.0'}}, f)
+    with open(os.path.join(mod_path, 'data.pak'), 'wb') as f:
+        f.write(data)
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = str(tmp_path / 'source')
+    make_mod(source, f"ModA_{MOD_A}", MOD_A, b'a' * 4000)
+    make_mod(source, f"ModB_{MOD_B}", MOD_B, b'b' * 2000)
+    return source
+
+
+CONFIG = json.dumps({'game': {'mods': [{'modId': MOD_A}, {'modId': MOD_B}]}})
+
+
+def mod_files(target_folder):
+    return sorted(os.path.join(dirpath, name)
+                  for dirpath, _, names in os.walk(target_folder) for name in names if name == 'data.pak')
+
+
+def test_one_read_and_hardlinks(tmp_path, source, mod_manager, monkeypatch):
+    targets = [str(tmp_path / f"server{i}") for i in range(3)]
+    opened = []
+    original_open = mod_manager.open_source_file
+
+    def recording_open(path):
+        opened.append(path)
+        return original_open(path)
+
+    monkeypatch.setattr(mod_manager, 'open_source_file', recording_open)
+
+    result = mod_manager.sync_to_targets(CONFIG, source, targets, verify=True)
+    source_size = sum(os.path.getsize(path) for path in mod_files(source)) + sum(
+        os.path.getsize(os.path.join(dirpath, 'ServerData.json'))
+        for dirpath, _, names in os.walk(source) if 'ServerData.json' in names)
+
+    assert result['copied_mods'] == 2
+    # 每个源文件只读取一次（校验时回读的是写入的目标文件），写入一个目标后其余两个目标硬链接
+    source_reads = [path for path in opened if path.startswith(source + os.sep)]
+    assert len(source_reads) == len(set(source_reads)) == 4
+    assert result['source_bytes'] == source_size
+    assert result['written_bytes'] == source_size
+    assert result['linked_files'] == 4 * 2
+    inodes = {os.stat(path).st_ino for path in mod_files(targets[0])}
+    for target in targets[1:]:
+        assert {os.stat(path).st_ino for path in mod_files(target)} == inodes
+    for summary in result['targets']:
+        assert summary['new_mods'] == 2
+        assert not summary['failed_mods']
+        with open(summary['mod_info_path'], 'r', encoding='utf-8') as f:
+            assert set(json.load(f)) == {MOD_A, MOD_B}
+
+    # 再次同步时各目标都已是最新
+    again = mod_manager.sync_to_targets(CONFIG, source, targets)
+    assert again['copied_mods'] == 0
+    assert [summary['skipped_mods'] for summary in again['targets']] == [2, 2, 2]
+
+
+def test_copies_when_hardlinks_are_unsupported(tmp_path, source, mod_manager, monkeypatch):
+    def no_link(src, dst):
+        raise OSError("不支持硬链接")
+
+    monkeypatch.setattr(fanout_sync.os, 'link', no_link)
+    targets = [str(tmp_path / 'server1'), str(tmp_path / 'server2')]
+    result = mod_manager.sync_to_targets(CONFIG, source, targets)
+
+    assert result['linked_files'] == 0
+    assert result['written_bytes'] == 2 * result['source_bytes']
+    first, second = (mod_files(target) for target in targets)
+    for path_a, path_b in zip(first, second):
+        assert os.stat(path_a).st_ino != os.stat(path_b).st_ino
+        with open(path_a, 'rb') as fa, open(path_b, 'rb') as fb:
+            assert fa.read() == fb.read()
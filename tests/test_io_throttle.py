@@ -0,0 +1,56 @@
+"""低优先级模式测试：call 复用常驻的低优先级线程，元数据扫描的工作进程/线程通过 initializer 降低优先级"""
+
+import threading
+
+import pytest
+
+import io_throttle
+from io_throttle import IOThrottle
+from metadata_scanner import MetadataScanner
+
+
+@pytest.fixture
+def lowered(monkeypatch):
+    """记录调用 lower_current_thread_priority 的线程，不真正降低优先级"""
+    threads = []
+    monkeypatch.setattr(io_throttle, 'lower_current_thread_priority',
+                        lambda: threads.append(threading.current_thread().name))
+    return threads
+
+
+def test_call_reuses_low_priority_thread(lowered):
+    throttle = IOThrottle(low_priority=True)
+    try:
+        idents = {throttle.call(threading.get_ident) for _ in range(20)}
+        names = {throttle.call(lambda: threading.current_thread().name) for _ in range(5)}
+        # 调用线程的优先级不变，常驻线程只在创建时降低一次
+        assert threading.get_ident() not in idents
+        assert len(idents) == 1
+        assert len(lowered) == 1
+        assert all(name.startswith('low-priority') for name in names)
+        # 低优先级线程中的嵌套调用直接执行，不会等待自身
+        assert throttle.call(lambda: throttle.call(threading.get_ident)) in idents
+        with pytest.raises(ValueError):
+            throttle.call(int, 'x')
+    finally:
+        throttle.shutdown()
+
+
+def test_call_runs_inline_without_low_priority(lowered):
+    throttle = IOThrottle()
+    assert throttle.call(threading.get_ident) == threading.get_ident()
+    assert throttle.process_initializer is None
+    assert lowered == []
+
+
+def test_scanner_workers_use_initializer(tmp_path):
+    calls = []
+    mods = {}
+    for i in range(3):
+        mod_path = tmp_path / f"Mod_{i}"
+        mod_path.mkdir()
+        mods[str(i)] = (str(mod_path), 0)
+    records = MetadataScanner(max_workers=2, use_processes=False).scan(mods, initializer=lambda: calls.append(1))
+    assert set(records) == set(mods)
+    assert 1 <= len(calls) <= 2
+    assert IOThrottle(low_priority=True).process_initializer is io_throttle.lower_priority_quietly
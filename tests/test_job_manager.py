@@ -0,0 +1,110 @@
+"""任务管理器的调度测试：同一文件夹上的任务串行执行、重复任务被拒绝、排队中的任务可以取消"""
+
+import threading
+import time
+
+import pytest
+
+from job_manager import JobManager, JOB_CANCELLED, JOB_DONE, JOB_QUEUED, JOB_RUNNING
+
+# 等待任务开始或结束的最长时间（秒）
+TIMEOUT = 10
+
+
+@pytest.fixture
+def job_manager():
+    manager = JobManager(max_workers=2)
+    yield manager
+    manager.shutdown()
+
+
+def blocking_job(started, release, log=None, name=None):
+    """返回一个开始后等待 release 的任务函数"""
+    def run(cancel_token):
+        if log is not None:
+            log.append(('start', name))
+        started.set()
+        assert release.wait(TIMEOUT)
+        if log is not None:
+            log.append(('end', name))
+    return run
+
+
+def wait_status(job, status):
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        if job.status == status:
+            return
+        time.sleep(0.01)
+    pytest.fail(f"任务 {job.name} 未进入状态 {status}（当前 {job.status}）")
+
+
+def test_conflicting_jobs_run_in_submission_order(tmp_path, job_manager):
+    target = str(tmp_path / 'target')
+    other = str(tmp_path / 'other')
+    log = []
+    first_started, first_release = threading.Event(), threading.Event()
+    second_started, second_release = threading.Event(), threading.Event()
+    third_started, third_release = threading.Event(), threading.Event()
+
+    first = job_manager.submit("复制", blocking_job(first_started, first_release, log, 'first'), [target])
+    assert first_started.wait(TIMEOUT)
+    # 嵌套在同一目标文件夹中的任务冲突，排队等待
+    second = job_manager.submit("校验", blocking_job(second_started, second_release, log, 'second'),
+                                [str(tmp_path / 'target' / 'mods_update')])
+    # 不冲突的任务使用空闲的工作线程立即运行
+    third = job_manager.submit("复制", blocking_job(third_started, third_release), [other])
+    assert third_started.wait(TIMEOUT)
+    assert second.status == JOB_QUEUED
+    assert not second_started.is_set()
+
+    first_release.set()
+    assert second_started.wait(TIMEOUT)
+    second_release.set()
+    third_release.set()
+    wait_status(second, JOB_DONE)
+    wait_status(third, JOB_DONE)
+
+    assert first.status == JOB_DONE
+    assert log == [('start', 'first'), ('end', 'first'), ('start', 'second'), ('end', 'second')]
+
+
+def test_duplicate_job_is_rejected(tmp_path, job_manager):
+    target = str(tmp_path / 'target')
+    started, release = threading.Event(), threading.Event()
+    job = job_manager.submit("智能更新", blocking_job(started, release), [target])
+    assert started.wait(TIMEOUT)
+
+    with pytest.raises(ValueError, match="相同的任务"):
+        job_manager.submit("智能更新", blocking_job(threading.Event(), release), [target])
+    # 名称不同的任务不算重复（与运行中的任务冲突，排队等待）
+    queued = job_manager.submit("校验", blocking_job(threading.Event(), release), [target])
+    assert queued.status == JOB_QUEUED
+
+    release.set()
+    wait_status(job, JOB_DONE)
+    wait_status(queued, JOB_DONE)
+    # 任务结束后可以再次提交
+    again = job_manager.submit("智能更新", blocking_job(threading.Event(), release), [target])
+    wait_status(again, JOB_DONE)
+
+
+def test_cancel_queued_job(tmp_path, job_manager):
+    target = str(tmp_path / 'target')
+    started, release = threading.Event(), threading.Event()
+    running = job_manager.submit("复制", blocking_job(started, release), [target])
+    assert started.wait(TIMEOUT)
+
+    queued_started = threading.Event()
+    queued = job_manager.submit("校验", blocking_job(queued_started, release), [target])
+    assert job_manager.cancel(queued.id)
+    assert queued.status == JOB_CANCELLED
+    assert running.status == JOB_RUNNING
+
+    release.set()
+    wait_status(running, JOB_DONE)
+    assert not queued_started.is_set()
+    assert queued.status == JOB_CANCELLED
+    # 已结束的任务不能再取消
+    assert not job_manager.cancel(queued.id)
+    assert [job['status'] for job in job_manager.jobs() if job['id'] == queued.id] == [JOB_CANCELLED]
@@ -0,0 +1,128 @@
+"""守护进程的本机端到端测试：监听 127.0.0.1 的随机端口，提交任务、轮询进度、取消任务并读取 /metrics"""
+
+import json
+import os
+import re
+import time
+import urllib.request
+
+import pytest
+
+import structured_log
+from mod_daemon import ModDaemon
+from mod_manager import ModManager, UPDATE_FOLDER_NAME
+
+# 等待任务结束或指标更新的最长时间（秒）
+TIMEOUT = 30
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    # 日志管线为进程内唯一，写到临时目录而不是用户目录
+    structured_log.start_logging(str(tmp_path / 'logs' / 'mod_user_tool.jsonl'))
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    daemon = ModDaemon(manager, port=0)
+    daemon.start()
+    yield daemon
+    daemon.stop()
+
+
+def make_source(source_folder, count, files_per_mod, file_size):
+    """生成 count 个模组，返回 (服务器配置 JSON, 全部文件总字节数)"""
+    mods = []
+    total = 0
+    for i in range(count):
+        mod_id = f"{i:016X}"
+        mod_path = os.path.join(source_folder, f"Mod{i}_{mod_id}")
+        os.makedirs(os.path.join(mod_path, 'data'))
+        server_data = json.dumps({'id': mod_id, 'name': f"Mod {i}", 'revision': {'version': '1.0'}})
+        with open(os.path.join(mod_path, 'ServerData.json'), 'w', encoding='utf-8') as f:
+            f.write(server_data)
+        total += len(server_data.encode('utf-8'))
+        for n in range(files_per_mod):
+            with open(os.path.join(mod_path, 'data', f"{n}.pak"), 'wb') as f:
+                f.write(os.urandom(file_size))
+            total += file_size
+        mods.append({'modId': mod_id, 'name': f"Mod {i}"})
+    return json.dumps({'game': {'mods': mods}}), total
+
+
+def request(daemon, method, path, body=None):
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(daemon.address + path, data=data, method=method,
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=TIMEOUT) as response:
+        text = response.read().decode('utf-8')
+        if response.headers.get_content_type() == 'application/json':
+            return response.status, json.loads(text)
+        return response.status, text
+
+
+def wait_finished(daemon, job_id):
+    """长轮询任务的进度记录直到任务结束，返回全部记录"""
+    events = []
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        _, page = request(daemon, 'GET', f"/jobs/{job_id}/events?after={len(events)}&wait=5")
+        events.extend(page['events'])
+        if page['finished']:
+            return events
+    pytest.fail(f"任务 {job_id} 未在 {TIMEOUT} 秒内结束")
+
+
+def scrape(daemon, name, labels=''):
+    """从 /metrics 中读取一个指标的值（不存在时为 None）"""
+    _, text = request(daemon, 'GET', '/metrics')
+    match = re.search(rf"^{name}{re.escape(labels)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def test_submit_poll_cancel_and_metrics(tmp_path, daemon):
+    source = str(tmp_path / 'source')
+    config, total_bytes = make_source(source, count=3, files_per_mod=2, file_size=50000)
+
+    # 提交智能更新并轮询到结束
+    target = tmp_path / 'target'
+    target.mkdir()
+    status, job = request(daemon, 'POST', '/jobs', {
+        'type': 'smart_update', 'json_content': config, 'source_folder': source, 'target_folder': str(target)
+    })
+    assert status == 202
+    events = wait_finished(daemon, job['id'])
+    statuses = [event['status'] for event in events if event['type'] == 'status']
+    assert statuses[-1] == 'done'
+    assert sorted(event['action'] for event in events if event['type'] == 'mod') == ['new'] * 3
+    assert len(os.listdir(target / UPDATE_FOLDER_NAME)) == 4  # 3 个模组 + mod_info.json
+
+    # 复制字节数只计实际写入的数据（指标由日志管线异步汇总）
+    deadline = time.monotonic() + TIMEOUT
+    while scrape(daemon, 'mod_user_tool_copied_bytes_total', '{phase="copy"}') != total_bytes:
+        assert time.monotonic() < deadline, "复制字节数指标未更新"
+        time.sleep(0.1)
+
+    # 限制每秒操作数让第二个任务运行足够久，开始运行后取消
+    daemon.mod_manager.io_throttle.set_limits(iops=20)
+    slow_source = str(tmp_path / 'slow_source')
+    slow_config, _ = make_source(slow_source, count=4, files_per_mod=50, file_size=100)
+    slow_target = tmp_path / 'slow_target'
+    slow_target.mkdir()
+    _, slow_job = request(daemon, 'POST', '/jobs', {
+        'type': 'smart_update', 'json_content': slow_config, 'source_folder': slow_source,
+        'target_folder': str(slow_target)
+    })
+    deadline = time.monotonic() + TIMEOUT
+    while request(daemon, 'GET', f"/jobs/{slow_job['id']}")[1]['status'] != 'running':
+        assert time.monotonic() < deadline, "任务未开始运行"
+        time.sleep(0.05)
+    status, _ = request(daemon, 'POST', f"/jobs/{slow_job['id']}/cancel")
+    assert status == 202
+    events = wait_finished(daemon, slow_job['id'])
+    assert [event['status'] for event in events if event['type'] == 'status'][-1] == 'cancelled'
+
+    assert scrape(daemon, 'mod_user_tool_jobs_submitted_total') == 2
+    assert scrape(daemon, 'mod_user_tool_jobs', '{status="done"}') == 1
+    assert scrape(daemon, 'mod_user_tool_jobs', '{status="cancelled"}') == 1
@@ -0,0 +1,86 @@
+"""mod_info.json 输出测试：合并已有条目、内容未变化时不重写、紧凑与排序输出、增量导出"""
+
+import json
+import os
+
+import pytest
+
+from mod_manager import ModManager
+
+MOD_A = 'AAAAAAAAAAAAAAAA'
+MOD_B = 'BBBBBBBBBBBBBBBB'
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    return manager
+
+
+def read_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_merge_replaces_only_given_mods(tmp_path, mod_manager):
+    folder = str(tmp_path)
+    mod_manager.save_mod_info_json({MOD_A: {'version': '1.0'}, MOD_B: {'version': '2.0'}}, folder)
+    path = mod_manager.save_mod_info_json({MOD_A: {'version': '1.1'}}, folder, merge=True)
+    assert json.loads(read_text(path)) == {MOD_A: {'version': '1.1'}, MOD_B: {'version': '2.0'}}
+
+    # 不合并时整体替换
+    mod_manager.save_mod_info_json({MOD_A: {'version': '1.2'}}, folder)
+    assert json.loads(read_text(path)) == {MOD_A: {'version': '1.2'}}
+
+
+def test_merge_over_invalid_file(tmp_path, mod_manager):
+    path = tmp_path / 'mod_info.json'
+    path.write_text('{"broken', encoding='utf-8')
+    mod_manager.save_mod_info_json({MOD_A: {'version': '1.0'}}, str(tmp_path), merge=True)
+    assert json.loads(path.read_text(encoding='utf-8')) == {MOD_A: {'version': '1.0'}}
+    assert not os.path.exists(str(path) + '.tmp')
+
+
+def test_unchanged_content_is_not_rewritten(tmp_path, mod_manager):
+    mod_info = {MOD_A: {'version': '1.0'}}
+    path = mod_manager.save_mod_info_json(mod_info, str(tmp_path))
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    inode = os.stat(path).st_ino
+    assert mod_manager.save_mod_info_json(dict(mod_info), str(tmp_path), merge=True) == path
+    assert os.stat(path).st_mtime_ns == 1_000_000_000
+    assert os.stat(path).st_ino == inode
+
+
+def test_compact_sorted_output(tmp_path, mod_manager):
+    mod_info = {MOD_B: {'version': '2.0', 'name': '模组B'}, MOD_A: {'version': '1.0'}}
+    path = mod_manager.save_mod_info_json(mod_info, str(tmp_path), compact=True, sort_keys=True)
+    text = read_text(path)
+    assert text == json.dumps(mod_info, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    assert text.index(MOD_A) < text.index(MOD_B)
+    assert '模组B' in text
+
+    # 默认（可读格式）输出保持原有顺序并缩进
+    mod_manager.save_mod_info_json(mod_info, str(tmp_path))
+    text = read_text(path)
+    assert text.index(MOD_B) < text.index(MOD_A)
+    assert '\n    ' in text
+
+
+def test_export_writes_source_mod_info(tmp_path, mod_manager):
+    source = tmp_path / 'source'
+    for mod_id, version in ((MOD_A, '1.0'), (MOD_B, '2.0')):
+        mod_path = source / f"Mod_{mod_id}"
+        mod_path.mkdir(parents=True)
+        (mod_path / 'ServerData.json').write_text(
+            json.dumps({'id': mod_id, 'name': f"Mod {mod_id[0]}", 'revision': {'version': version}}), encoding='utf-8')
+        (mod_path / 'data.pak').write_bytes(b'x' * 10)
+    config = json.dumps({'game': {'mods': [{'modId': MOD_A}, {'modId': MOD_B}, {'modId': 'CCCCCCCCCCCCCCCC'}]}})
+
+    result = mod_manager.export_mod_info(config, str(source))
+    assert (result['total_mods'], result['found_mods']) == (3, 2)
+    exported = json.loads(read_text(result['mod_info_path']))
+    assert {mod_id: entry['version'] for mod_id, entry in exported.items()} == {MOD_A: '1.0', MOD_B: '2.0'}
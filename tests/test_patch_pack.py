@@ -0,0 +1,69 @@
+"""补丁包测试：源为压缩包时生成补丁包，再在目标上应用并校验重建结果"""
+
+import json
+import os
+import random
+import zipfile
+
+import pytest
+
+from delta_transfer import MIN_BLOCK_SIZE
+from mod_manager import ModManager, UPDATE_FOLDER_NAME
+
+MOD_ID = '0123456789ABCDEF'
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    yield manager
+    manager.close_archive_sources()
+
+
+def server_data(version):
+    return json.dumps({'id': MOD_ID, 'name': 'Mod', 'revision': {'version': version}}).encode('utf-8')
+
+
+def test_patch_pack_from_archive_source(tmp_path, mod_manager):
+    rng = random.Random(0)
+    unchanged = rng.randbytes(MIN_BLOCK_SIZE + 100)
+    old = rng.randbytes(3 * MIN_BLOCK_SIZE)
+    new = bytearray(old)
+    new[MIN_BLOCK_SIZE + 5] ^= 0xFF
+    new = bytes(new)
+    added = rng.randbytes(500)
+
+    # 目标中已安装的旧版本
+    target = tmp_path / 'target'
+    installed = target / f"Mod_{MOD_ID}_1.0"
+    os.makedirs(installed / 'data')
+    (installed / 'ServerData.json').write_bytes(server_data('1.0'))
+    (installed / 'data' / 'changed.pak').write_bytes(old)
+    (installed / 'unchanged.pak').write_bytes(unchanged)
+
+    # 压缩包中的新版本
+    archive = tmp_path / 'source.zip'
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr(f"Mod_{MOD_ID}/ServerData.json", server_data('1.1'))
+        zf.writestr(f"Mod_{MOD_ID}/data/changed.pak", new)
+        zf.writestr(f"Mod_{MOD_ID}/unchanged.pak", unchanged)
+        zf.writestr(f"Mod_{MOD_ID}/added.pak", added)
+
+    config = json.dumps({'game': {'mods': [{'modId': MOD_ID, 'name': 'Mod'}]}})
+    result = mod_manager.build_patch_packs(config, str(archive), str(target), str(tmp_path / 'packs'))
+    assert result['failed'] == []
+    [pack] = result['packs']
+    assert (pack['kept'], pack['patched'], pack['added']) == (1, 2, 1)
+    # 变化的文件只写入变化的块
+    assert pack['bytes_literal'] == MIN_BLOCK_SIZE + len(server_data('1.1')) + len(added)
+
+    applied = mod_manager.apply_patch_pack(pack['pack_path'], str(target))
+    staged = target / UPDATE_FOLDER_NAME / os.path.basename(applied['staged_path'])
+    assert (staged / 'data' / 'changed.pak').read_bytes() == new
+    assert (staged / 'unchanged.pak').read_bytes() == unchanged
+    assert (staged / 'added.pak').read_bytes() == added
+    assert (staged / 'ServerData.json').read_bytes() == server_data('1.1')
@@ -0,0 +1,21 @@
+"""运行报告测试：报告只保留最近几次运行的记录"""
+
+from run_report import RECORD_START, RECORD_SUMMARY, RunReport, read_run_report
+
+
+def write_run(path, keep_runs):
+    report = RunReport(path, 'smart_update', keep_runs=keep_runs)
+    report.write({'type': RECORD_START})
+    report.write({'type': RECORD_SUMMARY})
+    report.close()
+    return report.run_id
+
+
+def test_keeps_last_runs(tmp_path):
+    path = str(tmp_path / 'mods_reports' / 'run_report.jsonl')
+    run_ids = [write_run(path, keep_runs=3) for _ in range(5)]
+
+    records = list(read_run_report(path))
+    assert [record['run_id'] for record in records] == [run_id for run_id in run_ids[-3:] for _ in range(2)]
+    assert [record['type'] for record in read_run_report(path, run_ids[-1])] == [RECORD_START, RECORD_SUMMARY]
+    assert not list(read_run_report(path, run_ids[0]))
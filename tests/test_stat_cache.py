@@ -0,0 +1,76 @@
+"""状态缓存测试：原地改写文件（所在目录的 mtime 不变）后，比较和复制模组时能看到变化"""
+
+import json
+import os
+import time
+
+import pytest
+
+from mod_manager import ModManager
+
+MOD_ID = '0123456789ABCDEF'
+# 早于状态缓存不信任窗口的时间（纳秒），让目录条目被缓存并在之后直接使用
+OLD_NS = time.time_ns() - 3600 * 1_000_000_000
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    return manager
+
+
+def make_mod(mod_path, data, mtime_ns):
+    os.makedirs(mod_path)
+    with open(os.path.join(mod_path, 'ServerData.json'), 'w', encoding='utf-8') as f:
+        json.dump({'id': MOD_ID, 'name': 'Mod', 'revision': {'version': '1.0'}}, f)
+    with open(os.path.join(mod_path, 'data.pak'), 'wb') as f:
+        f.write(data)
+    for name in ('ServerData.json', 'data.pak'):
+        os.utime(os.path.join(mod_path, name), ns=(mtime_ns, mtime_ns))
+    os.utime(mod_path, ns=(OLD_NS, OLD_NS))
+
+
+def rewrite_in_place(path, data, mtime_ns):
+    """原地改写文件内容，并恢复所在目录原来的 mtime"""
+    dir_stat = os.stat(os.path.dirname(path))
+    with open(path, 'r+b') as f:
+        f.write(data)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+    os.utime(os.path.dirname(path), ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+
+
+def test_rewrite_in_place_is_seen(tmp_path, mod_manager):
+    source = str(tmp_path / 'source' / f"Mod_{MOD_ID}")
+    target = str(tmp_path / 'target' / f"Mod_{MOD_ID}")
+    make_mod(source, b'a' * 1000, OLD_NS)
+    make_mod(target, b'a' * 1000, OLD_NS + 1_000_000_000)
+    assert mod_manager.check_mod_needs_update(source, target, MOD_ID)[0] is False
+
+    # 源文件原地改写为更新的内容：目录 mtime 不变，目录缓存仍然有效
+    new_mtime_ns = OLD_NS + 2_000_000_000
+    rewrite_in_place(os.path.join(source, 'data.pak'), b'b' * 1000, new_mtime_ns)
+    assert mod_manager.stat_cache.walk_files(source)['data.pak'][1] == OLD_NS
+    assert mod_manager.list_mod_files(source)['data.pak'] == [1000, new_mtime_ns]
+    needs_update, reason, _, _ = mod_manager.check_mod_needs_update(source, target, MOD_ID)
+    assert needs_update, reason
+    # 重新 stat 的结果写回了缓存
+    assert mod_manager.stat_cache.walk_files(source)['data.pak'][1] == new_mtime_ns
+
+
+def test_rewrite_in_place_is_seen_by_content_compare(tmp_path, mod_manager):
+    mod_manager.compare_content = True
+    source = str(tmp_path / 'source' / f"Mod_{MOD_ID}")
+    target = str(tmp_path / 'target' / f"Mod_{MOD_ID}")
+    make_mod(source, b'a' * 1000, OLD_NS)
+    make_mod(target, b'a' * 1000, OLD_NS)
+    assert mod_manager.check_mod_needs_update(source, target, MOD_ID)[0] is False
+
+    # 目标文件被原地改写（大小不变）：内容哈希缓存不能沿用旧状态对应的摘要
+    rewrite_in_place(os.path.join(target, 'data.pak'), b'c' * 1000, OLD_NS + 5_000_000_000)
+    needs_update, reason, _, _ = mod_manager.check_mod_needs_update(source, target, MOD_ID)
+    assert needs_update
+    assert reason.startswith("内容不同")
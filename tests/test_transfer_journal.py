@@ -0,0 +1,91 @@
+"""传输日志测试：重放日志恢复进度、源文件变化使已完成记录失效、中断的复制从上次完成的文件继续"""
+
+import os
+
+import pytest
+
+from mod_manager import ModManager, PARTIAL_FILE_SUFFIX
+from transfer_journal import TransferJournal
+
+
+@pytest.fixture
+def mod_manager():
+    manager = ModManager()
+    # 不读写用户目录中的持久化缓存
+    manager.stat_cache.cache_path = None
+    manager.content_hasher.cache_path = None
+    manager.metadata_cache.cache_path = None
+    return manager
+
+
+def test_replay_restores_progress(tmp_path):
+    journal_path = str(tmp_path / 'journal.jsonl')
+    target = str(tmp_path / 'target' / 'Mod')
+    journal = TransferJournal(journal_path)
+    journal.plan_mod(target, 'source', {'a.pak': [10, 1], 'b.pak': [20, 2]})
+    journal.file_done(target, 'a.pak', 'abc')
+    journal.close()
+    # 中断时写了一半的最后一行被忽略
+    with open(journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "done", "mod": ')
+
+    resumed = TransferJournal(journal_path)
+    assert resumed.has_pending()
+    assert resumed.is_mod_pending(target)
+    assert resumed.is_file_done(target, 'a.pak')
+    assert not resumed.is_file_done(target, 'b.pak')
+    assert resumed.get_file_hash(target, 'a.pak') == 'abc'
+
+    # 源文件变化后重新计划：变化的文件需要重新复制，未变化的仍然有效
+    resumed.plan_mod(target, 'source', {'a.pak': [11, 3], 'b.pak': [20, 2]})
+    resumed.file_done(target, 'b.pak')
+    assert not resumed.is_file_done(target, 'a.pak')
+    assert resumed.is_file_done(target, 'b.pak')
+    resumed.mod_done(target)
+    assert not resumed.has_pending()
+
+    resumed.complete()
+    assert not os.path.exists(journal_path)
+
+
+def test_interrupted_copy_resumes(tmp_path, mod_manager, monkeypatch):
+    source = tmp_path / 'source' / 'Mod'
+    source.mkdir(parents=True)
+    for name in ('a.pak', 'b.pak', 'c.pak'):
+        (source / name).write_bytes(name.encode() * 100)
+    target = str(tmp_path / 'target' / 'Mod')
+    journal_path = str(tmp_path / 'journal.jsonl')
+
+    copied = []
+    fail_at = [2]
+    original_copy_file = mod_manager.copy_file
+
+    def recording_copy_file(source_file, target_file, cancel_token=None):
+        copied.append(os.path.basename(source_file))
+        if len(copied) == fail_at[0]:
+            raise OSError("模拟中断")
+        return original_copy_file(source_file, target_file, cancel_token)
+
+    monkeypatch.setattr(mod_manager, 'copy_file', recording_copy_file)
+    journal = TransferJournal(journal_path)
+    with pytest.raises(OSError):
+        mod_manager.copy_mod_folder_files(str(source), target, journal=journal)
+    journal.close()
+    first, failed = copied
+
+    # 重新打开日志继续：已完成的文件不再复制
+    copied.clear()
+    fail_at[0] = None
+    resumed = TransferJournal(journal_path)
+    assert resumed.is_mod_pending(target)
+    assert resumed.is_file_done(target, first)
+    # 只有剩下的两个文件计入需要的空间
+    assert mod_manager.estimate_copy_bytes(str(source), target, resumed) == 2 * 500
+    mod_manager.copy_mod_folder_files(str(source), target, journal=resumed)
+
+    assert sorted(copied) == sorted({'a.pak', 'b.pak', 'c.pak'} - {first})
+    assert failed in copied
+    assert not resumed.has_pending()
+    for name in ('a.pak', 'b.pak', 'c.pak'):
+        assert (tmp_path / 'target' / 'Mod' / name).read_bytes() == name.encode() * 100
+        assert not os.path.exists(os.path.join(target, name + PARTIAL_FILE_SUFFIX))
@@ -0,0 +1,136 @@
+"""
+传输日志（预写日志）模块
+记录每个模组计划复制的文件和已完成的文件，用于中断后从上次完成的文件继续复制
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Any, Optional
+
+
+class TransferJournal:
+    """
+    传输日志类
+
+    日志为追加写入的 JSONL 文件，每行一条记录：
+    - plan: 模组计划复制的文件列表（相对路径 -> [大小, mtime_ns]）
+    - done: 单个文件已复制完成（已从临时文件重命名为最终文件）
+    - mod_done: 模组全部文件复制完成
+    """
+
+    def __init__(self, journal_path: str):
+        self.journal_path = journal_path
+        self.plans = {}
+        self.completed = {}
+        self.hashes = {}
+        self.finished = set()
+        self._lock = threading.Lock()
+        self._file = None
+        self.load()
+
+    @staticmethod
+    def make_key(target_path: str) -> str:
+        """生成模组在日志中的键（规范化的目标路径）"""
+        return os.path.normcase(os.path.abspath(target_path))
+
+    def load(self) -> None:
+        """重放日志文件，恢复计划与完成状态（末尾不完整的行会被忽略）"""
+        if not os.path.isfile(self.journal_path):
+            return
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._apply(record)
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        """应用单条日志记录到内存状态"""
+        op = record.get('op')
+        key = record.get('mod')
+        if op == 'plan':
+            old_files = self.plans.get(key, {}).get('files', {})
+            new_files = record.get('files', {})
+            # 源文件未变化的已完成文件仍然有效
+            self.completed[key] = {
+                rel for rel in self.completed.get(key, set())
+                if old_files.get(rel) == new_files.get(rel)
+            }
+            self.plans[key] = {'source': record.get('source', ''), 'files': new_files}
+            self.finished.discard(key)
+        elif op == 'done':
+            self.completed.setdefault(key, set()).add(record['file'])
+            if record.get('hash'):
+                self.hashes.setdefault(key, {})[record['file']] = record['hash']
+        elif op == 'mod_done':
+            self.finished.add(key)
+
+    def _append(self, record: Dict[str, Any], sync: bool = False) -> None:
+        """追加一条日志记录并刷新到磁盘"""
+        with self._lock:
+            self._apply(record)
+            if self._file is None:
+                self._file = open(self.journal_path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def plan_mod(self, target_path: str, source_path: str, files: Dict[str, List[int]]) -> None:
+        """记录模组计划复制的文件（与已有计划相同时不重复写入）"""
+        key = self.make_key(target_path)
+        plan = self.plans.get(key)
+        if plan and plan['files'] == files:
+            return
+        self._append({'op': 'plan', 'mod': key, 'source': source_path, 'files': files}, sync=True)
+
+    def file_done(self, target_path: str, rel_path: str, file_hash: str = "") -> None:
+        """记录单个文件复制完成"""
+        record = {'op': 'done', 'mod': self.make_key(target_path), 'file': rel_path}
+        if file_hash:
+            record['hash'] = file_hash
+        self._append(record)
+
+    def mod_done(self, target_path: str) -> None:
+        """记录模组复制完成"""
+        self._append({'op': 'mod_done', 'mod': self.make_key(target_path)}, sync=True)
+
+    def is_file_done(self, target_path: str, rel_path: str) -> bool:
+        """文件是否已在之前的运行中复制完成"""
+        return rel_path in self.completed.get(self.make_key(target_path), set())
+
+    def get_file_hash(self, target_path: str, rel_path: str) -> Optional[str]:
+        """获取已完成文件记录的哈希值"""
+        return self.hashes.get(self.make_key(target_path), {}).get(rel_path)
+
+    def is_mod_pending(self, target_path: str) -> bool:
+        """模组是否已计划但尚未复制完成"""
+        key = self.make_key(target_path)
+        return key in self.plans and key not in self.finished
+
+    def has_pending(self) -> bool:
+        """是否存在未完成的模组"""
+        return any(key not in self.finished for key in self.plans)
+
+    def pending_targets(self) -> List[str]:
+        """返回所有未完成模组的目标路径"""
+        return [key for key in self.plans if key not in self.finished]
+
+    def close(self) -> None:
+        """关闭日志文件（保留日志，以便下次继续）"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def complete(self) -> None:
+        """整个任务完成后删除日志文件"""
+        self.close()
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.plans.clear()
+        self.completed.clear()
+        self.hashes.clear()
+        self.finished.clear()
@@ -0,0 +1,62 @@
+"""
+树指纹模块
+由模组文件夹的文件列表（来自状态缓存的一次遍历）得到快速指纹：文件数、总大小、最新修改时间，
+以及由每个文件的 (相对路径, 大小) 累加得到的摘要。
+摘要是各条目哈希的模加和，与遍历顺序无关，
+用于在计算内容哈希之前快速判断两个模组是否可能相同。
+文件列表本身已经需要逐个文件获取（见 stat_cache），指纹每次按文件列表直接求和，计算量与获取列表相同，不再单独缓存
+"""
+
+import hashlib
+from typing import Dict, List, Any
+
+# 单个条目哈希的字节数，摘要按 2^(8*字节数) 取模累加
+ENTRY_DIGEST_SIZE = 16
+DIGEST_MODULUS = 1 << (8 * ENTRY_DIGEST_SIZE)
+
+
+def entry_digest(rel_path: str, size: int) -> int:
+    """单个文件 (相对路径, 大小) 的条目哈希"""
+    data = f"{rel_path}\0{size}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=ENTRY_DIGEST_SIZE).digest(), 'big')
+
+
+class TreeFingerprint:
+    """模组文件夹的快速指纹"""
+
+    def __init__(self):
+        self.files = 0
+        self.size = 0
+        self.mtime_ns = 0
+        self.digest = 0
+
+    def add(self, rel_path: str, size: int, mtime_ns: int) -> None:
+        """加入一个文件"""
+        self.files += 1
+        self.size += size
+        self.mtime_ns = max(self.mtime_ns, mtime_ns)
+        self.digest = (self.digest + entry_digest(rel_path, size)) % DIGEST_MODULUS
+
+    @property
+    def hexdigest(self) -> str:
+        return f"{self.digest:0{ENTRY_DIGEST_SIZE * 2}x}"
+
+    def same_layout(self, other: 'TreeFingerprint') -> bool:
+        """文件数、总大小和路径/大小摘要是否都相同（不比较修改时间）"""
+        return (self.files, self.size, self.digest) == (other.files, other.size, other.digest)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'files': self.files,
+            'size': self.size,
+            'mtime_ns': self.mtime_ns,
+            'digest': self.hexdigest
+        }
+
+
+def fingerprint_files(files: Dict[str, List[int]]) -> TreeFingerprint:
+    """根据文件列表 {相对路径: [大小, mtime_ns]} 计算指纹（压缩包等非目录来源可以直接传入其文件列表）"""
+    fingerprint = TreeFingerprint()
+    for rel_path, (size, mtime_ns) in files.items():
+        fingerprint.add(rel_path, size, mtime_ns)
+    return fingerprint
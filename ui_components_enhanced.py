@@ -3,10 +3,13 @@
 包含更美观的界面元素和样式
 """
 
+import logging
 import tkinter as tk
 from tkinter import ttk
 import tkinter.font as tkfont
 
+from structured_log import LEVELS, get_logger, level_name, start_logging
+
 
 class ModernFrame:
     """现代化框架组件"""
@@ -121,6 +124,13 @@ class ModernButton:
                 activebackground="#545b62",
                 activeforeground="white"
             )
+        elif self.style == "danger":
+            self.button.configure(
+                bg="#dc3545",
+                fg="white",
+                activebackground="#bd2130",
+                activeforeground="white"
+            )
             
     def bind_events(self):
         """绑定事件"""
@@ -139,6 +149,8 @@ class ModernButton:
             self.button.configure(bg="#117a8b")
         elif self.style == "secondary":
             self.button.configure(bg="#545b62")
+        elif self.style == "danger":
+            self.button.configure(bg="#bd2130")
             
     def on_leave(self, event):
         """鼠标离开事件"""
@@ -391,15 +403,33 @@ class EnhancedProgressBar:
         self.progress.update_idletasks()
 
 
+class LogDisplayHandler(logging.Handler):
+    """把日志管线中的记录交给界面日志显示（在管线后台线程中调用，切换到界面线程后插入）"""
+
+    def __init__(self, display):
+        super().__init__(level=logging.INFO)
+        self.display = display
+
+    def emit(self, record):
+        try:
+            self.display.text.after(0, self.display.show_message, record.getMessage(), level_name(record.levelno))
+        except (RuntimeError, tk.TclError):
+            # 窗口已关闭
+            pass
+
+
 class EnhancedLogDisplay:
-    """增强版日志显示"""
+    """增强版日志显示（结构化日志管线的一个消费者）"""
     
     def __init__(self, parent, width=65, height=12):
         self.parent = parent
         self.width = width
         self.height = height
+        self.logger = get_logger('ui')
         
         self.create_widgets()
+        self.handler = LogDisplayHandler(self)
+        start_logging().add_consumer(self.handler)
         
     def create_widgets(self):
         """创建组件"""
@@ -443,7 +473,11 @@ class EnhancedLogDisplay:
         self.log_frame.grid(row=row, column=column+1, columnspan=2, padx=15, pady=(15, 5), sticky="ew")
         
     def log_message(self, message, level="info"):
-        """添加日志消息"""
+        """添加日志消息：写入结构化日志管线（同时记录到日志文件），由管线回调显示"""
+        self.logger.log(LEVELS.get(level, logging.INFO), message)
+
+    def show_message(self, message, level="info"):
+        """在文本框中显示一条消息（界面线程中调用）"""
         import datetime
         
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
@@ -473,7 +507,7 @@ class EnhancedLogDisplay:
         self.text.update_idletasks()
         
     def clear(self):
-        """清空日志"""
+        """清空显示的日志（日志文件中的记录保留）"""
         self.text.delete("1.0", tk.END)
 
 
@@ -526,3 +560,301 @@ class ModernToolTip:
         self.tipwindow = None
         if tw:
             tw.destroy()
+
+
+def format_size(size):
+    """将字节数格式化为易读字符串"""
+    if size is None:
+        return ""
+    value = float(size)
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+class ModTableView:
+    """模组表格视图（按需分批插入行，排序与筛选均在内存中完成）"""
+
+    COLUMNS = (
+        ("modId", "模组ID", 150),
+        ("name", "名称", 200),
+        ("source_version", "源版本", 90),
+        ("target_version", "目标版本", 90),
+        ("size", "大小", 80),
+        ("action", "计划操作", 80),
+    )
+
+    def __init__(self, parent, height=10, chunk_size=100, detail_loader=None):
+        self.parent = parent
+        self.height = height
+        self.chunk_size = chunk_size
+        # detail_loader(rows, callback): 在后台为新显示的行填充详细信息，完成后回调 callback(rows)
+        self.detail_loader = detail_loader
+
+        self.rows = []
+        self.view_rows = []
+        self.inserted_count = 0
+        self.sort_key = None
+        self.sort_reverse = False
+
+        self.create_widgets()
+
+    def create_widgets(self):
+        """创建组件"""
+        # 标签
+        self.label = tk.Label(
+            self.parent,
+            text="模组列表:",
+            font=("Microsoft YaHei", 9, "normal"),
+            fg="#495057",
+            bg=self.parent.cget("bg") if hasattr(self.parent, 'cget') else "#ffffff"
+        )
+
+        # 表格框架
+        self.table_frame = tk.Frame(self.parent, bg="white", relief="solid", bd=1)
+
+        # 筛选输入框
+        filter_frame = tk.Frame(self.table_frame, bg="white")
+        filter_frame.pack(side="top", fill="x", padx=2, pady=2)
+        tk.Label(
+            filter_frame,
+            text="筛选:",
+            font=("Microsoft YaHei", 8, "normal"),
+            fg="#6c757d",
+            bg="white"
+        ).pack(side="left", padx=(5, 5))
+        self.filter_var = tk.StringVar()
+        self.filter_entry = tk.Entry(
+            filter_frame,
+            textvariable=self.filter_var,
+            font=("Microsoft YaHei", 8, "normal"),
+            relief="solid",
+            bd=1
+        )
+        self.filter_entry.pack(side="left", fill="x", expand=True)
+        self.count_label = tk.Label(
+            filter_frame,
+            text="0 个模组",
+            font=("Microsoft YaHei", 8, "normal"),
+            fg="#6c757d",
+            bg="white"
+        )
+        self.count_label.pack(side="right", padx=(5, 5))
+        self.filter_var.trace_add("write", lambda *args: self.apply_filter())
+
+        # 表格
+        self.tree = ttk.Treeview(
+            self.table_frame,
+            columns=[key for key, _, _ in self.COLUMNS],
+            show="headings",
+            height=self.height
+        )
+        for key, heading, width in self.COLUMNS:
+            self.tree.heading(key, text=heading, command=lambda k=key: self.sort_by(k))
+            self.tree.column(key, width=width, anchor="w")
+
+        # 滚动条：滚动接近底部时再插入下一批行
+        self.scrollbar = tk.Scrollbar(self.table_frame, command=self.tree.yview)
+        self.tree.config(yscrollcommand=self.on_scroll)
+
+        # 布局
+        self.tree.pack(side="left", fill="both", expand=True, padx=2, pady=2)
+        self.scrollbar.pack(side="right", fill="y")
+
+    def grid(self, row, column, **kwargs):
+        """网格布局"""
+        self.label.grid(row=row, column=column, padx=15, pady=(15, 5), sticky="nw")
+        self.table_frame.grid(row=row, column=column+1, columnspan=2, padx=15, pady=(15, 5), sticky="nsew")
+
+    def on_scroll(self, first, last):
+        """滚动回调：同步滚动条，并在接近底部时加载更多行"""
+        self.scrollbar.set(first, last)
+        if float(last) >= 0.9 and self.inserted_count < len(self.view_rows):
+            self.insert_next_chunk()
+
+    def set_rows(self, rows):
+        """设置全部行数据（只插入第一批）"""
+        self.rows = list(rows)
+        self.sort_key = None
+        self.sort_reverse = False
+        self.apply_filter()
+
+    def apply_filter(self):
+        """按筛选文本过滤行（在内存中完成）"""
+        text = self.filter_var.get().strip().lower()
+        if text:
+            self.view_rows = [
+                row for row in self.rows
+                if text in row['modId'].lower() or text in str(row.get('name', '')).lower()
+            ]
+        else:
+            self.view_rows = list(self.rows)
+        self.sort_rows()
+        self.reload_tree()
+
+    def sort_by(self, key):
+        """点击表头排序，再次点击同一列时反向"""
+        if self.sort_key == key:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_key = key
+            self.sort_reverse = False
+        self.sort_rows()
+        self.reload_tree()
+
+    def sort_rows(self):
+        """对当前视图行排序，尚未加载的值排在最后"""
+        if not self.sort_key:
+            return
+        key = self.sort_key
+        known = [row for row in self.view_rows if row.get(key) not in (None, "")]
+        unknown = [row for row in self.view_rows if row.get(key) in (None, "")]
+        if key == "size":
+            known.sort(key=lambda row: row[key], reverse=self.sort_reverse)
+        else:
+            known.sort(key=lambda row: str(row[key]).lower(), reverse=self.sort_reverse)
+        self.view_rows = known + unknown
+
+    def reload_tree(self):
+        """清空表格并重新插入第一批行"""
+        self.tree.delete(*self.tree.get_children())
+        self.inserted_count = 0
+        self.insert_next_chunk()
+        self.count_label.config(text=f"{len(self.view_rows)} / {len(self.rows)} 个模组")
+
+    def insert_next_chunk(self):
+        """插入下一批行，并请求加载这些行的详细信息"""
+        chunk = self.view_rows[self.inserted_count:self.inserted_count + self.chunk_size]
+        for row in chunk:
+            self.tree.insert("", tk.END, iid=row['modId'], values=self.format_row(row))
+        self.inserted_count += len(chunk)
+
+        pending = [row for row in chunk if not row.get('loaded')]
+        if pending and self.detail_loader:
+            self.detail_loader(pending, self.refresh_rows)
+
+    def format_row(self, row):
+        """将行数据格式化为表格显示值"""
+        return (
+            row['modId'],
+            row.get('name', ''),
+            row.get('source_version', ''),
+            row.get('target_version', ''),
+            format_size(row.get('size')),
+            row.get('action', ''),
+        )
+
+    def refresh_rows(self, rows):
+        """刷新已插入表格中的行（详细信息加载完成后调用）"""
+        for row in rows:
+            if self.tree.exists(row['modId']):
+                self.tree.item(row['modId'], values=self.format_row(row))
+
+    def clear(self):
+        """清空表格"""
+        self.set_rows([])
+
+
+class JobListView:
+    """任务列表视图（显示排队中、运行中和最近结束的任务）"""
+
+    COLUMNS = (
+        ("id", "编号", 50),
+        ("name", "任务", 150),
+        ("folders", "文件夹", 300),
+        ("status", "状态", 70),
+        ("progress", "进度", 60),
+        ("elapsed", "用时", 70),
+    )
+
+    def __init__(self, parent, height=5, cancel_command=None, pause_command=None):
+        self.parent = parent
+        self.height = height
+        # cancel_command(job_id): 取消选中的任务（排队中的任务直接移除）
+        self.cancel_command = cancel_command
+        # pause_command(job_id): 暂停或继续选中的运行中任务
+        self.pause_command = pause_command
+        self.create_widgets()
+
+    def create_widgets(self):
+        """创建组件"""
+        self.label = tk.Label(
+            self.parent,
+            text="任务列表:",
+            font=("Microsoft YaHei", 9, "normal"),
+            fg="#495057",
+            bg=self.parent.cget("bg") if hasattr(self.parent, 'cget') else "#ffffff"
+        )
+
+        self.table_frame = tk.Frame(self.parent, bg="white", relief="solid", bd=1)
+        self.tree = ttk.Treeview(
+            self.table_frame,
+            columns=[key for key, _, _ in self.COLUMNS],
+            show="headings",
+            height=self.height,
+            selectmode="browse"
+        )
+        for key, heading, width in self.COLUMNS:
+            self.tree.heading(key, text=heading)
+            self.tree.column(key, width=width, anchor="w")
+        self.scrollbar = tk.Scrollbar(self.table_frame, command=self.tree.yview)
+        self.tree.config(yscrollcommand=self.scrollbar.set)
+
+        self.button_frame = tk.Frame(self.table_frame, bg="white")
+        self.cancel_button = ModernButton(
+            self.button_frame,
+            "取消所选任务",
+            self.cancel_selected,
+            style="secondary",
+            width=12
+        )
+        self.pause_button = ModernButton(
+            self.button_frame,
+            "暂停/继续所选",
+            self.pause_selected,
+            style="secondary",
+            width=12
+        )
+
+        self.tree.pack(side="left", fill="both", expand=True, padx=2, pady=2)
+        self.scrollbar.pack(side="left", fill="y")
+        self.button_frame.pack(side="right", padx=5, pady=5, anchor="n")
+        self.cancel_button.pack(side="top", pady=(0, 5))
+        self.pause_button.pack(side="top")
+
+    def grid(self, row, column, **kwargs):
+        """网格布局"""
+        self.label.grid(row=row, column=column, padx=15, pady=(15, 5), sticky="nw")
+        self.table_frame.grid(row=row, column=column+1, columnspan=2, padx=15, pady=(15, 5), sticky="nsew")
+
+    def set_jobs(self, jobs):
+        """用任务列表刷新表格（保留选中项）"""
+        selected = self.tree.selection()
+        self.tree.delete(*self.tree.get_children())
+        for job in jobs:
+            self.tree.insert("", tk.END, iid=str(job['id']), values=(
+                job['id'],
+                job['name'],
+                "; ".join(job['folders']),
+                job['status'] + ("（已暂停）" if job.get('paused') else "")
+                + (f" ({job['error']})" if job['error'] else ""),
+                f"{job['progress']:.0f}%" if job.get('progress') is not None else "",
+                f"{job['elapsed']:.0f}s" if job['elapsed'] else "",
+            ))
+        for iid in selected:
+            if self.tree.exists(iid):
+                self.tree.selection_add(iid)
+
+    def cancel_selected(self):
+        """取消选中的任务"""
+        for iid in self.tree.selection():
+            if self.cancel_command:
+                self.cancel_command(int(iid))
+
+    def pause_selected(self):
+        """暂停或继续选中的任务"""
+        for iid in self.tree.selection():
+            if self.pause_command:
+                self.pause_command(int(iid))
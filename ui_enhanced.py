@@ -4,19 +4,30 @@
 """
 
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, simpledialog
 import json
 import threading
 import os
 
 from mod_manager import ModManager
+from copy_scheduler import DEFAULT_COPY_WORKERS
+from delta_transfer import DEFAULT_DELTA_PORT
+from cancellation import OperationCancelled
+from job_manager import JobManager, JOB_QUEUED, JOB_RUNNING
+from metadata_scanner import mod_info_entry
+from structured_log import start_logging
 from ui_components_enhanced import (
     SectionFrame, ModernButton, EnhancedFileSelector, 
     EnhancedTextArea, EnhancedProgressBar, EnhancedLogDisplay,
-    ModernToolTip
+    ModernToolTip, ModTableView, JobListView, format_size
 )
 from config import *
 
+# 超过该模组数量的配置不再展开到文本框中，只在模组列表中显示
+LARGE_CONFIG_MOD_COUNT = 200
+# 复制模组时规划阶段在进度条中所占的百分比
+PLAN_PROGRESS_SHARE = 20
+
 
 class EnhancedModUserTool:
     """美化版模组用户工具主类"""
@@ -24,13 +35,23 @@ class EnhancedModUserTool:
     def __init__(self):
         self.root = tk.Tk()
         self.mod_manager = ModManager()
+        # 任务管理器：界面操作排队执行，同一目标文件夹上的任务串行，其余任务并行
+        self.job_manager = JobManager(listener=self.on_jobs_changed)
+        self._job_context = threading.local()
+        self._job_refresh_id = None
+        # 大型配置的原始JSON内容（不展开到文本框时使用）
+        self.loaded_json_content = None
+        # 当前模组列表中显示的模组
+        self.table_mods = []
+        # 本次运行中加载过的所有服务器配置 {配置名: 模组列表}，清理旧版本时按它们的并集判断模组是否被引用
+        self.loaded_configs = {}
         self.setup_ui()
         
     def setup_ui(self):
         """设置用户界面"""
         # 设置窗口属性
         self.root.title(WINDOW_TITLE)
-        self.root.geometry("900x900")
+        self.root.geometry("900x1000")
         self.root.minsize(800, 800)
         
         # 设置窗口背景色
@@ -38,6 +59,8 @@ class EnhancedModUserTool:
         
         # 配置网格权重
         self.root.grid_columnconfigure(1, weight=1)
+        self.root.grid_rowconfigure(8, weight=1)
+        self.root.grid_rowconfigure(9, weight=1)
         self.root.grid_rowconfigure(10, weight=1)
         
         # 创建UI组件
@@ -47,6 +70,8 @@ class EnhancedModUserTool:
         self.create_progress_section()
         self.create_button_section()
         self.create_log_section()
+        self.create_mod_table_section()
+        self.create_job_list_section()
         
     def create_header(self):
         """创建页面头部"""
@@ -119,6 +144,17 @@ class EnhancedModUserTool:
             self.root, "选择源文件夹:", "浏览", self.select_source_folder
         )
         self.source_folder_selector.grid(row=3, column=0, columnspan=3)
+
+        # 选择压缩包作为源（直接从 zip 中读取模组，无需解压）
+        self.source_archive_button = ModernButton(
+            self.root,
+            "选择源压缩包",
+            self.select_source_archive,
+            style="secondary",
+            width=15
+        )
+        self.source_archive_button.grid(row=3, column=3, padx=15)
+        ModernToolTip(self.source_archive_button, "把 zip 压缩包（例如之前打包的模组或同事分享的压缩包）作为源：只读取压缩包目录和 ServerData.json，需要更新的模组直接从压缩包流式写入目标，不解压到临时文件夹。")
         
         # 目标文件夹选择
         self.target_folder_selector = EnhancedFileSelector(
@@ -130,6 +166,30 @@ class EnhancedModUserTool:
         """创建进度条UI组件"""
         self.progress_bar = EnhancedProgressBar(self.root)
         self.progress_bar.grid(row=5, column=0, columnspan=3)
+
+        # 暂停/继续与取消按钮（仅在可取消的操作运行时可用）
+        control_frame = tk.Frame(self.root)
+        control_frame.grid(row=5, column=3, padx=15)
+        self.pause_button = ModernButton(
+            control_frame,
+            "暂停",
+            self.toggle_pause,
+            style="secondary",
+            width=6
+        )
+        self.pause_button.pack(side="left", padx=(0, 5))
+        self.pause_button.configure(state=tk.DISABLED)
+        ModernToolTip(self.pause_button, "暂停当前操作：各线程写完正在处理的文件后等待，点击“继续”恢复。")
+        self.cancel_button = ModernButton(
+            control_frame,
+            "取消",
+            self.cancel_operation,
+            style="danger",
+            width=6
+        )
+        self.cancel_button.pack(side="left")
+        self.cancel_button.configure(state=tk.DISABLED)
+        ModernToolTip(self.cancel_button, "取消当前操作：写完正在处理的文件后停止，并清理未完成的临时文件。")
         
     def create_button_section(self):
         """创建操作按钮UI组件"""
@@ -197,18 +257,481 @@ class EnhancedModUserTool:
         self.process_multiple_button = ModernButton(
             row3_frame,
             "处理多个服务器 JSON 文件",
-            self.process_multiple_json_files,
+            self.run_process_multiple_json_files,
             style="secondary",
             width=25
         )
-        self.process_multiple_button.pack(side="left")
+        self.process_multiple_button.pack(side="left", padx=(0, 10))
         ModernToolTip(self.process_multiple_button, "选择多个服务器 JSON 文件，输出每个服务器的模组清单和所有包含的模组。")
+
+        # 校验目标文件夹按钮
+        self.verify_button = ModernButton(
+            row3_frame,
+            "校验目标文件夹",
+            self.run_verify_target,
+            style="secondary",
+            width=15
+        )
+        self.verify_button.pack(side="left", padx=(0, 10))
+        ModernToolTip(self.verify_button, "按每个模组的清单并行校验目标文件夹中所有文件的大小和哈希。")
+
+        # 复制时校验选项
+        self.verify_copy_var = tk.BooleanVar(value=False)
+        self.verify_copy_check = tk.Checkbutton(
+            row3_frame,
+            text="复制时校验并生成清单",
+            variable=self.verify_copy_var,
+            font=("Microsoft YaHei", 9, "normal"),
+            fg="#495057",
+            bg="#f8f9fa",
+            activebackground="#f8f9fa"
+        )
+        self.verify_copy_check.pack(side="left", padx=(0, 10))
+
+        # 按内容比较选项
+        self.compare_content_var = tk.BooleanVar(value=False)
+        self.compare_content_check = tk.Checkbutton(
+            row3_frame,
+            text="版本相同时按内容比较",
+            variable=self.compare_content_var,
+            command=lambda: setattr(self.mod_manager, 'compare_content', self.compare_content_var.get()),
+            font=("Microsoft YaHei", 9, "normal"),
+            fg="#495057",
+            bg="#f8f9fa",
+            activebackground="#f8f9fa"
+        )
+        self.compare_content_check.pack(side="left", padx=(0, 10))
+
+        # mod_info.json 紧凑输出选项
+        self.compact_info_var = tk.BooleanVar(value=False)
+        self.compact_info_check = tk.Checkbutton(
+            row3_frame,
+            text="紧凑输出模组信息",
+            variable=self.compact_info_var,
+            command=self.update_mod_info_format,
+            font=("Microsoft YaHei", 9, "normal"),
+            fg="#495057",
+            bg="#f8f9fa",
+            activebackground="#f8f9fa"
+        )
+        self.compact_info_check.pack(side="left")
+        ModernToolTip(self.compact_info_check, "mod_info.json 不缩进并按模组 ID 排序，文件更小、下游加载更快，多次导出的结果也便于比较。")
+        ModernToolTip(self.compare_content_check, "版本号相同时再比较模组内容指纹（并行哈希，结果按文件大小和修改时间缓存），内容不同也视为需要更新。")
+        ModernToolTip(self.verify_copy_check, "复制时源文件只读取一次并同时计算哈希，写入后校验，哈希记录到模组清单中。")
+
+        # 第四行按钮
+        row4_frame = tk.Frame(button_frame, bg="#f8f9fa")
+        row4_frame.pack(fill="x", pady=(10, 0))
+
+        # 应用暂存更新按钮
+        self.apply_update_button = ModernButton(
+            row4_frame,
+            "应用暂存的更新",
+            self.run_apply_updates,
+            style="primary",
+            width=15
+        )
+        self.apply_update_button.pack(side="left", padx=(0, 10))
+        ModernToolTip(self.apply_update_button, "将 mods_update 中的模组通过重命名移入目标文件夹，被替换的旧版本移动到 mods_rollback 回滚区。")
+
+        # 回滚按钮
+        self.rollback_button = ModernButton(
+            row4_frame,
+            "回滚上次应用",
+            self.run_rollback_apply,
+            style="secondary",
+            width=15
+        )
+        self.rollback_button.pack(side="left", padx=(0, 10))
+        ModernToolTip(self.rollback_button, "撤销最近一次应用更新，恢复被替换的旧版本。")
+
+        # 清理旧版本按钮
+        self.gc_button = ModernButton(
+            row4_frame,
+            "清理旧版本",
+            self.run_collect_garbage,
+            style="warning",
+            width=12
+        )
+        self.gc_button.pack(side="left", padx=(0, 10))
+        ModernToolTip(self.gc_button, "删除目标文件夹中已被新版本取代的模组，以及未被已加载服务器配置引用的模组。先显示可回收空间，确认后再删除。")
+
+        # 保留旧版本数
+        tk.Label(
+            row4_frame,
+            text="保留旧版本数:",
+            font=("Microsoft YaHei", 9, "normal"),
+            fg="#495057",
+            bg="#f8f9fa"
+        ).pack(side="left")
+        self.keep_versions_var = tk.IntVar(value=0)
+        self.keep_versions_spinbox = tk.Spinbox(
+            row4_frame,
+            from_=0,
+            to=10,
+            width=3,
+            textvariable=self.keep_versions_var,
+            font=("Microsoft YaHei", 9, "normal")
+        )
+        self.keep_versions_spinbox.pack(side="left", padx=(5, 15))
+
+        # 增量推送按钮
+        self.push_button = ModernButton(
+            row4_frame,
+            "增量推送到服务器",
+            self.run_push_updates,
+            style="info",
+            width=15
+        )
+        self.push_button.pack(side="left", padx=(0, 10))
+        ModernToolTip(self.push_button, "把 mods_update 推送到服务器主机上运行的接收端，只发送服务器已有文件中不存在的数据块。")
+
+        # 增量接收端按钮
+        self.receiver_button = ModernButton(
+            row4_frame,
+            "启动增量接收端",
+            self.toggle_delta_receiver,
+            style="secondary",
+            width=15
+        )
+        self.receiver_button.pack(side="left")
+        ModernToolTip(self.receiver_button, "在服务器主机上运行：接收推送的模组并暂存到目标文件夹的 mods_update，之后可点击“应用暂存的更新”。")
+        self.delta_receiver = None
+
+        # 第五行：I/O 限速设置（任务运行中修改立即生效）
+        row5_frame = tk.Frame(button_frame, bg="#f8f9fa")
+        row5_frame.pack(fill="x", pady=(10, 0))
+
+        self.mb_per_sec_var = tk.StringVar(value="0")
+        self.iops_var = tk.StringVar(value="0")
+        for text, variable in (("限速 MB/s (0=不限):", self.mb_per_sec_var), ("IOPS 上限 (0=不限):", self.iops_var)):
+            tk.Label(
+                row5_frame,
+                text=text,
+                font=("Microsoft YaHei", 9, "normal"),
+                fg="#495057",
+                bg="#f8f9fa"
+            ).pack(side="left")
+            tk.Spinbox(
+                row5_frame,
+                from_=0,
+                to=10000,
+                width=6,
+                textvariable=variable,
+                font=("Microsoft YaHei", 9, "normal")
+            ).pack(side="left", padx=(5, 15))
+            variable.trace_add("write", lambda *args: self.update_io_limits())
+
+        self.low_priority_var = tk.BooleanVar(value=False)
+        self.low_priority_check = tk.Checkbutton(
+            row5_frame,
+            text="低优先级模式",
+            variable=self.low_priority_var,
+            command=self.update_io_limits,
+            font=("Microsoft YaHei", 9, "normal"),
+            fg="#495057",
+            bg="#f8f9fa",
+            activebackground="#f8f9fa"
+        )
+        self.low_priority_check.pack(side="left", padx=(0, 15))
+
+        # 并行复制设置
+        tk.Label(
+            row5_frame,
+            text="并行线程:",
+            font=("Microsoft YaHei", 9, "normal"),
+            fg="#495057",
+            bg="#f8f9fa"
+        ).pack(side="left")
+        self.copy_workers_var = tk.IntVar(value=DEFAULT_COPY_WORKERS)
+        tk.Spinbox(
+            row5_frame,
+            from_=1,
+            to=32,
+            width=3,
+            textvariable=self.copy_workers_var,
+            font=("Microsoft YaHei", 9, "normal")
+        ).pack(side="left", padx=(5, 15))
+
+        self.smallest_first_var = tk.BooleanVar(value=False)
+        self.smallest_first_check = tk.Checkbutton(
+            row5_frame,
+            text="小模组优先",
+            variable=self.smallest_first_var,
+            font=("Microsoft YaHei", 9, "normal"),
+            fg="#495057",
+            bg="#f8f9fa",
+            activebackground="#f8f9fa"
+        )
+        self.smallest_first_check.pack(side="left")
+        ModernToolTip(self.smallest_first_check, "默认大模组优先以缩短总耗时；勾选后小模组优先，尽快让更多模组就绪。")
+        ModernToolTip(self.low_priority_check, "降低复制线程的 I/O 与 CPU 优先级，避免与同机运行的游戏服务器争抢磁盘。对之后启动的任务生效。")
+
+        # 第六行按钮
+        row6_frame = tk.Frame(button_frame, bg="#f8f9fa")
+        row6_frame.pack(fill="x", pady=(10, 0))
+
+        # 生成补丁包按钮
+        self.build_patch_button = ModernButton(
+            row6_frame,
+            "生成补丁包",
+            self.run_build_patch_packs,
+            style="info",
+            width=15
+        )
+        self.build_patch_button.pack(side="left", padx=(0, 10))
+        ModernToolTip(self.build_patch_button, "为目标中已安装且版本不同的模组生成二进制补丁包（只包含变化的数据），适合通过慢速网络分发到服务器。")
+
+        # 应用补丁包按钮
+        self.apply_patch_button = ModernButton(
+            row6_frame,
+            "应用补丁包",
+            self.run_apply_patch_packs,
+            style="primary",
+            width=15
+        )
+        self.apply_patch_button.pack(side="left", padx=(0, 10))
+        ModernToolTip(self.apply_patch_button, "检查目标中已安装的旧版本后流式应用补丁并校验结果，新版本暂存到 mods_update，再点击“应用暂存的更新”安装。")
+
+        # 多目标同步按钮
+        self.sync_targets_button = ModernButton(
+            row6_frame,
+            "同步到多个目标",
+            self.run_sync_multiple_targets,
+            style="success",
+            width=15
+        )
+        self.sync_targets_button.pack(side="left")
+        ModernToolTip(self.sync_targets_button, "把模组同步到多个目标文件夹（例如多个服务器实例）：每个源文件只读取一次，同一磁盘上的目标之间使用硬链接，每个目标各自生成模组信息文件。")
         
     def create_log_section(self):
         """创建日志显示UI组件"""
         self.log_display = EnhancedLogDisplay(self.root, width=80, height=15)
         self.log_display.grid(row=7, column=0, columnspan=3)
+
+    def create_mod_table_section(self):
+        """创建模组列表UI组件"""
+        self.mod_table = ModTableView(self.root, height=10, detail_loader=self.load_mod_row_details)
+        self.mod_table.grid(row=8, column=0, columnspan=3)
+
+    def create_job_list_section(self):
+        """创建任务列表UI组件"""
+        self.job_list = JobListView(self.root, height=5, cancel_command=self.job_manager.cancel,
+                                    pause_command=self.toggle_job_pause)
+        self.job_list.grid(row=9, column=0, columnspan=3)
+
+    def load_mod_row_details(self, rows, callback):
+        """在后台线程中填充模组列表行的版本、大小和计划操作"""
+        source_folder = self.get_source_folder()
+        target_folder = self.get_target_folder()
+
+        def worker():
+            for row in rows:
+                self.mod_manager.fill_mod_row(row, source_folder, target_folder)
+            self.root.after(0, callback, rows)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def refresh_mod_table(self, mods=None):
+        """重新构建模组列表（源/目标文件夹变化后也需要刷新）"""
+        if mods is not None:
+            self.table_mods = mods
+        self.mod_manager.clear_listing_cache()
+        self.mod_table.set_rows(self.mod_manager.build_mod_rows(self.table_mods))
+
+    def show_config(self, config, json_content, name="文本框内容"):
+        """显示已加载的配置：小配置展开到文本框，大配置只显示摘要并保留原始内容"""
+        mods = config.get('game', {}).get('mods', [])
+        self.loaded_configs[name] = mods
+        if len(mods) > LARGE_CONFIG_MOD_COUNT:
+            self.loaded_json_content = json_content
+            self.json_text_area.set_content(
+                f"已加载大型配置（{len(mods)} 个模组），内容不在此展开，请在模组列表中查看。"
+            )
+        else:
+            self.loaded_json_content = None
+            self.json_text_area.set_content(json.dumps(config, ensure_ascii=False, indent=4))
+        self.refresh_mod_table(mods)
+
+    def get_json_content(self):
+        """获取当前使用的JSON内容（任务中返回提交时的内容）"""
+        snapshot = self.job_snapshot()
+        if snapshot:
+            return snapshot['json_content']
+        if self.loaded_json_content:
+            return self.loaded_json_content
+        return self.json_text_area.get_content()
         
+    def toggle_pause(self):
+        """暂停或继续所有运行中的任务"""
+        if self.job_manager.all_paused:
+            self.job_manager.resume_all()
+            self.pause_button.configure(text="暂停")
+            self.log_display.log_message("已继续", "info")
+        else:
+            self.job_manager.pause_all()
+            self.pause_button.configure(text="继续")
+            self.log_display.log_message("已暂停，正在处理的文件完成后等待", "warning")
+
+    def toggle_job_pause(self, job_id):
+        """暂停或继续任务列表中选中的任务"""
+        job = next((job for job in self.job_manager.jobs() if job['id'] == job_id), None)
+        if job is None:
+            return
+        if job['paused']:
+            self.job_manager.resume(job_id)
+        else:
+            self.job_manager.pause(job_id)
+
+    def cancel_operation(self):
+        """取消所有运行中的任务并清空任务队列"""
+        self.job_manager.cancel_all()
+        self.cancel_button.configure(state=tk.DISABLED)
+        self.pause_button.configure(text="暂停", state=tk.DISABLED)
+        self.log_display.log_message("正在取消，正在处理的文件完成后停止...", "warning")
+
+    def submit_job(self, name, method, *args, folders=None):
+        """
+        把界面操作提交到任务管理器
+        提交时记录当前的源/目标文件夹和 JSON 内容，任务执行时使用这些值（排队期间修改界面不影响已提交的任务）；
+        folders 为任务会读写的文件夹，默认是目标文件夹，同一文件夹上的任务串行执行
+        """
+        snapshot = {
+            'source_folder': self.source_folder_selector.get_path(),
+            'target_folder': self.target_folder_selector.get_path(),
+            'json_content': self.get_json_content()
+        }
+        if folders is None:
+            folders = [snapshot['target_folder']]
+
+        def run(cancel_token):
+            self._job_context.job = job
+            self._job_context.snapshot = snapshot
+            self._job_context.cancel_token = cancel_token
+            # 同时运行的任务共用一个日志显示，不再清空，以任务名分隔各任务的输出
+            self.log_display.log_message(f"—— 开始任务: {name} ——", "info")
+            try:
+                method(*args)
+            finally:
+                self._job_context.job = None
+                self._job_context.snapshot = None
+                self._job_context.cancel_token = None
+
+        # 先创建任务再加入队列，任务开始运行时已能取得自己的任务对象
+        job = self.job_manager.create(name, run, folders)
+        try:
+            self.job_manager.enqueue(job)
+        except ValueError as e:
+            messagebox.showwarning("任务已存在", str(e))
+            return
+        if job.status == JOB_QUEUED:
+            self.log_display.log_message(f"任务已排队: {name}（等待同一文件夹上的任务完成）", "info")
+
+    def job_snapshot(self):
+        """当前线程所执行任务提交时的界面状态（不在任务中时为 None）"""
+        return getattr(self._job_context, 'snapshot', None)
+
+    def job_cancel_token(self):
+        """当前线程所执行任务的取消与暂停控制（不在任务中时为 None，此时操作不可取消）"""
+        return getattr(self._job_context, 'cancel_token', None)
+
+    def report_progress(self, value):
+        """报告当前线程所执行任务的进度（0-100），记录在任务自己的进度中，界面在刷新任务列表时显示"""
+        job = getattr(self._job_context, 'job', None)
+        if job is not None:
+            job.progress = value
+
+    def job_progress_callback(self, start=0, share=100):
+        """
+        返回进度回调 callback(已完成, 总数)，换算为当前任务进度中 start 起的 share%；
+        回调绑定在任务线程中取得的任务上，可以在复制线程中调用
+        """
+        job = getattr(self._job_context, 'job', None)
+
+        def callback(done, total):
+            if job is not None and total:
+                job.progress = start + done / total * share
+
+        return callback
+
+    def get_source_folder(self):
+        """获取源文件夹（任务中返回提交时的值）"""
+        snapshot = self.job_snapshot()
+        return snapshot['source_folder'] if snapshot else self.source_folder_selector.get_path()
+
+    def get_target_folder(self):
+        """获取目标文件夹（任务中返回提交时的值）"""
+        snapshot = self.job_snapshot()
+        return snapshot['target_folder'] if snapshot else self.target_folder_selector.get_path()
+
+    def on_jobs_changed(self):
+        """任务列表变化（可能在工作线程中调用），在主线程中刷新"""
+        self.root.after(0, self.refresh_job_list)
+
+    def refresh_job_list(self):
+        """
+        刷新任务列表与暂停/取消按钮状态；有任务运行时每秒刷新一次用时和进度
+        进度条显示运行中任务的平均进度，各任务的进度见任务列表
+        """
+        jobs = self.job_manager.jobs()
+        self.job_list.set_jobs(jobs)
+        running = self.job_manager.has_running
+        progress = [job['progress'] or 0 for job in jobs if job['status'] == JOB_RUNNING]
+        if progress:
+            self.progress_bar.update_progress(sum(progress) / len(progress))
+        else:
+            self.progress_bar.reset()
+        self.pause_button.configure(
+            text="继续" if self.job_manager.all_paused else "暂停",
+            state=tk.NORMAL if running else tk.DISABLED
+        )
+        self.cancel_button.configure(state=tk.NORMAL if running else tk.DISABLED)
+        if self._job_refresh_id is not None:
+            self.root.after_cancel(self._job_refresh_id)
+            self._job_refresh_id = None
+        if running:
+            self._job_refresh_id = self.root.after(1000, self.refresh_job_list)
+
+    def update_io_limits(self):
+        """将界面上的限速设置应用到 I/O 限速器"""
+        def parse(variable):
+            try:
+                return max(0.0, float(variable.get() or 0))
+            except ValueError:
+                return 0.0
+
+        self.mod_manager.io_throttle.set_limits(
+            mb_per_sec=parse(self.mb_per_sec_var), iops=parse(self.iops_var)
+        )
+        self.mod_manager.io_throttle.low_priority = self.low_priority_var.get()
+
+    def update_mod_info_format(self):
+        """把紧凑输出选项应用到 mod_info.json 的写入"""
+        compact = self.compact_info_var.get()
+        self.mod_manager.mod_info_compact = compact
+        self.mod_manager.mod_info_sort_keys = compact
+
+    def get_copy_workers(self):
+        """获取并行复制线程数"""
+        try:
+            return max(1, int(self.copy_workers_var.get()))
+        except (ValueError, tk.TclError):
+            return DEFAULT_COPY_WORKERS
+
+    def get_copy_order(self):
+        """获取复制调度顺序"""
+        return 'smallest' if self.smallest_first_var.get() else 'largest'
+
+    def log_schedule_report(self, schedule):
+        """输出并行复制的工作线程空闲时间报告"""
+        for stats in schedule.get('worker_stats', []):
+            self.log_display.log_message(
+                f"线程 {stats['worker']}: {stats['units']} 个单元, {format_size(stats['bytes'])}, "
+                f"忙碌 {stats['busy_seconds']:.1f}s, 空闲 {stats['idle_seconds']:.1f}s", "info"
+            )
+        if schedule.get('worker_stats'):
+            self.log_display.log_message(f"工作线程总空闲时间: {schedule['idle_seconds']:.1f}s", "info")
+
     def select_json_file(self):
         """选择JSON文件"""
         file_path = filedialog.askopenfilename(filetypes=SUPPORTED_JSON_TYPES)
@@ -219,8 +742,9 @@ class EnhancedModUserTool:
 
         try:
             with open(file_path, 'r', encoding=DEFAULT_ENCODING) as file:
-                config = json.load(file)
-                self.json_text_area.set_content(json.dumps(config, ensure_ascii=False, indent=4))
+                json_content = file.read()
+            config = json.loads(json_content)
+            self.show_config(config, json_content, file_path)
         except Exception as e:
             messagebox.showerror("错误", f"解析JSON文件时出错: {e}")
             self.log_display.log_message(f"错误: 解析JSON文件时出错: {e}", "error")
@@ -243,7 +767,7 @@ class EnhancedModUserTool:
 
         try:
             config = json.loads(json_content)
-            self.json_text_area.set_content(json.dumps(config, ensure_ascii=False, indent=4))
+            self.show_config(config, json_content)
         except Exception as e:
             messagebox.showerror("错误", f"解析JSON内容时出错: {e}")
             self.log_display.log_message(f"错误: 解析JSON内容时出错: {e}", "error")
@@ -258,39 +782,110 @@ class EnhancedModUserTool:
         folder_path = filedialog.askdirectory()
         if folder_path:
             self.source_folder_selector.set_path(folder_path)
+            self.refresh_mod_table()
             
+    def select_source_archive(self):
+        """选择 zip 压缩包作为源"""
+        archive_path = filedialog.askopenfilename(
+            title="选择源压缩包", filetypes=[("压缩包", "*.zip"), ("所有文件", "*.*")]
+        )
+        if archive_path:
+            self.source_folder_selector.set_path(archive_path)
+            self.refresh_mod_table()
+
     def select_target_folder(self):
         """选择目标文件夹"""
         folder_path = filedialog.askdirectory()
         if folder_path:
             self.target_folder_selector.set_path(folder_path)
+            self.refresh_mod_table()
             
     def run_copy_mods(self):
         """运行复制模组操作"""
-        thread = threading.Thread(target=self.copy_mods)
-        thread.start()
+        self.submit_job("复制模组", self.copy_mods)
         
     def run_only_copy_mods(self):
         """运行仅复制模组操作"""
-        thread = threading.Thread(target=self.only_copy_mods)
-        thread.start()
+        self.submit_job("仅复制模组", self.only_copy_mods)
         
     def run_smart_update_mods(self):
         """运行智能更新模组操作"""
-        thread = threading.Thread(target=self.smart_update_mods)
-        thread.start()
+        self.submit_job("智能更新", self.smart_update_mods)
         
     def run_only_export_json(self):
         """运行仅导出JSON操作"""
-        thread = threading.Thread(target=self.only_export_json)
-        thread.start()
+        self.submit_job("导出模组信息", self.only_export_json, folders=[self.source_folder_selector.get_path()])
+
+    def run_apply_updates(self):
+        """运行应用暂存更新操作"""
+        self.submit_job("应用暂存的更新", self.apply_updates)
+
+    def run_rollback_apply(self):
+        """运行回滚上次应用操作"""
+        self.submit_job("回滚上次应用", self.rollback_apply)
+
+    def run_collect_garbage(self):
+        """运行清理旧版本操作"""
+        self.submit_job("清理旧版本", self.collect_garbage)
+
+    def run_push_updates(self):
+        """运行增量推送操作（先在主线程中询问服务器地址）"""
+        address = simpledialog.askstring(
+            "增量推送", "服务器接收端地址 (主机:端口):", initialvalue=f"127.0.0.1:{DEFAULT_DELTA_PORT}"
+        )
+        if not address:
+            return
+        token = simpledialog.askstring("增量推送", "接收端显示的令牌:")
+        if not token:
+            return
+        self.submit_job("增量推送", self.push_updates, address, token)
+
+    def run_build_patch_packs(self):
+        """运行生成补丁包操作（先在主线程中选择输出文件夹）"""
+        output_folder = filedialog.askdirectory(title="选择补丁包输出文件夹")
+        if not output_folder:
+            return
+        self.submit_job(
+            "生成补丁包", self.build_patch_packs, output_folder,
+            folders=[self.target_folder_selector.get_path(), output_folder]
+        )
+
+    def run_apply_patch_packs(self):
+        """运行应用补丁包操作（先在主线程中选择补丁包）"""
+        pack_paths = filedialog.askopenfilenames(
+            title="选择补丁包", filetypes=[("补丁包", "*.modpatch"), ("所有文件", "*.*")]
+        )
+        if not pack_paths:
+            return
+        self.submit_job("应用补丁包", self.apply_patch_packs, list(pack_paths))
+
+    def run_sync_multiple_targets(self):
+        """运行多目标同步操作（先在主线程中依次选择目标文件夹）"""
+        target_folders = []
+        current_target = self.target_folder_selector.get_path()
+        if current_target:
+            target_folders.append(current_target)
+        while True:
+            folder_path = filedialog.askdirectory(
+                title=f"选择第 {len(target_folders) + 1} 个目标文件夹（取消结束选择）"
+            )
+            if not folder_path:
+                break
+            if folder_path not in target_folders:
+                target_folders.append(folder_path)
+        if not target_folders:
+            return
+        self.submit_job("同步到多个目标", self.sync_multiple_targets, target_folders, folders=target_folders)
+
+    def run_verify_target(self):
+        """运行校验目标文件夹操作"""
+        self.submit_job("校验目标文件夹", self.verify_target)
         
     def copy_mods(self):
         """复制模组的主要逻辑"""
-        self.log_display.clear()
-        json_content = self.json_text_area.get_content()
-        source_folder = self.source_folder_selector.get_path()
-        target_folder = self.target_folder_selector.get_path()
+        json_content = self.get_json_content()
+        source_folder = self.get_source_folder()
+        target_folder = self.get_target_folder()
 
         if not json_content:
             messagebox.showerror("错误", ERROR_MESSAGES["json_empty"])
@@ -307,6 +902,7 @@ class EnhancedModUserTool:
             self.log_display.log_message(f"错误: {ERROR_MESSAGES['target_folder_empty']}", "error")
             return
 
+        journal = None
         try:
             config = json.loads(json_content)
             if 'game' not in config or 'mods' not in config['game']:
@@ -322,40 +918,50 @@ class EnhancedModUserTool:
             skipped_mods = 0
 
             self.log_display.log_message(f"开始处理 {total_mods} 个模组...", "info")
-            
-            for mod in mods:
-                mod_id = mod.get('modId', '')
-                if not mod_id:
-                    continue
-                    
-                for folder_name in os.listdir(source_folder):
-                    if mod_id in folder_name:
-                        mod_source_path = os.path.join(source_folder, folder_name)
-                        if not os.path.isdir(mod_source_path):
-                            continue
-
-                        # 解析版本，生成标准化目录名：源文件夹名_版本
-                        parsed = self.mod_manager.parse_mod_info(mod_source_path, mod_id)
-                        standardized_name = self.mod_manager.generate_mod_folder_name(
-                            os.path.basename(mod_source_path), parsed.get('version', '未知')
-                        )
-                        standardized_target_path = os.path.join(target_folder, standardized_name)
 
-                        # 若目标已有包含该ID的旧命名目录且标准化目录不存在，先尝试重命名为标准化目录
-                        existing_path = self.mod_manager.find_existing_mod_path(target_folder, mod_id)
-                        if existing_path and existing_path != standardized_target_path and not os.path.exists(standardized_target_path):
-                            try:
-                                os.rename(existing_path, standardized_target_path)
-                                existing_path = standardized_target_path
-                            except Exception:
-                                pass
+            # 传输日志：上次复制中断时从最后完成的文件继续
+            journal = self.mod_manager.open_copy_journal(target_folder)
+            self.mod_manager.clear_listing_cache()
+            if journal.has_pending():
+                self.log_display.log_message("检测到未完成的复制任务，将从上次中断处继续", "warning")
 
-                        mod_target_path = standardized_target_path if os.path.exists(standardized_target_path) else (existing_path or standardized_target_path)
+            # 先确定全部需要复制的模组，再按大小调度并行复制
+            copy_jobs = []
+            # 批量读取源中各模组的元数据
+            metadata = self.mod_manager.scan_mods_metadata(mods, source_folder, self.job_cancel_token())
+            # 依赖闭包：源中存在、配置中未列出的依赖一并复制，缺失或版本不一致的依赖写入日志
+            dependencies = self.mod_manager.resolve_dependencies(mods, source_folder, metadata,
+                                                                 self.job_cancel_token())
+            self.log_dependencies(dependencies)
+            mods = mods + [{'modId': mod_id} for mod_id in dependencies['added']]
+            total_mods = len(mods)
+            # {mod_id: 目标模组路径}，用于按依赖顺序调度复制
+            copy_job_ids = {}
+
+            # 规划期间使用源和目标模组目录的快照
+            with self.mod_manager.planning_snapshot(metadata, [target_folder], self.job_cancel_token()):
+                for mod in mods:
+                    mod_id = mod.get('modId', '')
+                    record = metadata.get(mod_id)
+                    if record:
+                        mod_source_path = record['path']
+
+                        # 生成标准化目录名：源文件夹名_版本
+                        standardized_name = self.mod_manager.generate_mod_folder_name(
+                            os.path.basename(mod_source_path), record['version']
+                        )
+                        # 若目标已有包含该ID的旧命名目录且标准化目录不存在，先重命名为标准化目录
+                        mod_target_path, standardized_target_path = self.mod_manager.standardize_target_mod_path(
+                            target_folder, mod_id, standardized_name
+                        )
 
                         # 检查是否需要更新
                         needs_update, reason, source_version, target_version = self.mod_manager.check_mod_needs_update(
-                            mod_source_path, mod_target_path, mod_id
+                            mod_source_path, mod_target_path, mod_id, self.job_cancel_token()
                         )
+                        # 上次中断的模组目录可能已有 ServerData.json，不能按版本判断为最新
+                        if not needs_update and journal.is_mod_pending(standardized_target_path):
+                            needs_update, reason = True, "上次复制未完成"
 
                         if needs_update:
                             if os.path.exists(mod_target_path):
@@ -366,44 +972,70 @@ class EnhancedModUserTool:
                                 new_mods += 1
 
                             # 复制到标准化目录
-                            if self.mod_manager.copy_mod_folder(mod_source_path, standardized_target_path):
-                                self.log_display.log_message(f"成功复制: {standardized_name}", "success")
-                            else:
-                                self.log_display.log_message(f"复制失败: {standardized_name}", "error")
+                            copy_jobs.append((mod_source_path, standardized_target_path))
+                            copy_job_ids[mod_id] = standardized_target_path
                         else:
                             self.log_display.log_message(f"跳过模组: {standardized_name} - {reason}", "info")
                             skipped_mods += 1
-                        break
-                
-                processed_mods += 1
-                progress = (processed_mods / total_mods) * 100
-                self.progress_bar.update_progress(progress)
 
-            # 生成模组信息JSON文件
-            if new_mods > 0 or updated_mods > 0:
-                mod_info = {}
-                for mod in mods:
-                    mod_id = mod.get('modId', '')
-                    if mod_id:
-                        for folder_name in os.listdir(source_folder):
-                            if mod_id in folder_name:
-                                mod_source_path = os.path.join(source_folder, folder_name)
-                                if os.path.isdir(mod_source_path):
-                                    mod_info[mod_id] = self.mod_manager.parse_mod_info(mod_source_path, mod_id)
-                                break
-
-                mod_info_path = self.mod_manager.save_mod_info_json(mod_info, target_folder)
+                    processed_mods += 1
+                    progress = (processed_mods / total_mods) * PLAN_PROGRESS_SHARE
+                    self.report_progress(progress)
+
+            # 磁盘空间预检：直接复制到目标文件夹时没有可以中途释放的空间，不足时不写入任何文件
+            shortages = self.mod_manager.check_copy_space(copy_jobs, journal, self.job_cancel_token())
+            if shortages:
+                for entry in shortages:
+                    self.log_display.log_message(
+                        f"空间不足: {entry['path']} 需要 {format_size(entry['required'])}，"
+                        f"可用 {format_size(entry['available'])}", "error"
+                    )
+                messagebox.showerror("错误", "目标磁盘空间不足，未复制任何文件，详见日志")
+                return
+
+            schedule = self.mod_manager.run_copy_jobs(
+                copy_jobs,
+                verify=self.verify_copy_var.get(),
+                journal=journal,
+                max_workers=self.get_copy_workers(),
+                order=self.get_copy_order(),
+                progress_callback=self.job_progress_callback(PLAN_PROGRESS_SHARE, 100 - PLAN_PROGRESS_SHARE),
+                dependencies=self.mod_manager.dependency_copy_order(dependencies['graph'], copy_job_ids),
+                cancel_token=self.job_cancel_token()
+            )
+            if schedule.get('cancelled'):
+                # 已复制完成的文件保留，日志保留以便下次继续；清理未完成模组中的临时文件
+                for path in self.mod_manager.cleanup_cancelled_copy(journal):
+                    self.log_display.log_message(f"未完成: {os.path.basename(path)}", "warning")
+                raise OperationCancelled()
+            for _, target_path in copy_jobs:
+                if schedule['results'].get(target_path):
+                    self.log_display.log_message(f"成功复制: {os.path.basename(target_path)}", "success")
+                else:
+                    self.log_display.log_message(f"复制失败: {os.path.basename(target_path)}", "error")
+            self.log_schedule_report(schedule)
+            self.mod_manager.save_caches()
+
+            journal.complete()
+
+            # 生成模组信息JSON文件（合并到已有文件，内容未变化时不重写）
+            if metadata:
+                mod_info = {mod_id: mod_info_entry(record) for mod_id, record in metadata.items()}
+                mod_info_path = self.mod_manager.save_mod_info_json(mod_info, target_folder, merge=True)
                 if mod_info_path:
                     self.log_display.log_message(f"成功生成模组信息文件: {mod_info_path}", "success")
 
             messagebox.showinfo("成功", SUCCESS_MESSAGES["mods_copied"].format(new_mods, updated_mods, skipped_mods))
             self.log_display.log_message(SUCCESS_MESSAGES["mods_copied"].format(new_mods, updated_mods, skipped_mods), "success")
 
+        except OperationCancelled:
+            self.log_display.log_message("操作已取消", "warning")
         except Exception as e:
             messagebox.showerror("错误", f"操作过程中出错: {e}")
             self.log_display.log_message(f"错误: {e}", "error")
         finally:
-            self.progress_bar.reset()
+            if journal is not None:
+                journal.close()
             
     def only_copy_mods(self):
         """仅复制模组"""
@@ -411,10 +1043,9 @@ class EnhancedModUserTool:
         
     def smart_update_mods(self):
         """智能更新模组"""
-        self.log_display.clear()
-        json_content = self.json_text_area.get_content()
-        source_folder = self.source_folder_selector.get_path()
-        target_folder = self.target_folder_selector.get_path()
+        json_content = self.get_json_content()
+        source_folder = self.get_source_folder()
+        target_folder = self.get_target_folder()
 
         if not json_content:
             messagebox.showerror("错误", ERROR_MESSAGES["json_empty"])
@@ -434,44 +1065,125 @@ class EnhancedModUserTool:
         try:
             # 禁用按钮
             self.smart_update_button.configure(state=tk.DISABLED)
-            self.progress_bar.update_progress(10)
+            self.report_progress(10)
             
             self.log_display.log_message("开始智能更新模组...", "info")
             self.log_display.log_message("只有版本号不同和新的模组列表中有但目标文件夹中没有的模组才会被更新", "info")
             
-            # 调用智能更新方法
-            result = self.mod_manager.smart_update_mods(json_content, source_folder, target_folder)
+            # 调用智能更新方法，每个模组的结果在产生时写入日志
+            result = self.mod_manager.smart_update_mods(
+                json_content, source_folder, target_folder, verify=self.verify_copy_var.get(),
+                max_workers=self.get_copy_workers(), order=self.get_copy_order(),
+                record_callback=self.log_update_record,
+                space_callback=self.confirm_batched_update,
+                cancel_token=self.job_cancel_token()
+            )
+            self.log_schedule_report(result)
+            if result.get('resumed'):
+                self.log_display.log_message("已从上次中断处继续智能更新", "warning")
             
-            self.progress_bar.update_progress(100)
+            self.report_progress(100)
             
             # 显示结果
             update_folder = result.get('update_folder', '')
-            if update_folder and os.path.exists(update_folder):
+            if result.get('applied_batches'):
+                self.log_display.log_message(
+                    f"智能更新完成！空间不足，已分 {result['applied_batches']} 批更新并直接应用到目标文件夹", "success"
+                )
+                self.log_display.log_message(
+                    f"新增模组: {result['new_mods']}，更新模组: {result['updated_mods']}，跳过模组: {result['skipped_mods']}", "info"
+                )
+                messagebox.showinfo("成功", f"智能更新已分批应用到目标文件夹！\n\n新增: {result['new_mods']}\n更新: {result['updated_mods']}\n跳过: {result['skipped_mods']}")
+            elif update_folder and os.path.exists(update_folder):
                 self.log_display.log_message(f"智能更新完成！", "success")
                 self.log_display.log_message(f"更新文件夹: {update_folder}", "success")
                 self.log_display.log_message(f"总模组数: {result['total_mods']}", "info")
                 self.log_display.log_message(f"新增模组: {result['new_mods']}", "info")
                 self.log_display.log_message(f"更新模组: {result['updated_mods']}", "info")
                 self.log_display.log_message(f"跳过模组: {result['skipped_mods']}", "info")
+                if result.get('failed_mods'):
+                    self.log_display.log_message(f"失败模组: {result['failed_mods']}", "error")
+                if result.get('dependency_mods'):
+                    self.log_display.log_message(f"一并处理的依赖模组: {len(result['dependency_mods'])}", "info")
+                if result.get('dependency_problems'):
+                    self.log_display.log_message(f"依赖问题: {result['dependency_problems']}（详见上方日志）", "warning")
                 
                 messagebox.showinfo("成功", f"智能更新完成！\n\n新增: {result['new_mods']}\n更新: {result['updated_mods']}\n跳过: {result['skipped_mods']}\n\n更新文件夹: {update_folder}")
             else:
                 self.log_display.log_message("智能更新完成，但没有需要更新的模组", "info")
                 messagebox.showinfo("信息", "所有模组都是最新版本，无需更新")
                 
+        except OperationCancelled:
+            self.log_display.log_message("操作已取消", "warning")
         except Exception as e:
             messagebox.showerror("错误", f"智能更新过程中出错: {e}")
             self.log_display.log_message(f"错误: {e}", "error")
         finally:
             # 恢复按钮状态
             self.smart_update_button.configure(state=tk.NORMAL)
-            self.progress_bar.reset()
         
+    def confirm_batched_update(self, shortages):
+        """智能更新空间不足时询问是否分批执行（在任务线程中调用）"""
+        for entry in shortages:
+            self.log_display.log_message(
+                f"空间不足: {entry['path']} 需要 {format_size(entry['required'])}，"
+                f"可用 {format_size(entry['available'])}", "warning"
+            )
+        return messagebox.askyesno(
+            "空间不足",
+            "更新文件夹所在磁盘的空间不足以暂存全部更新。\n\n"
+            "是否分批执行？每批复制完成后会立即应用到目标文件夹，并删除被替换的旧版本以释放空间（不保留回滚）。\n"
+            "选择“否”将不复制任何文件。"
+        )
+
+    def log_dependency_problem(self, problem):
+        """输出一条依赖问题（缺失或版本不一致）"""
+        if problem['problem'] == 'missing':
+            self.log_display.log_message(
+                f"缺少依赖: {problem['mod_id']} 依赖的 {problem['dependency']} 在源中不存在", "warning"
+            )
+        else:
+            self.log_display.log_message(
+                f"依赖版本不一致: {problem['mod_id']} 需要 {problem['dependency']} {problem['required_version']}，"
+                f"源中为 {problem['available_version']}", "warning"
+            )
+
+    def log_dependencies(self, dependencies):
+        """输出依赖检查结果：一并处理的依赖模组和全部依赖问题"""
+        if dependencies['added']:
+            self.log_display.log_message(
+                f"配置中未列出的依赖模组 {len(dependencies['added'])} 个，将一并处理: {', '.join(dependencies['added'])}",
+                "info"
+            )
+        for problem in dependencies['problems']:
+            self.log_dependency_problem(problem)
+
+    def log_update_record(self, record):
+        """输出智能更新产生的单条结果记录，并按已处理的模组数更新进度"""
+        if record['type'] == 'start':
+            self._job_context.record_total = max(1, record['total_mods'])
+            self._job_context.record_done = 0
+            return
+        if record['type'] == 'dependency':
+            self.log_dependency_problem(record)
+            return
+        if record['type'] != 'mod':
+            return
+        labels = {
+            'new': ("新增模组", "success"),
+            'updated': ("更新模组", "success"),
+            'skipped': ("跳过模组", "info"),
+            'failed': ("复制失败", "error")
+        }
+        label, level = labels.get(record['action'], (record['action'], "info"))
+        self.log_display.log_message(f"{label}: {record['name']} ({record['version']}) - {record['reason']}", level)
+        self._job_context.record_done += 1
+        self.report_progress(min(100, 10 + self._job_context.record_done / self._job_context.record_total * 90))
+
     def only_export_json(self):
         """仅导出模组信息JSON"""
-        self.log_display.clear()
-        json_content = self.json_text_area.get_content()
-        source_folder = self.source_folder_selector.get_path()
+        json_content = self.get_json_content()
+        source_folder = self.get_source_folder()
 
         if not json_content:
             messagebox.showerror("错误", ERROR_MESSAGES["json_empty"])
@@ -493,22 +1205,17 @@ class EnhancedModUserTool:
             mods = config['game']['mods']
             mod_info = {}
             
-            for mod in mods:
-                mod_id = mod.get('modId', '')
-                if not mod_id:
-                    continue
-                    
-                for folder_name in os.listdir(source_folder):
-                    if mod_id in folder_name:
-                        mod_source_path = os.path.join(source_folder, folder_name)
-                        if os.path.isdir(mod_source_path):
-                            mod_info[mod_id] = self.mod_manager.parse_mod_info(mod_source_path, mod_id)
-                            self.log_display.log_message(f"记录模组信息: {mod_info[mod_id]['name']} ({mod_id}) - {mod_info[mod_id]['version']}", "info")
-                        break
+            # 批量并行读取各模组的 ServerData.json
+            metadata = self.mod_manager.scan_mods_metadata(mods, source_folder, self.job_cancel_token())
+            for mod_id, record in metadata.items():
+                mod_info[mod_id] = mod_info_entry(record)
+                self.log_display.log_message(f"记录模组信息: {record['name']} ({mod_id}) - {record['version']}", "info")
 
             # 生成模组信息JSON文件
             if mod_info:
-                mod_info_path = self.mod_manager.save_mod_info_json(mod_info, source_folder)
+                # 源为压缩包时保存在压缩包所在的文件夹
+                info_folder = os.path.dirname(source_folder) if os.path.isfile(source_folder) else source_folder
+                mod_info_path = self.mod_manager.save_mod_info_json(mod_info, info_folder)
                 if mod_info_path:
                     self.log_display.log_message(f"成功生成模组信息文件: {mod_info_path}", "success")
                     messagebox.showinfo("成功", "模组信息文件生成完成！")
@@ -521,17 +1228,345 @@ class EnhancedModUserTool:
             messagebox.showerror("错误", f"操作过程中出错: {e}")
             self.log_display.log_message(f"错误: {e}", "error")
             
-    def process_multiple_json_files(self):
-        """处理多个服务器JSON文件"""
+    def apply_updates(self):
+        """将 mods_update 中暂存的模组应用到目标文件夹"""
+        target_folder = self.get_target_folder()
+        if not target_folder:
+            messagebox.showerror("错误", ERROR_MESSAGES["target_folder_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['target_folder_empty']}", "error")
+            return
+
+        try:
+            self.apply_update_button.configure(state=tk.DISABLED)
+            result = self.mod_manager.apply_staged_updates(target_folder)
+            for name in result['replaced']:
+                self.log_display.log_message(f"旧版本已移至回滚区: {name}", "info")
+            for name in result['applied']:
+                self.log_display.log_message(f"已应用: {name}", "success")
+            if result['rollback_folder']:
+                self.log_display.log_message(f"回滚区: {result['rollback_folder']}", "info")
+            messagebox.showinfo("成功", f"已应用 {len(result['applied'])} 个模组，替换 {len(result['replaced'])} 个旧版本")
+            self.refresh_mod_table()
+        except Exception as e:
+            messagebox.showerror("错误", f"应用更新时出错: {e}")
+            self.log_display.log_message(f"错误: {e}", "error")
+        finally:
+            self.apply_update_button.configure(state=tk.NORMAL)
+
+    def rollback_apply(self):
+        """撤销最近一次应用更新"""
+        target_folder = self.get_target_folder()
+        if not target_folder:
+            messagebox.showerror("错误", ERROR_MESSAGES["target_folder_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['target_folder_empty']}", "error")
+            return
+
+        try:
+            self.rollback_button.configure(state=tk.DISABLED)
+            result = self.mod_manager.rollback_last_apply(target_folder)
+            for name in result['restored']:
+                self.log_display.log_message(f"已还原: {name}", "success")
+            messagebox.showinfo("成功", f"已回滚: {result['rollback_folder']}")
+            self.refresh_mod_table()
+        except Exception as e:
+            messagebox.showerror("错误", f"回滚时出错: {e}")
+            self.log_display.log_message(f"错误: {e}", "error")
+        finally:
+            self.rollback_button.configure(state=tk.NORMAL)
+
+    def collect_garbage(self):
+        """清理目标文件夹中过期的模组版本（先试运行报告，确认后删除）"""
+        target_folder = self.get_target_folder()
+        if not target_folder:
+            messagebox.showerror("错误", ERROR_MESSAGES["target_folder_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['target_folder_empty']}", "error")
+            return
+
+        # 本次运行中加载过的所有服务器配置；用户确认这就是全部配置后才清理未被引用的模组
+        server_configs = dict(self.loaded_configs)
+        configs_complete = False
+        if server_configs:
+            names = "\n".join(f"- {name}" for name in server_configs)
+            configs_complete = messagebox.askyesno(
+                "确认服务器配置",
+                f"本次运行中加载了以下服务器配置:\n{names}\n\n"
+                "这些是否是使用此目标文件夹的全部服务器？\n"
+                "选择“是”将同时清理未被这些配置引用的模组；选择“否”只清理已被新版本取代的旧版本。"
+            )
+
+        try:
+            self.gc_button.configure(state=tk.DISABLED)
+            keep_versions = self.keep_versions_var.get()
+            report = self.mod_manager.collect_garbage(
+                target_folder, server_configs, configs_complete=configs_complete, keep_versions=keep_versions,
+                dry_run=True, cancel_token=self.job_cancel_token()
+            )
+            if report['unreferenced_skipped']:
+                self.log_display.log_message(
+                    "未确认已加载全部服务器配置，不清理未被引用的模组（其他服务器可能仍在使用）", "warning"
+                )
+            if not report['removed']:
+                self.log_display.log_message("没有需要清理的模组版本", "info")
+                messagebox.showinfo("信息", "没有需要清理的模组版本")
+                return
+
+            for item in report['removed']:
+                self.log_display.log_message(
+                    f"待清理: {item['name']} ({format_size(item['size'])}) - {item['reason']}", "info"
+                )
+            summary = f"{len(report['removed'])} 个文件夹，可回收 {format_size(report['reclaimed_bytes'])}"
+            if not messagebox.askyesno("确认清理", f"将删除 {summary}。\n\n是否继续？"):
+                self.log_display.log_message("已取消清理", "warning")
+                return
+
+            result = self.mod_manager.collect_garbage(
+                target_folder, server_configs, configs_complete=configs_complete, keep_versions=keep_versions,
+                dry_run=False, cancel_token=self.job_cancel_token()
+            )
+            for item in result['removed']:
+                if item['error']:
+                    self.log_display.log_message(f"删除失败: {item['name']} - {item['error']}", "error")
+            self.log_display.log_message(f"清理完成，已回收 {format_size(result['reclaimed_bytes'])}", "success")
+            self.refresh_mod_table()
+        except OperationCancelled:
+            self.log_display.log_message("操作已取消", "warning")
+        except Exception as e:
+            messagebox.showerror("错误", f"清理过程中出错: {e}")
+            self.log_display.log_message(f"错误: {e}", "error")
+        finally:
+            self.gc_button.configure(state=tk.NORMAL)
+
+    def push_updates(self, address, token):
+        """通过增量传输协议推送 mods_update 到服务器"""
+        target_folder = self.get_target_folder()
+        if not target_folder:
+            messagebox.showerror("错误", ERROR_MESSAGES["target_folder_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['target_folder_empty']}", "error")
+            return
+
+        try:
+            self.push_button.configure(state=tk.DISABLED)
+            host, _, port = address.rpartition(':')
+            self.log_display.log_message(f"开始增量推送到 {address}...", "info")
+            stats = self.mod_manager.push_staged_updates(target_folder, host or address, int(port or DEFAULT_DELTA_PORT),
+                                                         cancel_token=self.job_cancel_token(), token=token)
+            for error in stats['errors']:
+                self.log_display.log_message(f"推送失败: {error['path']} - {error['message']}", "error")
+            self.log_display.log_message(
+                f"推送完成: {stats['files']} 个文件, 共 {format_size(stats['bytes_total'])}, "
+                f"实际发送 {format_size(stats['bytes_literal'])}, 复用 {format_size(stats['bytes_matched'])}",
+                "success" if not stats['errors'] else "warning"
+            )
+        except OperationCancelled:
+            self.log_display.log_message("操作已取消", "warning")
+        except Exception as e:
+            messagebox.showerror("错误", f"增量推送时出错: {e}")
+            self.log_display.log_message(f"错误: {e}", "error")
+        finally:
+            self.push_button.configure(state=tk.NORMAL)
+
+    def toggle_delta_receiver(self):
+        """启动或停止增量传输接收端"""
+        if self.delta_receiver is not None:
+            self.delta_receiver.stop()
+            self.delta_receiver = None
+            self.receiver_button.configure(text="启动增量接收端")
+            self.log_display.log_message("增量接收端已停止", "info")
+            return
+
+        target_folder = self.get_target_folder()
+        if not target_folder:
+            messagebox.showerror("错误", ERROR_MESSAGES["target_folder_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['target_folder_empty']}", "error")
+            return
+
+        # 默认只监听本机，接受局域网连接需要用户明确同意
+        allow_lan = messagebox.askyesno(
+            "增量接收端",
+            "是否允许局域网中的其他主机连接？\n\n选择“否”时只接受本机连接。无论哪种方式，发送端都必须提供接收端显示的令牌。"
+        )
+        try:
+            self.delta_receiver = self.mod_manager.start_delta_receiver(target_folder, allow_lan=allow_lan)
+            host, port = self.delta_receiver.address
+            self.receiver_button.configure(text="停止增量接收端")
+            self.log_display.log_message(f"增量接收端已启动，监听 {host}:{port}", "success")
+            self.log_display.log_message(f"推送令牌: {self.delta_receiver.token}", "info")
+        except Exception as e:
+            self.delta_receiver = None
+            messagebox.showerror("错误", f"启动增量接收端时出错: {e}")
+            self.log_display.log_message(f"错误: {e}", "error")
+
+    def build_patch_packs(self, output_folder):
+        """为版本变化的模组生成补丁包"""
+        source_folder = self.get_source_folder()
+        target_folder = self.get_target_folder()
+        json_content = self.get_json_content()
+        if not json_content:
+            messagebox.showerror("错误", ERROR_MESSAGES["json_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['json_empty']}", "error")
+            return
+        if not source_folder:
+            messagebox.showerror("错误", ERROR_MESSAGES["source_folder_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['source_folder_empty']}", "error")
+            return
+        if not target_folder:
+            messagebox.showerror("错误", ERROR_MESSAGES["target_folder_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['target_folder_empty']}", "error")
+            return
+
+        try:
+            self.build_patch_button.configure(state=tk.DISABLED)
+            self.log_display.log_message("开始生成补丁包...", "info")
+            result = self.mod_manager.build_patch_packs(json_content, source_folder, target_folder, output_folder,
+                                                        cancel_token=self.job_cancel_token())
+            for pack in result['packs']:
+                self.log_display.log_message(
+                    f"补丁包: {os.path.basename(pack['pack_path'])} ({pack['old_version']} -> {pack['new_version']}), "
+                    f"{format_size(pack['pack_size'])} / 完整模组 {format_size(pack['new_size'])}",
+                    "success"
+                )
+            for mod_id in result['full_copy']:
+                self.log_display.log_message(f"模组 {mod_id} 未安装在目标中，需要通过智能更新完整复制", "warning")
+            for failure in result['failed']:
+                self.log_display.log_message(f"生成补丁包失败: {failure['mod_id']} - {failure['error']}", "error")
+            messagebox.showinfo("完成", f"已生成 {len(result['packs'])} 个补丁包\n输出文件夹: {output_folder}")
+        except OperationCancelled:
+            self.log_display.log_message("操作已取消", "warning")
+        except Exception as e:
+            messagebox.showerror("错误", f"生成补丁包时出错: {e}")
+            self.log_display.log_message(f"错误: {e}", "error")
+        finally:
+            self.build_patch_button.configure(state=tk.NORMAL)
+
+    def apply_patch_packs(self, pack_paths):
+        """应用补丁包，新版本暂存到 mods_update"""
+        target_folder = self.get_target_folder()
+        if not target_folder:
+            messagebox.showerror("错误", ERROR_MESSAGES["target_folder_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['target_folder_empty']}", "error")
+            return
+
+        applied = 0
+        try:
+            self.apply_patch_button.configure(state=tk.DISABLED)
+            for pack_path in pack_paths:
+                try:
+                    result = self.mod_manager.apply_patch_pack(pack_path, target_folder,
+                                                               cancel_token=self.job_cancel_token())
+                    applied += 1
+                    self.log_display.log_message(
+                        f"已暂存 {result['name']}: {result['old_version']} -> {result['new_version']}", "success"
+                    )
+                except (ValueError, OSError) as e:
+                    self.log_display.log_message(f"应用补丁包失败: {os.path.basename(pack_path)} - {e}", "error")
+            messagebox.showinfo(
+                "完成", f"已应用 {applied}/{len(pack_paths)} 个补丁包，点击“应用暂存的更新”完成安装"
+            )
+        except OperationCancelled:
+            self.log_display.log_message("操作已取消", "warning")
+        finally:
+            self.apply_patch_button.configure(state=tk.NORMAL)
+
+    def sync_multiple_targets(self, target_folders):
+        """把模组同步到多个目标文件夹，输出每个目标的结果"""
+        json_content = self.get_json_content()
+        source_folder = self.get_source_folder()
+
+        if not json_content:
+            messagebox.showerror("错误", ERROR_MESSAGES["json_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['json_empty']}", "error")
+            return
+
+        if not source_folder:
+            messagebox.showerror("错误", ERROR_MESSAGES["source_folder_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['source_folder_empty']}", "error")
+            return
+
+        try:
+            self.sync_targets_button.configure(state=tk.DISABLED)
+            self.log_display.log_message(f"开始同步到 {len(target_folders)} 个目标文件夹...", "info")
+            result = self.mod_manager.sync_to_targets(
+                json_content, source_folder, target_folders, verify=self.verify_copy_var.get(),
+                max_workers=self.get_copy_workers(),
+                progress_callback=self.job_progress_callback(),
+                cancel_token=self.job_cancel_token()
+            )
+            for summary in result['targets']:
+                self.log_display.log_message(
+                    f"{summary['target_folder']}: 新增 {summary['new_mods']}, 更新 {summary['updated_mods']}, "
+                    f"跳过 {summary['skipped_mods']}, 失败 {len(summary['failed_mods'])}",
+                    "error" if summary['failed_mods'] else "success"
+                )
+                for failure in summary['failed_mods']:
+                    self.log_display.log_message(f"  同步失败: {failure['mod_id']} - {failure['error']}", "error")
+                if summary['mod_info_path']:
+                    self.log_display.log_message(f"  模组信息文件: {summary['mod_info_path']}", "info")
+            self.log_display.log_message(
+                f"读取源 {format_size(result['source_bytes'])}, 写入 {format_size(result['written_bytes'])}, "
+                f"硬链接 {result['linked_files']} 个文件, 用时 {result['wall_seconds']:.1f}s", "info"
+            )
+            messagebox.showinfo("成功", f"已同步到 {len(target_folders)} 个目标文件夹")
+        except OperationCancelled:
+            self.log_display.log_message("操作已取消", "warning")
+        except Exception as e:
+            messagebox.showerror("错误", f"同步过程中出错: {e}")
+            self.log_display.log_message(f"错误: {e}", "error")
+        finally:
+            self.sync_targets_button.configure(state=tk.NORMAL)
+
+    def verify_target(self):
+        """按模组清单校验目标文件夹"""
+        target_folder = self.get_target_folder()
+
+        if not target_folder:
+            messagebox.showerror("错误", ERROR_MESSAGES["target_folder_empty"])
+            self.log_display.log_message(f"错误: {ERROR_MESSAGES['target_folder_empty']}", "error")
+            return
+
+        try:
+            self.verify_button.configure(state=tk.DISABLED)
+            self.log_display.log_message("开始校验目标文件夹...", "info")
+
+            result = self.mod_manager.verify_target_tree(target_folder, cancel_token=self.job_cancel_token())
+
+            for name in result['missing_manifest']:
+                self.log_display.log_message(f"缺少清单，跳过: {name}", "warning")
+            for failure in result['failed']:
+                self.log_display.log_message(f"校验失败: {failure['mod']}/{failure['file']} - {failure['reason']}", "error")
+
+            summary = f"已校验 {result['checked_mods']} 个模组、{result['checked_files']} 个文件，失败 {len(result['failed'])} 个"
+            if result['failed']:
+                self.log_display.log_message(summary, "error")
+                messagebox.showerror("校验失败", summary)
+            else:
+                self.log_display.log_message(summary, "success")
+                messagebox.showinfo("成功", summary)
+        except OperationCancelled:
+            self.log_display.log_message("操作已取消", "warning")
+        except Exception as e:
+            messagebox.showerror("错误", f"校验过程中出错: {e}")
+            self.log_display.log_message(f"错误: {e}", "error")
+        finally:
+            self.verify_button.configure(state=tk.NORMAL)
+
+    def run_process_multiple_json_files(self):
+        """运行处理多个服务器JSON文件操作（先在主线程中选择文件）"""
         file_paths = filedialog.askopenfilenames(filetypes=SUPPORTED_JSON_TYPES)
         if not file_paths:
             messagebox.showwarning("警告", "未选择文件")
             return
+        self.submit_job(
+            "处理多个服务器", self.process_multiple_json_files, list(file_paths),
+            folders=[self.source_folder_selector.get_path()]
+        )
 
-        self.log_display.clear()
+    def process_multiple_json_files(self, file_paths):
+        """处理多个服务器JSON文件：选择了源文件夹时批量读取所有模组的元数据，输出每个服务器的模组数和总大小"""
         self.log_display.log_message(f"开始处理 {len(file_paths)} 个JSON文件...", "info")
 
         try:
+            all_mods = []
+            server_mods = []
             for file_path in file_paths:
                 self.log_display.log_message(f"\n处理文件: {os.path.basename(file_path)}", "info")
                 
@@ -541,15 +1576,32 @@ class EnhancedModUserTool:
                 if 'game' in config and 'mods' in config['game']:
                     mods = config['game']['mods']
                     self.log_display.log_message(f"  模组数量: {len(mods)}", "info")
-                    
-                    for mod in mods:
-                        mod_id = mod.get('modId', '')
-                        if mod_id:
-                            self.log_display.log_message(f"  - {mod_id}", "info")
+                    all_mods.extend(mods)
+                    server_mods.append((file_path, mods))
+                    self.loaded_configs[file_path] = mods
                 else:
                     self.log_display.log_message("  格式不正确，跳过", "warning")
 
+            # 所有服务器的模组一次批量扫描（同一模组只读取一次）
+            source_folder = self.get_source_folder()
+            if source_folder:
+                metadata = self.mod_manager.scan_mods_metadata(all_mods, source_folder, self.job_cancel_token())
+                for file_path, mods in server_mods:
+                    mod_ids = {mod.get('modId', '') for mod in mods} - {''}
+                    found = [metadata[mod_id] for mod_id in mod_ids if mod_id in metadata]
+                    self.log_display.log_message(
+                        f"{os.path.basename(file_path)}: 源中找到 {len(found)}/{len(mod_ids)} 个模组, "
+                        f"共 {format_size(sum(record['size'] for record in found))}",
+                        "info" if len(found) == len(mod_ids) else "warning"
+                    )
+
+            # 模组明细显示在模组列表中（按 modId 去重），不再逐行写入日志
+            self.root.after(0, self.refresh_mod_table, all_mods)
+            self.log_display.log_message(f"共 {len({mod.get('modId') for mod in all_mods} - {None, ''})} 个不同模组，已显示在模组列表中", "info")
+
             messagebox.showinfo("成功", INFO_MESSAGES["processing_complete"])
+        except OperationCancelled:
+            self.log_display.log_message("操作已取消", "warning")
         except Exception as e:
             messagebox.showerror("错误", f"处理过程中出错: {e}")
             self.log_display.log_message(f"错误: {e}", "error")
@@ -560,5 +1612,7 @@ class EnhancedModUserTool:
 
 
 if __name__ == "__main__":
+    # 结构化日志管线（JSONL 日志文件、控制台，界面日志也作为其中一个消费者）
+    start_logging()
     app = EnhancedModUserTool()
     app.run()